@@ -0,0 +1,231 @@
+"""Приближенный поиск ближайших соседей (ANN) по косинусной мере.
+
+Бэкенды подключаются через ANN_BACKENDS; у всех одинаковый интерфейс:
+fit(vectors) и search(queries, k) -> (indices, scores). Векторы нормируются
+по L2, поэтому скалярное произведение равно косинусной похожести.
+
+Отчет о полноте приближенного поиска относительно точного:
+    python ann.py --items 100000 --dim 10
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import normalize
+
+from similarity_index import top_k_indices
+
+
+def dot_dense(a, b):
+    """a @ b.T в виде плотного массива для плотных, разреженных и квантованных (b) входов"""
+    if hasattr(b, 'dot_rows'):   # quantize.QuantizedMatrix
+        return b.dot_rows(a)
+    result = a @ b.T
+    return result.toarray() if sparse.issparse(result) else np.asarray(result)
+
+
+def _pad(indices, scores, k):
+    # Если кандидатов меньше k, дополняем -1 / -inf
+    if len(indices) >= k:
+        return indices[:k], scores[:k]
+    fill = k - len(indices)
+    return (np.concatenate([indices, np.full(fill, -1, dtype=indices.dtype)]),
+            np.concatenate([scores, np.full(fill, -np.inf)]))
+
+
+class ExactIndex:
+    """Точный перебор - эталон для отчета о полноте и бэкенд для маленьких каталогов"""
+    backend = 'exact'
+
+    def __init__(self, block_size=1024, **params):
+        self.block_size = block_size
+
+    def fit(self, vectors):
+        self.vectors = normalize(vectors)
+        return self
+
+    def arrays(self):
+        """Массивы индекса для сохранения (без самих векторов)"""
+        return {}
+
+    def restore(self, vectors, arrays):
+        """Восстанавливает индекс из arrays(); vectors должны быть уже нормированы"""
+        self.vectors = vectors
+        return self
+
+    def update(self, vectors, rows):
+        """Подхватывает измененные или добавленные в конец векторы rows (уже нормированные)"""
+        self.vectors = vectors
+        return self
+
+    def search(self, queries, k):
+        queries = normalize(queries)
+        k_eff = min(k, self.vectors.shape[0])
+        all_indices, all_scores = [], []
+        for start in range(0, queries.shape[0], self.block_size):
+            block = dot_dense(queries[start:start + self.block_size], self.vectors)
+            top = top_k_indices(block, k_eff)
+            all_indices.append(top)
+            all_scores.append(np.take_along_axis(block, top, axis=1))
+        indices, scores = np.vstack(all_indices), np.vstack(all_scores)
+        if k_eff < k:
+            pad = k - k_eff
+            indices = np.hstack([indices, np.full((len(indices), pad), -1)])
+            scores = np.hstack([scores, np.full((len(scores), pad), -np.inf)])
+        return indices, scores
+
+
+class IVFIndex:
+    """Инвертированный файл: векторы разбиты на n_lists кластеров,
+    запрос просматривает только n_probe ближайших кластеров.
+
+    n_probe - ручка полнота/задержка: n_probe == n_lists дает точный поиск,
+    меньшие значения - сублинейную стоимость запроса.
+    """
+    backend = 'ivf'
+
+    def __init__(self, n_lists=None, n_probe=8, random_state=42, **params):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+    def fit(self, vectors):
+        self.vectors = normalize(vectors)
+        n_items = self.vectors.shape[0]
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_items)))
+        n_lists = min(n_lists, n_items)
+
+        quantizer = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state,
+                                    n_init=1, batch_size=4096)
+        quantizer.fit(self.vectors)
+        self.centroids = normalize(np.asarray(quantizer.cluster_centers_, dtype=np.float32))
+
+        assignments = np.empty(n_items, dtype=np.int32)
+        for start in range(0, n_items, 8192):
+            block = dot_dense(self.vectors[start:start + 8192], self.centroids)
+            assignments[start:start + 8192] = block.argmax(axis=1)
+
+        self._set_lists(assignments)
+        return self
+
+    def _set_lists(self, assignments):
+        # Списки кластеров в CSR-виде: члены списка l - members[indptr[l]:indptr[l+1]]
+        self.list_members = np.argsort(assignments, kind='stable').astype(np.int32)
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self.list_indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def arrays(self):
+        return {'centroids': self.centroids, 'list_members': self.list_members,
+                'list_indptr': self.list_indptr}
+
+    def restore(self, vectors, arrays):
+        self.vectors = vectors
+        self.centroids = arrays['centroids']
+        self.list_members = arrays['list_members']
+        self.list_indptr = arrays['list_indptr']
+        return self
+
+    def update(self, vectors, rows):
+        # Центроиды не переобучаются: измененные векторы переносятся в ближайшие списки
+        assignments = np.empty(self.vectors.shape[0], dtype=np.int32)
+        for l in range(len(self.centroids)):
+            assignments[self.list_members[self.list_indptr[l]:self.list_indptr[l + 1]]] = l
+        assignments = np.concatenate([assignments, np.zeros(vectors.shape[0] - len(assignments), dtype=np.int32)])
+        rows = np.asarray(rows)
+        if len(rows):
+            assignments[rows] = dot_dense(vectors[rows], self.centroids).argmax(axis=1)
+        self.vectors = vectors
+        self._set_lists(assignments)
+        return self
+
+    def search(self, queries, k, n_probe=None):
+        queries = normalize(queries)
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probes = top_k_indices(dot_dense(queries, self.centroids), n_probe)
+
+        all_indices = np.empty((queries.shape[0], k), dtype=np.int64)
+        all_scores = np.empty((queries.shape[0], k))
+        for i, lists in enumerate(probes):
+            candidates = np.concatenate([
+                self.list_members[self.list_indptr[l]:self.list_indptr[l + 1]] for l in lists])
+            scores = dot_dense(queries[i:i + 1], self.vectors[candidates])[0]
+            top = top_k_indices(scores, k)[0]
+            all_indices[i], all_scores[i] = _pad(candidates[top].astype(np.int64), scores[top], k)
+        return all_indices, all_scores
+
+
+ANN_BACKENDS = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex,
+}
+
+
+def make_ann_index(backend, **params):
+    try:
+        return ANN_BACKENDS[backend](**params)
+    except KeyError:
+        raise ValueError(f"Неизвестный ANN-бэкенд: {backend!r}, доступны: {sorted(ANN_BACKENDS)}")
+
+
+def recall_report(vectors, k=10, n_probes=(1, 2, 4, 8, 16, 32), n_queries=1000, n_lists=None, seed=0):
+    """Полнота recall@k и время запроса IVF при разных n_probe относительно точного поиска"""
+    rng = np.random.default_rng(seed)
+    n_items = vectors.shape[0]
+    query_rows = rng.choice(n_items, size=min(n_queries, n_items), replace=False)
+    queries = vectors[query_rows]
+
+    exact = ExactIndex().fit(vectors)
+    started = time.perf_counter()
+    exact_indices, _ = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - started) * 1000 / len(query_rows)
+
+    ivf = IVFIndex(n_lists=n_lists).fit(vectors)
+    rows = [{'backend': 'exact', 'n_probe': None, 'recall': 1.0, 'ms_per_query': exact_ms}]
+    for n_probe in sorted({min(n_probe, len(ivf.centroids)) for n_probe in n_probes}):
+        started = time.perf_counter()
+        indices, _ = ivf.search(queries, k, n_probe=n_probe)
+        ms = (time.perf_counter() - started) * 1000 / len(query_rows)
+        hits = sum(len(np.intersect1d(a, b)) for a, b in zip(indices, exact_indices))
+        rows.append({'backend': 'ivf', 'n_probe': n_probe, 'n_lists': len(ivf.centroids),
+                     'recall': hits / exact_indices.size, 'ms_per_query': ms})
+    return rows
+
+
+def _synthetic_vectors(n_items, dim, seed=0):
+    # Кластеризованные данные, похожие на факторы SVD
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n_items // 500), dim))
+    labels = rng.integers(0, len(centers), n_items)
+    return centers[labels] + 0.5 * rng.normal(size=(n_items, dim))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчет о полноте ANN относительно точного поиска")
+    parser.add_argument('--items', type=int, default=None,
+                        help="размер синтетического каталога; без параметра берутся модели рекомендателя")
+    parser.add_argument('--dim', type=int, default=10)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--lists', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.items:
+        spaces = {'synthetic': _synthetic_vectors(args.items, args.dim)}
+    else:
+        from recommender import AdvancedBookRecommender
+        recommender = AdvancedBookRecommender()
+        # Модели из артефактов читаются по частям при первом запросе, факторы нужны все
+        recommender.ensure_models()
+        spaces = {'collab': recommender.reduced_matrix, 'content': recommender.tfidf_matrix}
+
+    print(f"{'space':<10} {'backend':<8} {'n_lists':>7} {'n_probe':>7} {'recall@k':>9} {'ms/query':>9}")
+    for name, vectors in spaces.items():
+        for row in recall_report(vectors, k=args.k, n_queries=args.queries, n_lists=args.lists):
+            print(f"{name:<10} {row['backend']:<8} {row.get('n_lists') or '-':>7} "
+                  f"{row['n_probe'] or '-':>7} {row['recall']:>9.3f} {row['ms_per_query']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
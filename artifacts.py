@@ -0,0 +1,185 @@
+"""Версионированное хранилище артефактов моделей.
+
+Каждая сохраненная версия артефактов лежит в своей папке root/<версия>/:
+    manifest.json   - отпечаток данных и настроек, формат, описание массивов
+    <name>.npy      - числовые массивы (загружаются через mmap без копирования)
+    <name>.joblib   - остальные объекты (модели sklearn), каждый в своем файле
+Файл root/CURRENT хранит имя текущей версии.
+
+Массивы и объекты можно читать по одному (array(), object()), поэтому
+части моделей загружаются только тогда, когда они нужны.
+
+Разреженные матрицы сохраняются тремя массивами CSR (data, indices, indptr).
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+ARTIFACT_FORMAT = 2
+
+# Файл с именем текущей версии артефактов
+CURRENT_FILE = "CURRENT"
+# Сколько последних версий save() оставляет на диске (текущая и предыдущая)
+KEEP_VERSIONS = 2
+# Папки .tmp моложе этого срока (в секундах) не удаляются: их может еще писать другой процесс
+STALE_SECONDS = 3600
+
+
+class ArtifactMismatchError(Exception):
+    """Артефакты на диске не соответствуют текущим данным, настройкам или формату"""
+
+
+def fingerprint(digests, settings):
+    """Отпечаток данных и настроек моделей (sha256); digests - {имя: sha256 данных}"""
+    digest = hashlib.sha256()
+    digest.update(f"format={ARTIFACT_FORMAT}".encode())
+    digest.update(json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str).encode())
+    digest.update(json.dumps(digests, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def frame_digest(frame):
+    """sha256 содержимого таблицы"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(frame.columns), len(frame)]).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Артефакты в папках версий; save() пишет новую версию и переключает CURRENT.
+
+    Файлы прежних версий не переименовываются и не перезаписываются: их массивы
+    могут быть еще открыты через mmap (на Windows такие файлы нельзя ни
+    переименовать, ни удалить). Процесс, который загрузил прежнюю версию и
+    читает ее части лениво, должен найти ее файлы и после переключения,
+    поэтому save() оставляет keep последних версий; остальные удаляются, а те,
+    что удалить не удалось, - при следующем save().
+    """
+
+    def __init__(self, root, keep=KEEP_VERSIONS, stale_seconds=STALE_SECONDS):
+        self.root = Path(root)
+        self.keep = keep
+        self.stale_seconds = stale_seconds
+
+    @property
+    def current_path(self):
+        return self.root / CURRENT_FILE
+
+    def current(self):
+        """Имя текущей версии; '' - артефакты старого формата прямо в root"""
+        try:
+            return self.current_path.read_text(encoding='utf-8').strip()
+        except FileNotFoundError:
+            return ''
+
+    def manifest(self):
+        """Манифест текущей версии; version - папка, из которой читаются ее файлы"""
+        version = self.current()
+        with open(self.root / version / "manifest.json", encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['version'] = version
+        return manifest
+
+    def save(self, fingerprint, arrays, objects=None, meta=None):
+        """Пишет новую версию во временную папку, переименовывает ее и атомарно переключает CURRENT"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        version = f"{fingerprint[:12]}-{uuid.uuid4().hex[:8]}"
+        tmp = self.root / f"{version}.tmp"
+        tmp.mkdir()
+
+        entries = {}
+        for name, value in arrays.items():
+            if sparse.issparse(value):
+                value = value.tocsr()
+                for part in ('data', 'indices', 'indptr'):
+                    np.save(tmp / f"{name}.{part}.npy", getattr(value, part))
+                entries[name] = {'kind': 'csr', 'shape': list(value.shape), 'dtype': str(value.dtype)}
+            else:
+                value = np.ascontiguousarray(value)
+                np.save(tmp / f"{name}.npy", value)
+                entries[name] = {'kind': 'dense', 'shape': list(value.shape), 'dtype': str(value.dtype)}
+        for name, value in (objects or {}).items():
+            joblib.dump(value, tmp / f"{name}.joblib")
+
+        manifest = {'format': ARTIFACT_FORMAT, 'fingerprint': fingerprint,
+                    'arrays': entries, 'objects': sorted(objects or {}), 'meta': meta or {}}
+        with open(tmp / "manifest.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        tmp.rename(self.root / version)
+        pointer = self.root / f"{CURRENT_FILE}.tmp"
+        pointer.write_text(version, encoding='utf-8')
+        os.replace(pointer, self.current_path)
+        self.remove_stale(version)
+
+    def remove_stale(self, version):
+        """Удаляет все, кроме версии version, CURRENT, keep последних версий и папок .tmp
+        моложе stale_seconds; занятые (открытые через mmap) файлы остаются"""
+        def modified(path):
+            # Папку мог уже удалить другой процесс
+            try:
+                return path.stat().st_mtime
+            except OSError:
+                return 0.0
+
+        paths = sorted((path for path in self.root.iterdir() if path.name not in (version, CURRENT_FILE)),
+                       key=modified, reverse=True)
+        versions = [path for path in paths if path.is_dir() and not path.name.endswith('.tmp')]
+        kept = set(versions[:max(self.keep - 1, 0)])
+        deadline = time.time() - self.stale_seconds
+        for path in paths:
+            if path in kept or path.name.endswith('.tmp') and modified(path) > deadline:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def check(self, fingerprint):
+        """Манифест артефактов; FileNotFoundError если их нет, ArtifactMismatchError если чужие"""
+        manifest = self.manifest()
+        if manifest.get('format') != ARTIFACT_FORMAT:
+            raise ArtifactMismatchError(
+                f"формат артефактов {manifest.get('format')}, ожидается {ARTIFACT_FORMAT}")
+        if manifest.get('fingerprint') != fingerprint:
+            raise ArtifactMismatchError(
+                f"артефакты собраны для других данных или настроек ({manifest.get('fingerprint', '')[:12]})")
+        return manifest
+
+    def array(self, manifest, name, mmap_mode='r'):
+        """Один массив из проверенного манифеста; открывается через mmap_mode"""
+        entry = manifest['arrays'][name]
+        if entry['kind'] == 'csr':
+            parts = [np.load(self.root / manifest['version'] / f"{name}.{part}.npy", mmap_mode=mmap_mode)
+                     for part in ('data', 'indices', 'indptr')]
+            value = sparse.csr_matrix(tuple(parts), shape=tuple(entry['shape']))
+        else:
+            value = np.load(self.root / manifest['version'] / f"{name}.npy", mmap_mode=mmap_mode)
+        if list(value.shape) != entry['shape'] or str(value.dtype) != entry['dtype']:
+            raise ArtifactMismatchError(f"массив {name} поврежден: {value.shape} {value.dtype}")
+        return value
+
+    def object(self, manifest, name, mmap_mode='r'):
+        if name not in manifest['objects']:
+            raise ArtifactMismatchError(f"в артефактах нет объекта {name}")
+        return joblib.load(self.root / manifest['version'] / f"{name}.joblib", mmap_mode=mmap_mode)
+
+    def load(self, fingerprint, mmap_mode='r'):
+        """Возвращает (arrays, objects, meta); массивы открываются через mmap_mode"""
+        manifest = self.check(fingerprint)
+        arrays = {name: self.array(manifest, name, mmap_mode) for name in manifest['arrays']}
+        objects = {name: self.object(manifest, name, mmap_mode) for name in manifest['objects']}
+        return arrays, objects, manifest['meta']
@@ -0,0 +1,296 @@
+"""Бенчмарк обучения и запросов на синтетических каталогах разного размера.
+
+Для каждого размера каталога в отдельных процессах (чтобы пиковая память
+не смешивалась между размерами) измеряются:
+    - этапы prepare_models: TF-IDF, SVD, индексы похожести, ANN (KNN), KMeans, сохранение
+      (таймеры training_stage_seconds из metrics.py; этапы идут параллельно, поэтому
+      их сумма может быть больше train_s), размеры моделей в памяти
+    - задержки запросов каждого метода (кэш результатов выключен)
+    - пиковый RSS при обучении и при загрузке
+    - холодный старт через load_models: новый процесс, файлы данных и артефактов
+      перед стартом выгружены из страничного кэша ОС (posix_fadvise; где его нет,
+      например на Windows и macOS, cold_page_cache_dropped = false и холодный
+      старт на деле теплый)
+    - теплый старт: новый процесс, файлы уже в страничном кэше
+    - ленивый старт и его первый запрос
+
+Результат пишется в JSON; режим --compare сравнивает два таких файла и
+завершается с кодом 1, если какая-то метрика выросла больше порога
+(изменения в пределах шума NOISE_FLOOR не считаются).
+
+    python benchmark.py --sizes 1000,10000,50000 --out bench.json
+    python benchmark.py --sizes 50000 --precision int8 --out bench-int8.json
+    python benchmark.py --compare base.json bench.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+QUERY_METHODS = {
+    'content': lambda recommender, book_id, top_n: recommender.get_recommendations(book_id, 'content', top_n),
+    'collab': lambda recommender, book_id, top_n: recommender.get_recommendations(book_id, 'collab', top_n),
+    'hybrid': lambda recommender, book_id, top_n: recommender.get_recommendations(book_id, 'hybrid', top_n),
+    'cluster': lambda recommender, book_id, top_n: recommender.get_recommendations(book_id, 'cluster', top_n),
+    'knn': lambda recommender, book_id, top_n: recommender.get_knn_recommendations(book_id, top_n),
+    'diverse': lambda recommender, book_id, top_n: recommender.get_diverse_recommendations(book_id, top_n),
+}
+
+# Метрики, которые описывают размер задачи, а не производительность
+SIZE_FIELDS = ('books', 'users', 'ratings')
+
+# Изменения меньше этого (по единице метрики) считаются шумом при сравнении
+NOISE_FLOOR = {'ms': 0.5, 'mb': 5.0, 's': 0.01}
+
+
+def stage_seconds(registry, name, label):
+    """{значение метки: секунды} для таймера name из MetricsRegistry"""
+    return {entry['labels'][label]: round(entry['sum'], 4)
+            for entry in registry.snapshot().get(name, []) if label in entry['labels']}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def latency_summary(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {'mean_ms': round(float(ms.mean()), 4), 'p50_ms': round(float(np.percentile(ms, 50)), 4),
+            'p99_ms': round(float(np.percentile(ms, 99)), 4)}
+
+
+def drop_page_cache(root):
+    """Выгружает файлы из root из страничного кэша ОС; False, если ОС этого не умеет"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for path in Path(root).rglob('*'):
+        if path.is_file():
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)   # грязные страницы из кэша не выгружаются
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+    return True
+
+
+def recommender_config(workdir, precision, lazy_models=True):
+    return {'books_path': str(workdir / "books.csv"), 'ratings_path': str(workdir / "ratings.csv"),
+            'models_path': str(workdir / "models"), 'cache_entries': 0, 'lazy_models': lazy_models,
+            'factor_precision': precision}
+
+
+def phase_train(args):
+    """Генерация данных, обучение с нуля и задержки запросов"""
+    from datagen import generate_books, iter_ratings, write_frames
+    from metrics import Metrics, MetricsRegistry
+    from recommender import AdvancedBookRecommender
+
+    workdir = Path(args.workdir)
+    started = time.perf_counter()
+    write_frames(workdir / "books.csv", [generate_books(args.size, seed=args.seed)])
+    density = min(1.0, args.ratings_per_user / args.size)
+    n_ratings = write_frames(workdir / "ratings.csv", iter_ratings(args.users, args.size, density, args.seed))
+    generate_s = time.perf_counter() - started
+
+    registry = MetricsRegistry()
+    started = time.perf_counter()
+    recommender = AdvancedBookRecommender(recommender_config(workdir, args.precision), metrics=Metrics(registry))
+    train_s = time.perf_counter() - started
+    stages = {'load_data': round(registry.value('data_load_seconds'), 4),
+              **stage_seconds(registry, 'training_stage_seconds', 'stage')}
+    model_mb = {part: round(size / 2**20, 3) for part, size in recommender.model_sizes().items()}
+    model_mb['catalog'] = round(recommender.catalog.nbytes / 2**20, 3)
+
+    rng = np.random.default_rng(args.seed)
+    book_ids = rng.choice(recommender.book_ids, args.queries)
+    queries = {}
+    for method, query in QUERY_METHODS.items():
+        query(recommender, book_ids[0], args.top_n)   # прогрев: ленивые части моделей, импорты
+        seconds = []
+        for book_id in book_ids:
+            query_started = time.perf_counter()
+            query(recommender, book_id, args.top_n)
+            seconds.append(time.perf_counter() - query_started)
+        queries[method] = latency_summary(seconds)
+
+    return {'books': args.size, 'users': args.users, 'ratings': n_ratings,
+            'generate_s': round(generate_s, 4), 'train_s': round(train_s, 4),
+            'stages': stages, 'model_mb': model_mb, 'queries': queries, 'train_peak_rss_mb': peak_rss_mb()}
+
+
+def start_seconds(workdir, precision, lazy):
+    """(секунды старта, секунды чтения артефактов) одного запуска рекомендателя"""
+    from metrics import Metrics, MetricsRegistry
+    from recommender import AdvancedBookRecommender
+
+    registry = MetricsRegistry()
+    started = time.perf_counter()
+    recommender = AdvancedBookRecommender(recommender_config(workdir, precision, lazy_models=lazy),
+                                          metrics=Metrics(registry))
+    seconds = time.perf_counter() - started
+    return recommender, seconds, sum(stage_seconds(registry, 'artifact_load_seconds', 'part').values())
+
+
+def phase_cold(args):
+    """Полный старт в новом процессе, файлы данных и артефактов не в страничном кэше"""
+    workdir = Path(args.workdir)
+    dropped = drop_page_cache(workdir)
+    _, seconds, load_seconds = start_seconds(workdir, args.precision, lazy=False)
+    return {'startup': {'cold_start_s': round(seconds, 4), 'cold_load_models_s': round(load_seconds, 4),
+                        'cold_page_cache_dropped': dropped}}
+
+
+def phase_load(args):
+    """Старт по готовым артефактам в новом процессе, файлы в страничном кэше: полный и ленивый"""
+    workdir = Path(args.workdir)
+    startup = {}
+    for name, lazy in (('warm', False), ('lazy', True)):
+        recommender, seconds, load_seconds = start_seconds(workdir, args.precision, lazy)
+        startup[f'{name}_start_s'] = round(seconds, 4)
+        startup[f'{name}_load_models_s'] = round(load_seconds, 4)
+    started = time.perf_counter()
+    recommender.get_recommendations(recommender.book_ids[0], 'content', args.top_n)
+    startup['lazy_first_query_ms'] = round((time.perf_counter() - started) * 1000, 4)
+    return {'startup': startup, 'load_peak_rss_mb': peak_rss_mb()}
+
+
+def run_phase(phase, args, size, workdir):
+    command = [sys.executable, __file__, '--phase', phase, '--size', str(size), '--workdir', str(workdir),
+               '--users', str(args.users or size), '--ratings-per-user', str(args.ratings_per_user),
+               '--queries', str(args.queries), '--top-n', str(args.top_n), '--seed', str(args.seed),
+               '--precision', args.precision]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    # Рекомендатель печатает свои сообщения; результат фазы - последняя строка
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def environment():
+    import pandas, scipy, sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'commit': commit,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'numpy': np.__version__,
+            'pandas': pandas.__version__, 'scipy': scipy.__version__, 'sklearn': sklearn.__version__}
+
+
+def run_benchmark(args):
+    results = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        workdir = Path(tempfile.mkdtemp(prefix=f"bench-{size}-"))
+        try:
+            print(f"Каталог {size} книг...", file=sys.stderr)
+            result = run_phase('train', args, size, workdir)
+            cold = run_phase('cold', args, size, workdir)
+            result.update(run_phase('load', args, size, workdir))
+            result['startup'].update(cold['startup'])
+            results.append(result)
+            print(f"  обучение {result['train_s']:.2f} с, холодный старт {result['startup']['cold_start_s']:.2f} с, "
+                  f"пик RSS {result['train_peak_rss_mb']} МБ"
+                  f"{'' if result['startup']['cold_page_cache_dropped'] else ' (страничный кэш не сброшен)'}",
+                  file=sys.stderr)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {'environment': environment(),
+            'settings': {'queries': args.queries, 'top_n': args.top_n,
+                         'ratings_per_user': args.ratings_per_user, 'seed': args.seed,
+                         'precision': args.precision},
+            'results': results}
+
+
+def flatten(report):
+    """{(книг, метрика): значение} для всех числовых метрик отчета"""
+    metrics = {}
+
+    def walk(prefix, value, books):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, item, books)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and prefix not in SIZE_FIELDS:
+            metrics[(books, prefix)] = value
+
+    for result in report['results']:
+        walk('', result, result['books'])
+    return metrics
+
+
+def compare(base_path, new_path, threshold):
+    """Печатает изменения метрик; возвращает число регрессий (все метрики - чем меньше, тем лучше)"""
+    base = flatten(json.loads(Path(base_path).read_text(encoding='utf-8')))
+    new = flatten(json.loads(Path(new_path).read_text(encoding='utf-8')))
+    regressions = 0
+    print(f"{'книг':>8} {'метрика':<36} {'было':>12} {'стало':>12} {'изменение':>10}")
+    for key in sorted(base.keys() & new.keys()):
+        old_value, new_value = base[key], new[key]
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        unit = key[1].rsplit('_', 1)[-1] if key[1].endswith(('_ms', '_mb')) else 's'
+        regressed = change > threshold and new_value - old_value > NOISE_FLOOR[unit]
+        regressions += regressed
+        print(f"{key[0]:>8} {key[1]:<36} {old_value:>12.4f} {new_value:>12.4f} {change:>+10.1%}"
+              f"{'  РЕГРЕССИЯ' if regressed else ''}")
+    missing = sorted(base.keys() - new.keys())
+    if missing:
+        print(f"Нет в новом отчете: {len(missing)} метрик, например {missing[0]}")
+    return regressions
+
+
+PHASES = {'train': phase_train, 'cold': phase_cold, 'load': phase_load}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк обучения и запросов рекомендателя")
+    parser.add_argument('--sizes', default='1000,5000,20000', help="размеры каталогов через запятую")
+    parser.add_argument('--users', type=int, default=None, help="пользователей; по умолчанию равно числу книг")
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=200, help="запросов на метод")
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--precision', default='float64', choices=('float64', 'float32', 'int8'),
+                        help="точность хранения факторов (factor_precision, см. quantize.py)")
+    parser.add_argument('--out', default='benchmark.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="сравнить два отчета")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимый рост метрики (доля)")
+    # Внутренние параметры запуска одной фазы в отдельном процессе
+    parser.add_argument('--phase', choices=PHASES, help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        print(f"Регрессий: {regressions}")
+        sys.exit(1 if regressions else 0)
+    if args.phase:
+        result = PHASES[args.phase](args)
+        print(json.dumps(result))
+        return
+
+    report = run_benchmark(args)
+    Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"Отчет: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def estimate_size(value):
+    """Примерный размер результата в байтах"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, np.ndarray) or hasattr(value, 'nbytes'):
+        # Массивы и легкие результаты (catalog.Recommendations) знают свой размер
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def take_prefix(value, top_n):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.head(top_n)
+    if isinstance(value, tuple):
+        return tuple(take_prefix(item, top_n) for item in value)
+    return value[:top_n]
+
+
+class ResultCache:
+    """LRU-кэш результатов рекомендаций с ограничением по числу записей, памяти и TTL.
+
+    Ключ записи - (версия модели, *key). При смене версии (переобучение,
+    загрузка других моделей) старые записи удаляются. Если результат помечен
+    как префиксный (prefix=True), запрос top_n=5 обслуживается из записи с
+    top_n=10 для того же ключа.
+    """
+
+    def __init__(self, max_entries=4096, max_bytes=64 * 1024 * 1024, ttl=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def set_version(self, version):
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def get(self, key, top_n):
+        full_key = (self.version,) + tuple(key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None and entry['expires'] is not None and entry['expires'] <= self.clock():
+                self._drop(full_key)
+                self.expirations += 1
+                entry = None
+            if entry is None or not (entry['top_n'] == top_n or (entry['prefix'] and entry['top_n'] >= top_n)):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            value = entry['value']
+        return value if entry['top_n'] == top_n else take_prefix(value, top_n)
+
+    def put(self, key, top_n, value, prefix=True):
+        full_key = (self.version,) + tuple(key)
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            current = self._entries.get(full_key)
+            if current is not None:
+                # Более длинный префиксный результат не вытесняем более коротким
+                if current['prefix'] and prefix and current['top_n'] > top_n:
+                    return
+                self._drop(full_key)
+            expires = self.clock() + self.ttl if self.ttl else None
+            self._entries[full_key] = {'top_n': top_n, 'value': value, 'size': size,
+                                       'prefix': prefix, 'expires': expires}
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, full_key):
+        self._bytes -= self._entries.pop(full_key)['size']
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,313 @@
+"""Компактный колоночный каталог книг и легкие результаты рекомендаций.
+
+BookCatalog хранит каталог не как DataFrame с объектными колонками, а как
+набор массивов:
+    book_id      int32
+    popularity   float32
+    author/genre коды int32 + словарь уникальных значений (каждая строка один раз)
+    title/description  StringColumn: все строки одним буфером UTF-8 + смещения
+
+persist() сохраняет массивы в ArtifactStore и открывает их заново через mmap,
+поэтому описания и названия лежат на диске и читаются страницами по мере
+обращения, а в памяти процесса остаются только числовые колонки.
+
+Recommendations - результат метода рекомендаций: позиции книг и оценки.
+Поля книг (название, автор, ...) собираются только при обращении к ним:
+book(i), records(), to_frame().
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ArtifactMismatchError, ArtifactStore
+
+CATALOG_FIELDS = ('book_id', 'title', 'author', 'genre', 'description', 'popularity')
+STRING_FIELDS = ('title', 'description')
+CATEGORICAL_FIELDS = ('author', 'genre')
+
+
+def array_digest(array):
+    """sha256 массива без копии в память (для mmap - чтение страниц по порядку)"""
+    return hashlib.sha256(np.ascontiguousarray(array).view(np.uint8).data).hexdigest()
+
+
+class StringColumn:
+    """Строки в одном буфере UTF-8: строка i - data[offsets[i]:offsets[i+1]]"""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_strings(cls, values):
+        encoded = [str(value).encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return bytes(self.data[self.offsets[row]:self.offsets[row + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        # Буфер читается блоками, а не целиком (для mmap - постранично)
+        for start in range(0, len(self), 65536):
+            stop = min(start + 65536, len(self))
+            base = self.offsets[start]
+            chunk = bytes(self.data[base:self.offsets[stop]])
+            bounds = (self.offsets[start:stop + 1] - base).tolist()
+            for begin, end in zip(bounds[:-1], bounds[1:]):
+                yield chunk[begin:end].decode('utf-8')
+
+    def take(self, rows):
+        rows = np.asarray(rows)
+        data = memoryview(self.data)
+        return [str(data[start:stop], 'utf-8')
+                for start, stop in zip(self.offsets[rows].tolist(), self.offsets[rows + 1].tolist())]
+
+    def concat(self, other):
+        offsets = np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        return StringColumn(offsets, np.concatenate([self.data, other.data]))
+
+    def arrays(self, prefix):
+        return {f'{prefix}.offsets': self.offsets, f'{prefix}.data': self.data}
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.data.nbytes
+
+    def digest(self):
+        return hashlib.sha256(f"{array_digest(self.offsets)}:{array_digest(self.data)}".encode()).hexdigest()
+
+
+class CategoricalColumn:
+    """Коды строк и словарь значений: одинаковые авторы и жанры хранятся один раз"""
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories   # StringColumn уникальных значений
+        self._values = None
+
+    @classmethod
+    def from_values(cls, values):
+        categorical = pd.Categorical(values)
+        categories = StringColumn.from_strings(categorical.categories)
+        return cls(categorical.codes.astype(np.int32), categories)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def values(self):
+        """Словарь как массив Python-строк; уникальных значений немного, поэтому он кэшируется"""
+        if self._values is None:
+            self._values = np.array(list(self.categories), dtype=object)
+        return self._values
+
+    def __getitem__(self, row):
+        return self.values()[self.codes[row]]
+
+    def __iter__(self):
+        values = self.values()
+        for start in range(0, len(self), 65536):
+            yield from values[self.codes[start:start + 65536]]
+
+    def take(self, rows):
+        return self.values()[self.codes[np.asarray(rows)]].tolist()
+
+    def concat(self, values):
+        """Новая колонка с добавленными в конец значениями values.
+
+        Словарь остается отсортированным, как у from_values: колонка (и ее digest)
+        совпадает с построенной заново по всем значениям.
+        """
+        known = pd.Index(self.values())
+        values = pd.Index(pd.Series(values, dtype=object).astype(str))
+        new = values.unique().difference(known)
+        if not len(new):
+            return CategoricalColumn(np.concatenate([self.codes, known.get_indexer(values).astype(np.int32)]),
+                                     self.categories)
+        categories = known.append(new).sort_values()
+        remap = categories.get_indexer(known).astype(np.int32)
+        codes = np.concatenate([remap[self.codes], categories.get_indexer(values).astype(np.int32)])
+        return CategoricalColumn(codes, StringColumn.from_strings(categories))
+
+    def arrays(self, prefix):
+        return {f'{prefix}.codes': self.codes, **self.categories.arrays(f'{prefix}.categories')}
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.categories.nbytes
+
+    def digest(self):
+        return hashlib.sha256(f"{array_digest(self.codes)}:{self.categories.digest()}".encode()).hexdigest()
+
+
+class BookCatalog:
+    def __init__(self, book_ids, title, author, genre, description, popularity):
+        self.book_ids = book_ids
+        self.columns = {'book_id': book_ids, 'title': title, 'author': author, 'genre': genre,
+                        'description': description, 'popularity': popularity}
+        self._digests = {}
+
+    @classmethod
+    def from_frame(cls, books):
+        return cls(book_ids=books['book_id'].to_numpy().astype(np.int32),
+                   title=StringColumn.from_strings(books['title']),
+                   author=CategoricalColumn.from_values(books['author'].astype(str)),
+                   genre=CategoricalColumn.from_values(books['genre'].astype(str)),
+                   description=StringColumn.from_strings(books['description']),
+                   popularity=books['popularity'].to_numpy().astype(np.float32))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        def strings(prefix):
+            return StringColumn(arrays[f'{prefix}.offsets'], arrays[f'{prefix}.data'])
+
+        def categorical(prefix):
+            return CategoricalColumn(arrays[f'{prefix}.codes'], strings(f'{prefix}.categories'))
+
+        return cls(book_ids=arrays['book_id'], title=strings('title'), author=categorical('author'),
+                   genre=categorical('genre'), description=strings('description'),
+                   popularity=arrays['popularity'])
+
+    def arrays(self):
+        arrays = {'book_id': self.book_ids, 'popularity': self.popularity}
+        for field in STRING_FIELDS + CATEGORICAL_FIELDS:
+            arrays.update(self.columns[field].arrays(field))
+        return arrays
+
+    def persist(self, root):
+        """Каталог, открытый через mmap из root; массивы пишутся, только если их там еще нет"""
+        store = ArtifactStore(root)
+        digest = self.digest()
+        try:
+            manifest = store.check(digest)
+        except (FileNotFoundError, ArtifactMismatchError):
+            store.save(digest, self.arrays())
+            manifest = store.check(digest)
+        catalog = BookCatalog.from_arrays({name: store.array(manifest, name) for name in manifest['arrays']})
+        catalog._digests = self._digests
+        return catalog
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def __getitem__(self, field):
+        """Колонка целиком: массив numpy или StringColumn/CategoricalColumn (итерируются строками)"""
+        return self.columns[field]
+
+    @property
+    def popularity(self):
+        return self.columns['popularity']
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    def values(self, field, rows):
+        """Значения поля для позиций rows как список Python-объектов"""
+        column = self.columns[field]
+        if not isinstance(column, np.ndarray):
+            return column.take(rows)
+        values = column[np.asarray(rows)]
+        if values.dtype == np.float32:
+            # Кратчайшая запись float32 (9.2, а не 9.199999809265137)
+            return [float(str(value)) for value in values]
+        return values.tolist()
+
+    def records(self, rows, fields=CATALOG_FIELDS):
+        """Список словарей {поле: значение} для позиций rows"""
+        columns = [self.values(field, rows) for field in fields]
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+
+    def to_frame(self, rows=None, fields=CATALOG_FIELDS):
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        return pd.DataFrame({field: self.values(field, rows) for field in fields},
+                            index=pd.RangeIndex(len(rows)))
+
+    def metadata(self):
+        """Тексты для TF-IDF ('жанр автор описание') по порядку книг, без общей колонки в памяти"""
+        for genre, author, description in zip(self['genre'], self['author'], self['description']):
+            yield f"{genre} {author} {description}"
+
+    def append(self, books):
+        """Новый каталог с книгами из DataFrame books в конце"""
+        new = BookCatalog.from_frame(books)
+        return BookCatalog(
+            book_ids=np.concatenate([self.book_ids, new.book_ids]),
+            title=self['title'].concat(new['title']),
+            author=self['author'].concat(books['author'].astype(str)),
+            genre=self['genre'].concat(books['genre'].astype(str)),
+            description=self['description'].concat(new['description']),
+            popularity=np.concatenate([self.popularity, new.popularity]))
+
+    def digest(self, fields=CATALOG_FIELDS):
+        """sha256 содержимого полей fields (для отпечатков моделей и этапов обучения)"""
+        digest = hashlib.sha256()
+        digest.update(str(len(self)).encode())
+        for field in fields:
+            if field not in self._digests:
+                column = self.columns[field]
+                self._digests[field] = array_digest(column) if isinstance(column, np.ndarray) else column.digest()
+            digest.update(f"{field}={self._digests[field]}".encode())
+        return digest.hexdigest()
+
+
+class Recommendations:
+    """Результат рекомендаций: позиции книг в каталоге и оценки.
+
+    Хранит только два массива; поля книг читаются из каталога при обращении:
+    book(i) / result[i] - словарь одной книги, records() и to_frame() - всех.
+    Срез result[:n] - тоже Recommendations (кэш отдает префиксы результатов).
+    """
+
+    def __init__(self, catalog, rows, scores=None):
+        self.catalog = catalog
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.scores = None if scores is None else np.asarray(scores, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def empty(self):
+        return len(self.rows) == 0
+
+    @property
+    def book_ids(self):
+        return self.catalog.book_ids[self.rows]
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + (0 if self.scores is None else self.scores.nbytes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Recommendations(self.catalog, self.rows[index],
+                                   None if self.scores is None else self.scores[index])
+        return self.book(index)
+
+    def __iter__(self):
+        return iter(self.records())
+
+    def book(self, i, fields=CATALOG_FIELDS):
+        record = self.catalog.records(self.rows[[i]], fields)[0]
+        if self.scores is not None:
+            record['score'] = float(self.scores[i])
+        return record
+
+    def records(self, fields=CATALOG_FIELDS):
+        records = self.catalog.records(self.rows, fields)
+        if self.scores is not None:
+            for record, score in zip(records, self.scores.tolist()):
+                record['score'] = score
+        return records
+
+    def to_frame(self, fields=CATALOG_FIELDS):
+        frame = self.catalog.to_frame(self.rows, fields)
+        if self.scores is not None:
+            frame['score'] = self.scores
+        return frame
@@ -0,0 +1,127 @@
+"""Общий сервис обложек для интерфейса.
+
+- LRU-кэш готовых QPixmap в памяти (ключ - книга и размер)
+- кэш скачанных файлов на диске (data/covers/)
+- одна загрузка на URL, сколько бы виджетов ни ждали обложку
+- ограниченный общий пул потоков вместо потока на каждую строку списка
+
+Сеть и диск обрабатываются в пуле (QImage безопасен вне GUI-потока),
+QPixmap создается только в GUI-потоке по сигналу.
+"""
+import hashlib
+import os
+import urllib.request
+from collections import OrderedDict
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QRunnable, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+
+
+def cover_key(book_id):
+    """Единый ключ книги: в JSON id - строки, во встроенном словаре и в DataFrame - числа"""
+    try:
+        return str(int(book_id))
+    except (TypeError, ValueError):
+        return str(book_id)
+
+
+class _JobSignals(QObject):
+    loaded = pyqtSignal(str, QImage)
+    failed = pyqtSignal(str)
+
+
+class _CoverJob(QRunnable):
+    def __init__(self, url, path, signals, timeout):
+        super().__init__()
+        self.url = url
+        self.path = path
+        self.signals = signals
+        self.timeout = timeout
+
+    def run(self):
+        try:
+            if self.path.exists():
+                data = self.path.read_bytes()
+            else:
+                request = urllib.request.Request(self.url, headers={'User-Agent': 'Mozilla/5.0'})
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    data = response.read()
+                tmp = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+                tmp.write_bytes(data)
+                tmp.replace(self.path)
+            image = QImage.fromData(data)
+            if image.isNull():
+                raise ValueError("не удалось декодировать изображение")
+            self.signals.loaded.emit(self.url, image)
+        except Exception:
+            self.signals.failed.emit(self.url)
+
+
+class CoverService(QObject):
+    """Выдает обложки по book_id.
+
+    cover() сразу возвращает QPixmap из памяти или None; во втором случае
+    обложка загружается в фоне и приходит сигналом cover_ready(key, size, pixmap)
+    или cover_failed(key). Подписываться на сигналы нужно до вызова cover().
+    """
+    cover_ready = pyqtSignal(str, QSize, QPixmap)
+    cover_failed = pyqtSignal(str)
+
+    def __init__(self, book_images, cache_dir="data/covers", max_pixmaps=256, max_threads=4,
+                 timeout=10, parent=None):
+        super().__init__(parent)
+        self.urls = {cover_key(book_id): url for book_id, url in book_images.items()}
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_pixmaps = max_pixmaps
+        self.timeout = timeout
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._pixmaps = OrderedDict()
+        self._waiters = {}   # url -> {(key, width, height)}
+        self._failed = set()
+        self._signals = _JobSignals(self)
+        self._signals.loaded.connect(self._on_loaded)
+        self._signals.failed.connect(self._on_failed)
+
+    def has_cover(self, book_id):
+        return cover_key(book_id) in self.urls
+
+    def cached(self, book_id, size):
+        pixmap_key = (cover_key(book_id), size.width(), size.height())
+        pixmap = self._pixmaps.get(pixmap_key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(pixmap_key)
+        return pixmap
+
+    def cover(self, book_id, size):
+        key = cover_key(book_id)
+        pixmap = self.cached(key, size)
+        if pixmap is not None:
+            return pixmap
+        url = self.urls.get(key)
+        if url is None or url in self._failed:
+            self.cover_failed.emit(key)
+            return None
+
+        in_flight = url in self._waiters
+        self._waiters.setdefault(url, set()).add((key, size.width(), size.height()))
+        if not in_flight:
+            path = self.cache_dir / hashlib.sha1(url.encode('utf-8')).hexdigest()
+            self.pool.start(_CoverJob(url, path, self._signals, self.timeout))
+        return None
+
+    def _on_loaded(self, url, image):
+        for key, width, height in self._waiters.pop(url, ()):
+            pixmap = QPixmap.fromImage(image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            self._pixmaps[(key, width, height)] = pixmap
+            self._pixmaps.move_to_end((key, width, height))
+            while len(self._pixmaps) > self.max_pixmaps:
+                self._pixmaps.popitem(last=False)
+            self.cover_ready.emit(key, QSize(width, height), pixmap)
+
+    def _on_failed(self, url):
+        self._failed.add(url)
+        for key in {key for key, _, _ in self._waiters.pop(url, ())}:
+            self.cover_failed.emit(key)
@@ -0,0 +1,149 @@
+"""Векторизованная генерация синтетических каталогов и оценок для нагрузочных тестов.
+
+Модель оценок та же, что в AdvancedBookRecommender.load_extended_data:
+у пользователя три скрытых предпочтения ~ N(0, 1), у книги - one-hot жанр
+и популярность, оценка = clip((pref · жанр[:3] + N(0, 0.5) + popularity/2 - 4)*2 + 3, 1, 5).
+Каждая пара пользователь-книга попадает в выборку с вероятностью density.
+
+Генерация идет блоками пользователей, поэтому можно писать на диск потоково:
+    python datagen.py --users 1000000 --books 100000 --density 0.001 \\
+        --ratings-out data/ratings.parquet --books-out data/books.parquet
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+GENRES = ['Антиутопия', 'Классика', 'Детектив', 'Исторический роман', 'Роман',
+          'Фэнтези', 'Магический реализм', 'Комедия', 'Философская сказка', 'Поэзия']
+
+DESCRIPTION_WORDS = ['история', 'любовь', 'война', 'дружба', 'тайна', 'путешествие', 'семья',
+                     'общество', 'магия', 'судьба', 'преступление', 'взросление', 'власть',
+                     'свобода', 'одиночество', 'надежда', 'город', 'деревня', 'море', 'будущее']
+
+RATINGS_PER_CHUNK = 1_000_000
+
+
+def book_features_from(genre_codes, popularity, n_genres=len(GENRES)):
+    """Матрица признаков книг: one-hot жанр + популярность в последней колонке"""
+    features = np.zeros((len(genre_codes), n_genres + 1))
+    features[np.arange(len(genre_codes)), genre_codes] = 1
+    features[:, -1] = popularity
+    return features
+
+
+def _genres_and_popularity(rng, num_books):
+    # Первыми из генератора берутся жанры и популярность, чтобы generate_books и
+    # iter_ratings с одним seed описывали одни и те же книги
+    return rng.integers(0, len(GENRES), num_books), np.round(rng.uniform(8.5, 9.7, num_books), 1)
+
+
+def generate_books(num_books, seed=42, num_authors=None):
+    """Синтетический каталог в формате load_extended_data"""
+    rng = np.random.default_rng(seed)
+    num_authors = num_authors or max(1, num_books // 5)
+    genre_codes, popularity = _genres_and_popularity(rng, num_books)
+    author_codes = rng.integers(0, num_authors, num_books)
+    words = np.asarray(DESCRIPTION_WORDS, dtype=object)[rng.integers(0, len(DESCRIPTION_WORDS), (num_books, 4))]
+    return pd.DataFrame({
+        'book_id': np.arange(1, num_books + 1, dtype=np.int32),
+        'title': pd.Series(np.arange(1, num_books + 1)).map('Книга {}'.format),
+        'author': pd.Categorical.from_codes(author_codes, [f'Автор {i}' for i in range(1, num_authors + 1)]),
+        'genre': pd.Categorical.from_codes(genre_codes, GENRES),
+        'description': [' '.join(row) for row in words],
+        'popularity': popularity.astype(np.float32),
+    })
+
+
+def default_chunk_users(num_books, density):
+    return max(1, int(RATINGS_PER_CHUNK / max(num_books * density, 1)))
+
+
+def iter_ratings(num_users, num_books, density=0.3, seed=42, book_features=None, chunk_users=None):
+    """Генерирует оценки блоками пользователей; каждый блок - DataFrame (user_id, book_id, rating).
+
+    Результат определяется параметрами и chunk_users (по умолчанию вычисляется
+    из num_books и density), а не тем, как потребитель читает блоки.
+    """
+    if book_features is None:
+        book_features = book_features_from(*_genres_and_popularity(np.random.default_rng(seed), num_books))
+    book_features = np.asarray(book_features, dtype=np.float64)[:num_books]
+    taste = book_features[:, :3]
+    popularity_term = book_features[:, -1] / 2 - 4
+
+    chunk_users = chunk_users or default_chunk_users(num_books, density)
+    chunk_seeds = np.random.SeedSequence(seed).spawn((num_users + chunk_users - 1) // chunk_users)
+
+    for chunk, user_start in zip(chunk_seeds, range(0, num_users, chunk_users)):
+        rng = np.random.default_rng(chunk)
+        users = min(chunk_users, num_users - user_start)
+        preferences = rng.normal(loc=0, scale=1, size=(users, 3))
+
+        # Bernoulli(density) по всем ячейкам блока = биномиальное число ячеек без повторов
+        cells = users * num_books
+        picked = np.sort(rng.choice(cells, size=rng.binomial(cells, density), replace=False))
+        user_idx, book_idx = np.divmod(picked, num_books)
+
+        base = np.einsum('ij,ij->i', preferences[user_idx], taste[book_idx])
+        noise = rng.normal(0, 0.5, len(picked))
+        rating = np.clip((base + noise + popularity_term[book_idx])*2 + 3, 1, 5)
+
+        yield pd.DataFrame({
+            'user_id': (user_idx + user_start + 1).astype(np.int32),
+            'book_id': (book_idx + 1).astype(np.int32),
+            'rating': np.rint(rating).astype(np.int8),
+        })
+
+
+def generate_ratings(num_users, num_books, density=0.3, seed=42, book_features=None, chunk_users=None):
+    chunks = list(iter_ratings(num_users, num_books, density, seed, book_features, chunk_users))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_frames(path, frames):
+    """Потоково пишет блоки DataFrame в CSV или Parquet (по расширению файла)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows = 0
+    if path.suffix == '.parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for frame in frames:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows += len(frame)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        for i, frame in enumerate(frames):
+            frame.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            rows += len(frame)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетического каталога и оценок")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--books', type=int, default=15)
+    parser.add_argument('--density', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-users', type=int, default=None)
+    parser.add_argument('--ratings-out', default='data/ratings.csv')
+    parser.add_argument('--books-out', default=None)
+    args = parser.parse_args()
+
+    if args.books_out:
+        write_frames(args.books_out, [generate_books(args.books, seed=args.seed)])
+    rows = write_frames(args.ratings_out, iter_ratings(
+        args.users, args.books, args.density, args.seed, chunk_users=args.chunk_users))
+    print(f"{rows} оценок записано в {args.ratings_out}")
+
+
+if __name__ == "__main__":
+    main()
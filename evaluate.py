@@ -0,0 +1,252 @@
+"""Офлайн-оценка качества рекомендаций на отложенных оценках.
+
+У каждого пользователя откладывается доля holdout его оценок, рекомендатель
+обучается на остальных, и для каждого метода считаются precision@k,
+recall@k, NDCG@k и покрытие каталога (доля книг, попавших хоть в одну
+выдачу). Релевантные книги - отложенные оценки не ниже relevant_rating.
+
+Методы книга -> книги ('content', 'collab', 'hybrid', 'cluster', 'knn',
+'diverse') оцениваются по seeds лучшим обучающим книгам пользователя:
+списки соседей всех таких книг считаются тем же ядром, что и
+get_recommendations_batch (recommend_rows), блоками в пуле потоков, а затем
+для каждого пользователя объединяются по сумме 1/(ранг + 1) без уже
+оцененных им книг. 'user' - персональные рекомендации по факторам SVD.
+
+Веса гибрида (--weights) проверяются без переобучения: гибрид смешивается
+при запросе (recommend_rows с весами content w и collab 1 - w), как и в
+get_recommendations(weights=...). --popularity-weight добавляет ко всем
+гибридным оценкам приоритет популярности.
+
+    python evaluate.py --books data/books.csv --ratings data/ratings.csv --k 10
+    python evaluate.py --size 20000 --weights 0.2,0.4,0.6,0.8 --out eval.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ITEM_METHODS = ('content', 'collab', 'hybrid', 'cluster', 'knn', 'diverse')
+EVAL_METHODS = ITEM_METHODS + ('user',)
+
+
+def split_ratings(ratings, holdout=0.2, seed=42):
+    """(train, test): у каждого пользователя в test уходит случайная доля holdout
+    его оценок (с округлением вниз, поэтому в train остается хотя бы одна)"""
+    ratings = ratings.drop_duplicates(['user_id', 'book_id'], keep='last').reset_index(drop=True)
+    order = np.random.default_rng(seed).permutation(len(ratings))
+    order = order[np.argsort(ratings['user_id'].to_numpy()[order], kind='stable')]
+    users = ratings['user_id'].to_numpy()[order]
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if len(users) else np.empty(0, np.int64)
+    counts = np.diff(np.r_[starts, len(users)])
+    position = np.arange(len(users)) - np.repeat(starts, counts)
+    held = position < np.repeat(np.floor(counts * holdout).astype(np.int64), counts)
+    is_test = np.zeros(len(ratings), dtype=bool)
+    is_test[order[held]] = True
+    return ratings[~is_test].reset_index(drop=True), ratings[is_test].reset_index(drop=True)
+
+
+class Evaluator:
+    """Метрики методов рекомендателя, обученного на train, по отложенным оценкам test"""
+
+    def __init__(self, recommender, train, test, k=10, relevant_rating=4, seeds=5, per_seed=None,
+                 workers=None, block_size=None):
+        self.recommender = recommender
+        self.k = k
+        self.per_seed = per_seed or 2 * k
+        self.workers = workers or os.cpu_count() or 1
+        self.block_size = block_size or recommender.config['block_size']
+        recommender.ensure_models()
+        self.n_books = len(recommender.catalog)
+
+        # Оцениваются пользователи с релевантными отложенными книгами и хотя бы одной обучающей
+        relevant = test[test['rating'] >= relevant_rating]
+        self.user_ids = np.intersect1d(relevant['user_id'].unique(), train['user_id'].unique())
+        users = pd.Index(self.user_ids)
+        relevant_users = users.get_indexer(relevant['user_id'])
+        found = relevant_users >= 0
+        self.relevant_keys = np.unique(self.pair_keys(relevant_users[found],
+                                                      recommender.book_rows(relevant['book_id'].to_numpy()[found])))
+        self.n_relevant = np.bincount(self.relevant_keys // self.n_books, minlength=len(self.user_ids))
+
+        train_users = users.get_indexer(train['user_id'])
+        found = train_users >= 0
+        train_users = train_users[found]
+        train_rows = recommender.book_rows(train['book_id'].to_numpy()[found])
+        self.rated_keys = np.unique(self.pair_keys(train_users, train_rows))
+
+        # Seed-книги: seeds лучших по оценке обучающих книг пользователя, -1 - пусто
+        order = np.lexsort((-train['rating'].to_numpy()[found], train_users))
+        sorted_users = train_users[order]
+        starts = np.searchsorted(sorted_users, np.arange(len(self.user_ids)))
+        rank = np.arange(len(order)) - starts[sorted_users]
+        keep = rank < seeds
+        self.seeds = np.full((len(self.user_ids), seeds), -1, dtype=np.int64)
+        self.seeds[sorted_users[keep], rank[keep]] = train_rows[order][keep]
+
+    def pair_keys(self, users, rows):
+        return np.asarray(users, dtype=np.int64) * self.n_books + rows
+
+    def map_blocks(self, function, items):
+        """function(блок) для блоков items по block_size в пуле потоков; результаты по порядку"""
+        blocks = [items[start:start + self.block_size] for start in range(0, len(items), self.block_size)]
+        if self.workers > 1 and len(blocks) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(blocks)), thread_name_prefix="evaluate") as pool:
+                return list(pool.map(function, blocks))
+        return [function(block) for block in blocks]
+
+    def recommend(self, method, content_weight=None):
+        """Позиции книг top-k для каждого пользователя (-1 - пусто), массив пользователей x k"""
+        if method == 'user':
+            ids = np.vstack(self.map_blocks(lambda users: self.recommender.recommend_for_users(users, self.k)[0],
+                                            self.user_ids))
+            return np.where(ids >= 0, self.recommender.book_index.get_indexer(ids.ravel()).reshape(ids.shape), -1)
+        blend = None if content_weight is None else self.recommender.hybrid_blend((content_weight, 1 - content_weight))
+        neighbours = lambda rows: self.recommender.recommend_rows(rows, method, self.per_seed, blend)[0]
+        return self.fuse(self.seed_neighbours(neighbours))
+
+    def seed_neighbours(self, neighbours):
+        """Списки соседей seed-книг: пользователи x (seeds * per_seed), каждая книга считается один раз"""
+        unique = np.unique(self.seeds[self.seeds >= 0])
+        table = np.vstack(self.map_blocks(neighbours, unique)) if len(unique) else np.empty((0, self.per_seed))
+        lists = np.full(self.seeds.shape + (table.shape[1],), -1, dtype=np.int64)
+        present = self.seeds >= 0
+        lists[present] = table[np.searchsorted(unique, self.seeds[present])]
+        return lists.reshape(len(self.seeds), -1)
+
+    def fuse(self, candidates):
+        """top-k по сумме 1/(ранг + 1) в списках соседей, без книг из обучающих оценок пользователя"""
+        per_list = candidates.shape[1] // max(self.seeds.shape[1], 1)
+        weights = np.tile(1 / (np.arange(per_list) + 1), self.seeds.shape[1])
+        users, slots = np.nonzero(candidates >= 0)
+        keys = self.pair_keys(users, candidates[users, slots])
+        fresh = ~np.isin(keys, self.rated_keys)
+        keys, inverse = np.unique(keys[fresh], return_inverse=True)
+        scores = np.bincount(inverse, weights=weights[slots[fresh]], minlength=len(keys))
+
+        users, rows = np.divmod(keys, self.n_books)
+        order = np.lexsort((-scores, users))
+        users, rows = users[order], rows[order]
+        rank = np.arange(len(users)) - np.searchsorted(users, users)
+        keep = rank < self.k
+        positions = np.full((len(self.user_ids), self.k), -1, dtype=np.int64)
+        positions[users[keep], rank[keep]] = rows[keep]
+        return positions
+
+    def metrics(self, positions):
+        valid = positions >= 0
+        hits = valid & np.isin(self.pair_keys(np.arange(len(positions))[:, None], positions), self.relevant_keys)
+        n_hits = hits.sum(axis=1)
+        discounts = 1 / np.log2(np.arange(self.k) + 2)
+        ideal = np.cumsum(discounts)[np.minimum(self.n_relevant, self.k) - 1]
+        return {'precision': float(np.mean(n_hits / self.k)),
+                'recall': float(np.mean(n_hits / self.n_relevant)),
+                'ndcg': float(np.mean(hits @ discounts / ideal)),
+                'coverage': len(np.unique(positions[valid])) / self.n_books}
+
+    def evaluate(self, methods=EVAL_METHODS, blend_weights=()):
+        """Строки отчета {'method', 'precision', 'recall', 'ndcg', 'coverage', 'seconds'}"""
+        runs = [(method, method, None) for method in methods]
+        runs += [(f'hybrid[w={weight:g}]', 'hybrid', weight) for weight in blend_weights]
+        results = []
+        for name, method, weight in runs:
+            started = time.perf_counter()
+            positions = self.recommend(method, weight)
+            results.append({'method': name, **self.metrics(positions), 'seconds': time.perf_counter() - started})
+        return results
+
+
+def prepare_data(args, workdir):
+    """Пути каталога и оценок: файлы из аргументов или синтетический набор в workdir"""
+    if args.books:
+        return args.books, args.ratings
+    from datagen import generate_books, iter_ratings, write_frames
+    books_path, ratings_path = workdir / "books.csv", workdir / "ratings.csv"
+    write_frames(books_path, [generate_books(args.size, seed=args.seed)])
+    density = min(1.0, args.ratings_per_user / args.size)
+    write_frames(ratings_path, iter_ratings(args.users or args.size, args.size, density, args.seed))
+    return books_path, ratings_path
+
+
+def run_evaluation(args, workdir):
+    from loaders import load_books, load_ratings
+    from recommender import AdvancedBookRecommender
+
+    books_path, ratings_path = prepare_data(args, workdir)
+    ratings = load_ratings(ratings_path, load_books(books_path)['book_id'])
+    train, test = split_ratings(ratings, args.holdout, args.seed)
+    train_path = workdir / "train_ratings.csv"
+    train.to_csv(train_path, index=False)
+    del ratings
+
+    started = time.perf_counter()
+    recommender = AdvancedBookRecommender(config={
+        'books_path': str(books_path), 'ratings_path': str(train_path), 'models_path': str(workdir / "models"),
+        'cache_entries': 0, 'lazy_models': False, 'factor_precision': args.precision,
+        'ann_backend': args.ann_backend, 'popularity_weight': args.popularity_weight})
+    train_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    evaluator = Evaluator(recommender, train, test, k=args.k, relevant_rating=args.relevant_rating,
+                          seeds=args.seeds, workers=args.workers)
+    methods = args.methods.split(',') if args.methods else EVAL_METHODS
+    weights = [float(weight) for weight in args.weights.split(',')] if args.weights else []
+    results = evaluator.evaluate(methods, weights)
+    return {'books': evaluator.n_books, 'train_ratings': len(train), 'test_ratings': len(test),
+            'users': len(evaluator.user_ids), 'k': args.k, 'train_s': round(train_s, 3),
+            'evaluate_s': round(time.perf_counter() - started, 3), 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-оценка методов рекомендаций на отложенных оценках")
+    parser.add_argument('--books', default=None, help="CSV/Parquet каталога; без него - синтетический набор")
+    parser.add_argument('--ratings', default=None)
+    parser.add_argument('--size', type=int, default=5000, help="книг в синтетическом наборе")
+    parser.add_argument('--users', type=int, default=None, help="пользователей в синтетическом наборе")
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--holdout', type=float, default=0.2, help="доля оценок пользователя в отложенной части")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--relevant-rating', type=float, default=4, help="минимальная оценка релевантной книги")
+    parser.add_argument('--seeds', type=int, default=5, help="обучающих книг пользователя для методов книга -> книги")
+    parser.add_argument('--methods', default=None, help=f"через запятую, по умолчанию {','.join(EVAL_METHODS)}")
+    parser.add_argument('--weights', default=None, help="веса content для гибрида через запятую, например 0.2,0.5,0.8")
+    parser.add_argument('--popularity-weight', type=float, default=0.0, help="вес популярности в гибриде")
+    parser.add_argument('--precision', default='float64', choices=('float64', 'float32', 'int8'))
+    parser.add_argument('--ann-backend', default='ivf', choices=('ivf', 'exact'))
+    parser.add_argument('--workers', type=int, default=None, help="потоков; по умолчанию по числу ядер")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default=None, help="сохранить отчет в JSON")
+    args = parser.parse_args()
+    if bool(args.books) != bool(args.ratings):
+        parser.error("--books и --ratings указываются вместе")
+    unknown = set(args.methods.split(',')) - set(EVAL_METHODS) if args.methods else set()
+    if unknown:
+        parser.error(f"неизвестные методы {sorted(unknown)}, доступны: {','.join(EVAL_METHODS)}")
+
+    workdir = Path(tempfile.mkdtemp(prefix="evaluate-"))
+    try:
+        report = run_evaluation(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Книг {report['books']}, пользователей в оценке {report['users']}, отложено оценок "
+          f"{report['test_ratings']}; обучение {report['train_s']:.1f} с, оценка {report['evaluate_s']:.1f} с",
+          file=sys.stderr)
+    k = report['k']
+    print(f"{'method':<18} {f'P@{k}':>8} {f'R@{k}':>8} {f'NDCG@{k}':>8} {'coverage':>9} {'s':>7}")
+    for row in report['results']:
+        print(f"{row['method']:<18} {row['precision']:>8.4f} {row['recall']:>8.4f} {row['ndcg']:>8.4f} "
+              f"{row['coverage']:>9.4f} {row['seconds']:>7.2f}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
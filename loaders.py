@@ -0,0 +1,118 @@
+"""Потоковая загрузка каталога и оценок из CSV или Parquet.
+
+Файлы читаются блоками, каждый блок сразу приводится к компактным типам
+(int32 id, float32 популярность и оценки, категориальные автор и жанр),
+поэтому пиковая память при загрузке близка к итоговому размеру таблиц.
+Подключается через AdvancedBookRecommender(config={'books_path': ..., 'ratings_path': ...}).
+
+compact_books() и compact_ratings() приводят к тем же типам таблицы из памяти
+(новые данные для update()), чтобы отпечаток моделей после update() совпадал
+с отпечатком при загрузке тех же строк из файлов.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+BOOK_COLUMNS = ['book_id', 'title', 'author', 'genre', 'description', 'popularity']
+RATING_COLUMNS = ['user_id', 'book_id', 'rating']
+
+BOOK_DTYPES = {'book_id': np.int32, 'popularity': np.float32}
+CATEGORICAL_COLUMNS = ('author', 'genre')
+RATING_DTYPES = {'user_id': np.int32, 'book_id': np.int32, 'rating': np.float32}
+RATING_RANGE = (1, 5)
+
+
+def iter_chunks(path, columns, chunk_size):
+    """Блоки DataFrame из CSV или Parquet (по расширению файла)"""
+    path = Path(path)
+    if path.suffix == '.parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Для чтения Parquet нужен пакет pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+
+
+def _compact(chunk, dtypes, path):
+    missing = [column for column in dtypes if chunk[column].isna().any()]
+    if missing:
+        raise ValueError(f"{path}: пустые значения в колонках {missing}")
+    return {column: chunk[column].to_numpy().astype(dtype, copy=False) for column, dtype in dtypes.items()}
+
+
+def _book_columns(chunk, path):
+    """Колонки блока книг в компактных типах; автор и жанр - pd.Categorical"""
+    columns = _compact(chunk, BOOK_DTYPES, path)
+    for column in CATEGORICAL_COLUMNS:
+        columns[column] = pd.Categorical(chunk[column].fillna(''))
+    for column in ('title', 'description'):
+        columns[column] = chunk[column].fillna('').to_numpy(dtype=object)
+    return columns
+
+
+def _check_books(books, path):
+    if (books['book_id'] <= 0).any():
+        raise ValueError(f"{path}: book_id должны быть положительными")
+    duplicated = books['book_id'][books['book_id'].duplicated()]
+    if len(duplicated):
+        raise ValueError(f"{path}: повторяющиеся book_id {duplicated.head(10).tolist()}")
+    return books
+
+
+def _rating_columns(chunk, path, known):
+    values = _compact(chunk, RATING_DTYPES, path)
+    if (values['user_id'] <= 0).any() or (values['book_id'] <= 0).any():
+        raise ValueError(f"{path}: user_id и book_id должны быть положительными")
+    low, high = RATING_RANGE
+    if ((values['rating'] < low) | (values['rating'] > high)).any():
+        raise ValueError(f"{path}: оценки должны быть в диапазоне [{low}, {high}]")
+    if known is not None:
+        unknown = values['book_id'][known.get_indexer(values['book_id']) < 0]
+        if len(unknown):
+            raise ValueError(f"{path}: оценки для книг не из каталога {np.unique(unknown)[:10].tolist()}")
+    return values
+
+
+def load_books(path, chunk_size=100_000):
+    parts = {column: [] for column in BOOK_COLUMNS}
+    for chunk in iter_chunks(path, BOOK_COLUMNS, chunk_size):
+        for column, values in _book_columns(chunk, path).items():
+            parts[column].append(values)
+    if not parts['book_id']:
+        raise ValueError(f"{path}: каталог пуст")
+
+    books = pd.DataFrame({
+        column: union_categoricals(parts[column]) if column in CATEGORICAL_COLUMNS else np.concatenate(parts[column])
+        for column in BOOK_COLUMNS
+    })
+    return _check_books(books, path)
+
+
+def load_ratings(path, book_ids=None, chunk_size=1_000_000):
+    """Оценки с проверкой id и диапазона; book_ids - допустимые id книг каталога"""
+    known = pd.Index(book_ids) if book_ids is not None else None
+    parts = {column: [] for column in RATING_COLUMNS}
+    for chunk in iter_chunks(path, RATING_COLUMNS, chunk_size):
+        for column, values in _rating_columns(chunk, path, known).items():
+            parts[column].append(values)
+
+    return pd.DataFrame({
+        column: np.concatenate(parts[column]) if parts[column] else np.empty(0, RATING_DTYPES[column])
+        for column in RATING_COLUMNS
+    })
+
+
+def compact_books(books, source="книги"):
+    """Книги из DataFrame в типах и с проверками load_books; source - имя для сообщений об ошибках"""
+    return _check_books(pd.DataFrame(_book_columns(books[BOOK_COLUMNS], source)), source)
+
+
+def compact_ratings(ratings, book_ids=None, source="оценки"):
+    """Оценки из DataFrame в типах и с проверками load_ratings"""
+    known = pd.Index(book_ids) if book_ids is not None else None
+    return pd.DataFrame(_rating_columns(ratings[RATING_COLUMNS], source, known))
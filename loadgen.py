@@ -0,0 +1,116 @@
+"""Генератор нагрузки для server.py: задержки p50/p99 и пропускная способность.
+
+Запуск (сервис уже работает): python loadgen.py --url http://127.0.0.1:8000 --concurrency 32 --requests 5000
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+METHODS = ('hybrid', 'content', 'collab', 'cluster', 'knn', 'diverse')
+# book_id за один запрос /books; не больше server.MAX_BOOKS_PAGE
+BOOKS_PAGE = 10000
+
+
+def request_path(book_id, method, top_n):
+    if method in ('knn', 'diverse'):
+        return f"/recommendations/{method}?book_id={book_id}&top_n={top_n}"
+    return f"/recommendations?book_id={book_id}&method={method}&top_n={top_n}"
+
+
+def fetch_book_ids(url, limit):
+    """Первые limit book_id каталога, страницами /books по BOOKS_PAGE"""
+    target = urlparse(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+    book_ids = []
+    try:
+        while len(book_ids) < limit:
+            connection.request('GET', f"/books?offset={len(book_ids)}&limit={min(BOOKS_PAGE, limit - len(book_ids))}")
+            response = connection.getresponse()
+            body = response.read()
+            if response.status != 200:
+                raise RuntimeError(f"{url}/books ответил {response.status}: {body.decode(errors='replace')}")
+            payload = json.loads(body)
+            book_ids += payload['book_ids']
+            if not payload['book_ids'] or len(book_ids) >= payload['total']:
+                break
+    finally:
+        connection.close()
+    return np.asarray(book_ids)
+
+
+def run_load(url, paths, concurrency):
+    """Выполняет запросы paths в concurrency потоках (по keep-alive соединению на поток)"""
+    target = urlparse(url)
+    latencies = np.zeros(len(paths))
+    statuses = np.zeros(len(paths), dtype=np.int32)
+    next_request = iter(range(len(paths)))
+    lock = threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+        while True:
+            with lock:
+                i = next(next_request, None)
+            if i is None:
+                break
+            started = time.perf_counter()
+            try:
+                connection.request('GET', paths[i])
+                response = connection.getresponse()
+                response.read()
+                statuses[i] = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+            latencies[i] = time.perf_counter() - started
+        connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP-сервиса рекомендаций")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--methods', default='hybrid,content,collab,knn',
+                        help=f"методы через запятую, доступны: {','.join(METHODS)}")
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--books', type=int, default=10000, help="сколько book_id каталога использовать")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    try:
+        book_ids = fetch_book_ids(args.url, args.books)
+    except (OSError, RuntimeError) as e:
+        parser.exit(1, f"Не удалось получить каталог: {e}\n")
+    methods = args.methods.split(',')
+    queries = zip(rng.choice(book_ids, args.requests), rng.choice(methods, args.requests))
+    paths = [request_path(book_id, method, args.top_n) for book_id, method in queries]
+
+    latencies, statuses, elapsed = run_load(args.url, paths, args.concurrency)
+    ok = statuses == 200
+    ms = latencies[ok] * 1000
+    print(f"запросов: {len(paths)}, успешных: {ok.sum()}, ошибок: {(~ok).sum()}, "
+          f"потоков: {args.concurrency}, время: {elapsed:.2f} с")
+    print(f"QPS: {ok.sum() / elapsed:.1f}")
+    if len(ms):
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+        print(f"задержка, мс: p50 {p50:.2f}  p90 {p90:.2f}  p99 {p99:.2f}  max {ms.max():.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import logging
 import sys
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QColor
@@ -5,6 +6,7 @@ from PyQt5.QtWidgets import QApplication
 from ui import RecommenderApp
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
     
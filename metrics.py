@@ -0,0 +1,178 @@
+"""Метрики рекомендателя: таймеры, счетчики и значения с подключаемыми приемниками.
+
+    metrics = Metrics(MetricsRegistry(), LogSink())
+    with metrics.timer('query_seconds', method='hybrid'):
+        ...
+    metrics.increment('model_loads_total', source='artifacts')
+
+Приемник (sink) - любой объект с методом record(kind, name, value, labels),
+где kind - 'counter', 'gauge' или 'timer'. Есть два готовых:
+    LogSink          - строка в лог на каждое измерение
+    MetricsRegistry  - агрегаты в памяти процесса: snapshot() и текст в формате
+                       Prometheus (prometheus_text()) для HTTP-эндпоинта /metrics
+
+Значения, которые дешевле считать по запросу (статистика кэша, размеры
+моделей), отдают сборщики add_collector(); collect() передает их приемникам.
+Без приемников timer() возвращает общий пустой контекст и ничего не измеряет.
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+_DISABLED = nullcontext()
+
+# Границы гистограмм таймеров, секунды
+TIMER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record('timer', self.name, time.perf_counter() - self.started, self.labels)
+        return False
+
+
+class Metrics:
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+        self.collectors = []
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def add_collector(self, collector):
+        """collector() -> итерируемое (name, labels, value); значения уходят в приемники как gauge"""
+        self.collectors.append(collector)
+
+    def record(self, kind, name, value, labels):
+        for sink in self.sinks:
+            sink.record(kind, name, value, labels)
+
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels) if self.sinks else _DISABLED
+
+    def observe(self, name, seconds, **labels):
+        if self.sinks:
+            self.record('timer', name, seconds, labels)
+
+    def increment(self, name, value=1, **labels):
+        if self.sinks:
+            self.record('counter', name, value, labels)
+
+    def gauge(self, name, value, **labels):
+        if self.sinks:
+            self.record('gauge', name, value, labels)
+
+    def collect(self):
+        if not self.sinks:
+            return
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                self.record('gauge', name, value, labels)
+
+
+class LogSink:
+    def __init__(self, logger=logger, level=logging.INFO):
+        self.logger = logger
+        self.level = level
+
+    def record(self, kind, name, value, labels):
+        self.logger.log(self.level, "%s %s%s %.6g", kind, name, format_labels(labels), value)
+
+
+class MetricsRegistry:
+    """Агрегаты в памяти: сумма счетчиков, последнее значение gauge, гистограмма таймеров"""
+
+    def __init__(self, buckets=TIMER_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.timers = {}
+
+    def record(self, kind, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if kind == 'counter':
+                self.counters[key] = self.counters.get(key, 0) + value
+            elif kind == 'gauge':
+                self.gauges[key] = value
+            else:
+                timer = self.timers.get(key)
+                if timer is None:
+                    timer = self.timers[key] = {'count': 0, 'sum': 0.0, 'max': 0.0,
+                                                'buckets': [0] * (len(self.buckets) + 1)}
+                timer['count'] += 1
+                timer['sum'] += value
+                timer['max'] = max(timer['max'], value)
+                timer['buckets'][bisect.bisect_left(self.buckets, value)] += 1
+
+    def value(self, name, **labels):
+        """Счетчик или gauge; для таймера - сумма секунд"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key in self.timers:
+                return self.timers[key]['sum']
+            return self.counters.get(key, self.gauges.get(key))
+
+    def snapshot(self):
+        """{name: [{'labels': {...}, 'value': ...} или {'labels', 'count', 'sum', 'max'}]}"""
+        result = {}
+        with self._lock:
+            for store in (self.counters, self.gauges):
+                for (name, labels), value in store.items():
+                    result.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+            for (name, labels), timer in self.timers.items():
+                result.setdefault(name, []).append({'labels': dict(labels), 'count': timer['count'],
+                                                    'sum': timer['sum'], 'max': timer['max']})
+        return result
+
+    def prometheus_text(self, prefix='book_recommender_'):
+        lines = []
+        with self._lock:
+            for kind, store in (('counter', self.counters), ('gauge', self.gauges)):
+                for name in sorted({name for name, _ in store}):
+                    lines.append(f"# TYPE {prefix}{name} {kind}")
+                    for (metric, labels), value in sorted(store.items(), key=lambda item: item[0]):
+                        if metric == name:
+                            lines.append(f"{prefix}{name}{format_labels(dict(labels))} {value}")
+            for name in sorted({name for name, _ in self.timers}):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for (metric, labels), timer in sorted(self.timers.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    labels = dict(labels)
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (math.inf,), timer['buckets']):
+                        cumulative += count
+                        le = '+Inf' if bound == math.inf else f'{bound:g}'
+                        lines.append(f"{prefix}{name}_bucket{format_labels({**labels, 'le': le})} {cumulative}")
+                    lines.append(f"{prefix}{name}_sum{format_labels(labels)} {timer['sum']:.6f}")
+                    lines.append(f"{prefix}{name}_count{format_labels(labels)} {timer['count']}")
+        return '\n'.join(lines) + '\n'
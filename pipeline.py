@@ -0,0 +1,152 @@
+"""Граф этапов обучения с параллельным запуском и сохранением результатов этапов.
+
+Этап (Stage) - функция без аргументов, возвращающая словарь выходов
+{имя: массив numpy / матрица scipy.sparse / любой объект}, плюс список
+этапов, от которых он зависит. Этап запускается, как только готовы все его
+зависимости, поэтому независимые ветки (TF-IDF и SVD, индексы разных
+методов, KMeans) считаются одновременно в пуле потоков: numpy, scipy и BLAS
+отпускают GIL, а общие матрицы не копируются между процессами.
+
+Выходы каждого этапа сохраняются в <root>/<этап>/ через ArtifactStore с
+отпечатком этапа: от его настроек, входных данных и отпечатков зависимостей.
+При следующем обучении этап с тем же отпечатком не запускается, его выходы
+читаются с диска (через mmap). Поэтому после сбоя или смены настройки
+пересчитываются только этапы, которых это касается, и этапы после них.
+"""
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from scipy import sparse
+
+from artifacts import ARTIFACT_FORMAT, ArtifactMismatchError, ArtifactStore
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """name - имя этапа и папки с его выходами,
+    run() -> {имя: значение} - сама работа,
+    apply(outputs) - вызывается в управляющем потоке до запуска зависимых этапов,
+    depends - имена этапов, чьи выходы нужны run(),
+    key - настройки и отпечатки данных, от которых зависит результат"""
+
+    def __init__(self, name, run, apply, depends=(), key=None, message=None):
+        self.name = name
+        self.run = run
+        self.apply = apply
+        self.depends = tuple(depends)
+        self.key = key or {}
+        self.message = message or name
+
+
+def stage_fingerprints(stages):
+    """{этап: sha256} от ключа этапа и отпечатков его зависимостей"""
+    fingerprints = {}
+
+    def visit(name, path=()):
+        if name in fingerprints:
+            return fingerprints[name]
+        if name in path:
+            raise ValueError(f"цикл в графе этапов: {' -> '.join(path + (name,))}")
+        stage = stages[name]
+        digest = hashlib.sha256()
+        digest.update(json.dumps({'format': ARTIFACT_FORMAT, 'stage': name, 'key': stage.key,
+                                  'depends': {dep: visit(dep, path + (name,)) for dep in stage.depends}},
+                                 sort_keys=True, ensure_ascii=False, default=str).encode())
+        fingerprints[name] = digest.hexdigest()
+        return fingerprints[name]
+
+    for name in stages:
+        visit(name)
+    return fingerprints
+
+
+def load_outputs(store, fingerprint):
+    """Выходы этапа с диска; FileNotFoundError / ArtifactMismatchError, если их нет или они устарели"""
+    manifest = store.check(fingerprint)
+    outputs = {name: store.array(manifest, name) for name in manifest['arrays']}
+    outputs.update({name: store.object(manifest, name) for name in manifest['objects']})
+    return outputs
+
+
+def save_outputs(store, fingerprint, outputs):
+    arrays = {name: value for name, value in outputs.items()
+              if isinstance(value, np.ndarray) or sparse.issparse(value)}
+    objects = {name: value for name, value in outputs.items() if name not in arrays}
+    store.save(fingerprint, arrays, objects)
+
+
+class Pipeline:
+    """Запускает этапы графа в пуле потоков; workers=None - по числу ядер"""
+
+    def __init__(self, stages, root, workers=None, timer=None, report=None, on_stage=None):
+        self.stages = {stage.name: stage for stage in stages}
+        unknown = {dep for stage in stages for dep in stage.depends} - self.stages.keys()
+        if unknown:
+            raise ValueError(f"этапы зависят от неизвестных этапов: {sorted(unknown)}")
+        self.root = root
+        self.workers = workers or os.cpu_count() or 1
+        self.timer = timer              # timer(stage) -> контекстный менеджер замера этапа
+        self.report = report            # report(message, done_fraction)
+        self.on_stage = on_stage        # on_stage(stage, source), source - 'cache' или 'run'
+        self.fingerprints = stage_fingerprints(self.stages)
+
+    def execute(self, stage):
+        """Выходы этапа: из сохраненных, если отпечаток совпал, иначе run() и сохранение"""
+        store = ArtifactStore(self.root / stage.name)
+        fingerprint = self.fingerprints[stage.name]
+        try:
+            outputs = load_outputs(store, fingerprint)
+            source = 'cache'
+        except (FileNotFoundError, ArtifactMismatchError):
+            outputs = stage.run()
+            save_outputs(store, fingerprint, outputs)
+            source = 'run'
+        return outputs, source
+
+    def timed(self, stage):
+        if self.timer is None:
+            return self.execute(stage)
+        with self.timer(stage.name):
+            return self.execute(stage)
+
+    def run(self):
+        """Выполняет все этапы; при ошибке дожидается уже запущенных этапов
+        (их выходы сохраняются) и пробрасывает первую ошибку"""
+        done, running, failure = set(), {}, None
+        sources = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="train-stage") as pool:
+            while True:
+                if failure is None:
+                    for name, stage in self.stages.items():
+                        if name not in done and name not in running.values() and done.issuperset(stage.depends):
+                            if self.report is not None:
+                                self.report(stage.message, len(done) / len(self.stages))
+                            running[pool.submit(self.timed, stage)] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        outputs, source = future.result()
+                    except Exception as e:
+                        logger.error("Этап обучения %s завершился с ошибкой: %s", name, e)
+                        failure = failure or e
+                        continue
+                    # apply выполняется только здесь, поэтому выходы этапов
+                    # присваиваются по одному и до запуска зависимых этапов
+                    self.stages[name].apply(outputs)
+                    sources[name] = source
+                    done.add(name)
+                    logger.info("Этап обучения %s: %s", name,
+                                "взят из сохраненных" if source == 'cache' else "выполнен")
+                    if self.on_stage is not None:
+                        self.on_stage(name, source)
+        if failure is not None:
+            raise failure
+        return sources
@@ -0,0 +1,171 @@
+"""Офлайн-расчет top-N рекомендаций для всех книг каталога и всех методов.
+
+Каталог делится на шарды по shard_size книг; шарды считаются в пуле процессов
+через get_recommendations_batch. Каждый шард атомарно пишется в свой Parquet
+(book_id, rank, rec_id, score, method), поэтому повторный запуск после сбоя
+пропускает готовые шарды. В конце шарды сливаются в один файл
+<out>/recommendations.parquet.
+
+Воркеры не получают модели через pickle: при fork они наследуют уже
+загруженные массивы (copy-on-write), иначе открывают артефакты через mmap,
+и страницы в обоих случаях общие для всех процессов.
+
+Запуск: python precompute.py --out data/precomputed --top-n 20 --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from recommender import AdvancedBookRecommender
+
+METHODS = ('hybrid', 'content', 'collab', 'cluster', 'knn', 'diverse')
+RESULT_FILE = "recommendations.parquet"
+
+_recommender = None
+
+
+def _init_worker(config):
+    global _recommender
+    # Один поток BLAS на процесс, иначе воркеры делят ядра с потоками друг друга
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    if _recommender is None:
+        _recommender = AdvancedBookRecommender(config)
+        _recommender.ensure_models()
+
+
+def shard_path(parts_dir, method, shard):
+    return parts_dir / f"{method}-{shard:06d}.parquet"
+
+
+def compute_shard(task):
+    """Считает один шард и атомарно пишет его; возвращает (method, shard, число строк)"""
+    method, shard, start, stop, top_n, parts_dir = task
+    book_ids = _recommender.book_ids[start:stop]
+    ids, scores = _recommender.get_recommendations_batch(book_ids, method, top_n)
+    found = (ids >= 0).ravel()
+    frame = pd.DataFrame({
+        'book_id': np.repeat(book_ids.astype(np.int32), top_n)[found],
+        'rank': np.tile(np.arange(1, top_n + 1, dtype=np.int16), len(book_ids))[found],
+        'rec_id': ids.ravel()[found],
+        'score': scores.ravel()[found],
+        'method': pd.Categorical.from_codes(np.full(found.sum(), METHODS.index(method), dtype=np.int8),
+                                            categories=METHODS),
+    })
+    path = shard_path(parts_dir, method, shard)
+    tmp = path.with_name(path.name + ".tmp")
+    frame.to_parquet(tmp, index=False)
+    tmp.replace(path)
+    return method, shard, len(frame)
+
+
+def check_manifest(out, manifest, overwrite):
+    """Сверяет параметры с прерванным запуском; при несовпадении старые шарды не используются"""
+    path = out / "manifest.json"
+    if path.exists():
+        previous = json.loads(path.read_text(encoding='utf-8'))
+        same = all(previous.get(key) == manifest[key] for key in ('fingerprint', 'top_n', 'shard_size', 'n_books'))
+        if not same and not overwrite:
+            raise SystemExit(f"{out} содержит результаты для других моделей или параметров; "
+                             f"запустите с --overwrite")
+        if same:
+            return manifest
+        shutil.rmtree(out / "parts", ignore_errors=True)
+        (out / RESULT_FILE).unlink(missing_ok=True)
+    out.mkdir(parents=True, exist_ok=True)
+    return manifest
+
+
+def merge_parts(parts, result_path):
+    """Сливает шарды в один Parquet потоково: в памяти одновременно один шард"""
+    import pyarrow.parquet as pq
+
+    tmp = result_path.with_name(result_path.name + ".tmp")
+    writer = None
+    try:
+        for part in parts:
+            table = pq.read_table(part)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    tmp.replace(result_path)
+
+
+def precompute(recommender, out, methods=METHODS, top_n=20, shard_size=10_000, workers=None,
+               config=None, overwrite=False):
+    global _recommender
+    out = Path(out)
+    parts_dir = out / "parts"
+    n_books = len(recommender.book_ids)
+    manifest = check_manifest(out, {'fingerprint': recommender.model_version, 'top_n': top_n,
+                                    'shard_size': shard_size, 'n_books': n_books,
+                                    'methods': list(methods)}, overwrite)
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+
+    tasks = [(method, shard, start, min(start + shard_size, n_books), top_n, parts_dir)
+             for method in methods
+             for shard, start in enumerate(range(0, n_books, shard_size))]
+    pending = [task for task in tasks if not shard_path(parts_dir, task[0], task[1]).exists()]
+    print(f"Шардов: {len(tasks)}, уже готово: {len(tasks) - len(pending)}")
+
+    recommender.ensure_models()
+    _recommender = recommender
+    workers = workers or multiprocessing.cpu_count()
+    started = time.perf_counter()
+    if workers == 1 or len(pending) <= 1:
+        results = map(compute_shard, pending)
+        pool = None
+    else:
+        methods_available = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods_available else None)
+        pool = context.Pool(workers, initializer=_init_worker, initargs=(config,))
+        results = pool.imap_unordered(compute_shard, pending)
+    try:
+        for done, (method, shard, rows) in enumerate(results, 1):
+            if done % max(len(pending) // 20, 1) == 0 or done == len(pending):
+                print(f"  {done}/{len(pending)} шардов, {time.perf_counter() - started:.1f} с")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    merge_parts([shard_path(parts_dir, method, shard) for method, shard, *_ in tasks], out / RESULT_FILE)
+    return out / RESULT_FILE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Расчет top-N рекомендаций для всего каталога")
+    parser.add_argument('--out', default='data/precomputed')
+    parser.add_argument('--methods', default=','.join(METHODS), help="методы через запятую")
+    parser.add_argument('--top-n', type=int, default=20)
+    parser.add_argument('--shard-size', type=int, default=10_000, help="книг в одном шарде")
+    parser.add_argument('--workers', type=int, default=None, help="процессов; по умолчанию число ядер")
+    parser.add_argument('--books', default=None, help="CSV/Parquet каталога (по умолчанию встроенный набор)")
+    parser.add_argument('--ratings', default=None)
+    parser.add_argument('--overwrite', action='store_true', help="удалить результаты прежнего запуска")
+    args = parser.parse_args()
+
+    methods = args.methods.split(',')
+    unknown = sorted(set(methods) - set(METHODS))
+    if unknown:
+        parser.error(f"неизвестные методы {unknown}, доступны: {','.join(METHODS)}")
+
+    config = {'books_path': args.books, 'ratings_path': args.ratings}
+    recommender = AdvancedBookRecommender(config)
+    path = precompute(recommender, args.out, methods, args.top_n, args.shard_size, args.workers,
+                      config, args.overwrite)
+    print(f"Результат: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Хранение факторов моделей с пониженной точностью.
+
+config['factor_precision'] рекомендателя:
+    float64  - как раньше
+    float32  - факторы SVD и TF-IDF во float32: модели вдвое меньше
+    int8     - факторы книг квантованы в int8 с масштабом на строку
+               (QuantizedMatrix), TF-IDF во float32: факторы вчетверо меньше
+
+Квантование строки x: codes = round(x / scale), scale = max|x| / 127, то есть
+x ~ codes * scale. Оценки считаются во float32 блоками, полная
+деквантованная матрица в памяти не создается.
+
+Отчет о влиянии точности на соседей относительно float64:
+    python quantize.py --items 100000 --dim 10
+"""
+import argparse
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+PRECISIONS = ('float64', 'float32', 'int8')
+
+# Сколько строк квантованной матрицы деквантовать за раз при умножении
+DOT_BLOCK = 65536
+
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Неизвестная точность факторов: {precision!r}, доступны: {PRECISIONS}")
+    return precision
+
+
+def float_dtype(precision):
+    """Тип плавающих массивов для точности precision (int8 считается во float32)"""
+    return np.float64 if check_precision(precision) == 'float64' else np.float32
+
+
+class QuantizedMatrix:
+    """Плотная матрица в int8 с масштабом на строку: строка i ~ codes[i] * scales[i].
+
+    Индексация строк (m[rows], m[[row]], m[2d-массив позиций]) возвращает
+    деквантованные float32-строки, np.asarray(m) - всю матрицу, dot_rows(a) - a @ m.T.
+    """
+    dtype = np.dtype(np.float32)
+    ndim = 2
+
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_dense(cls, matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        scales = (np.abs(matrix).max(axis=1) / 127 if matrix.size else np.zeros(len(matrix))).astype(np.float32)
+        divisor = np.where(scales > 0, scales, 1)[:, None]
+        codes = np.clip(np.rint(matrix / divisor), -127, 127).astype(np.int8)
+        return cls(codes, scales)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def __getitem__(self, rows):
+        return self.codes[rows].astype(np.float32) * np.asarray(self.scales[rows], dtype=np.float32)[..., None]
+
+    def __array__(self, dtype=None, copy=None):
+        matrix = self[:]
+        return matrix if dtype is None else matrix.astype(dtype)
+
+    def dot_rows(self, a):
+        """a @ self.T во float32, по DOT_BLOCK строк матрицы за раз"""
+        a = np.asarray(a, dtype=np.float32)
+        result = np.empty((a.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), DOT_BLOCK):
+            stop = min(start + DOT_BLOCK, len(self))
+            np.multiply(a @ self.codes[start:stop].T.astype(np.float32), self.scales[start:stop],
+                        out=result[:, start:stop])
+        return result
+
+
+def store_factors(matrix, precision):
+    """Плотные факторы в виде для хранения и оценки при точности precision"""
+    if check_precision(precision) == 'int8':
+        return QuantizedMatrix.from_dense(matrix)
+    return np.asarray(matrix, dtype=float_dtype(precision))
+
+
+def factor_arrays(name, matrix):
+    """Массивы факторов для ArtifactStore: для QuantizedMatrix - коды и масштабы"""
+    if isinstance(matrix, QuantizedMatrix):
+        return {f'{name}.codes': matrix.codes, f'{name}.scales': matrix.scales}
+    return {name: matrix}
+
+
+def restore_factors(name, names, array):
+    """Факторы, сохраненные factor_arrays; names - имена сохраненных массивов, array(имя) -> массив"""
+    if f'{name}.codes' in names:
+        return QuantizedMatrix(array(f'{name}.codes'), array(f'{name}.scales'))
+    return array(name)
+
+
+def precision_report(spaces, k=10, n_queries=1000, seed=0):
+    """Точность соседей при каждой точности относительно float64.
+
+    spaces - {имя: векторы книг} (плотные или разреженные, любой точности
+    не ниже float64-эталона). Для каждой точности: recall@k точного top-k
+    по косинусу, средняя и максимальная ошибка оценок найденных соседей и
+    размер векторов.
+    """
+    from ann import dot_dense
+    from similarity_index import top_k_indices
+
+    rng = np.random.default_rng(seed)
+    rows = []
+    for name, vectors in spaces.items():
+        vectors = normalize(vectors.astype(np.float64) if sparse.issparse(vectors)
+                            else np.asarray(vectors, dtype=np.float64))
+        queries = rng.choice(vectors.shape[0], size=min(n_queries, vectors.shape[0]), replace=False)
+        reference = dot_dense(vectors[queries], vectors)
+        reference[np.arange(len(queries)), queries] = -np.inf
+        exact = top_k_indices(reference, k)
+        for precision in PRECISIONS:
+            if sparse.issparse(vectors):
+                # Разреженный TF-IDF не квантуется, int8 для него - float32
+                stored = vectors.astype(float_dtype(precision))
+                nbytes = stored.data.nbytes + stored.indices.nbytes + stored.indptr.nbytes
+            else:
+                stored = store_factors(vectors, precision)
+                nbytes = stored.nbytes
+            scores = dot_dense(stored[queries], stored).astype(np.float64)
+            scores[np.arange(len(queries)), queries] = -np.inf
+            found = top_k_indices(scores, k)
+            hits = sum(len(np.intersect1d(a, b)) for a, b in zip(found, exact))
+            error = np.abs(np.take_along_axis(scores, exact, axis=1) - np.take_along_axis(reference, exact, axis=1))
+            rows.append({'space': name, 'precision': precision, 'recall': hits / exact.size,
+                         'mean_error': float(error.mean()), 'max_error': float(error.max()),
+                         'mb': nbytes / 2**20})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Влияние точности хранения факторов на соседей")
+    parser.add_argument('--items', type=int, default=None,
+                        help="размер синтетического каталога; без параметра берутся модели рекомендателя")
+    parser.add_argument('--dim', type=int, default=10)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.items:
+        from ann import _synthetic_vectors
+        spaces = {'synthetic': _synthetic_vectors(args.items, args.dim)}
+    else:
+        from recommender import AdvancedBookRecommender
+        recommender = AdvancedBookRecommender(config={'factor_precision': 'float64'})
+        recommender.ensure_models()
+        spaces = {'collab': recommender.reduced_matrix, 'content': recommender.tfidf_matrix}
+
+    print(f"{'space':<10} {'precision':<9} {'recall@k':>9} {'mean_err':>9} {'max_err':>9} {'MB':>9}")
+    for row in precision_report(spaces, k=args.k, n_queries=args.queries):
+        print(f"{row['space']:<10} {row['precision']:<9} {row['recall']:>9.4f} {row['mean_error']:>9.2e} "
+              f"{row['max_error']:>9.2e} {row['mb']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
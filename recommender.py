@@ -1,21 +1,130 @@
 import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.decomposition import TruncatedSVD
-from sklearn.neighbors import NearestNeighbors
-from sklearn.cluster import KMeans
-import joblib
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.preprocessing import normalize
+from scipy import sparse
 from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import json
+import logging
+import os
+import threading
+import time
+from similarity_index import TopKSimilarityIndex, top_k_indices
+from ann import make_ann_index, dot_dense
+from artifacts import ArtifactStore, ArtifactMismatchError, fingerprint, frame_digest
+from catalog import BookCatalog, Recommendations
+from datagen import generate_ratings
+from loaders import BOOK_COLUMNS, compact_books, compact_ratings, load_books, load_ratings
+from cache import ResultCache
+from metrics import Metrics
+from pipeline import Pipeline, Stage
+from quantize import float_dtype, store_factors, factor_arrays, restore_factors
+from search import BookSearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Настройки моделей по умолчанию; переопределяются через AdvancedBookRecommender(config={...})
+DEFAULT_CONFIG = {
+    'books_path': None,   # CSV/Parquet каталога; None - встроенный демонстрационный набор
+    'ratings_path': None, # CSV/Parquet оценок (обязателен вместе с books_path)
+    'load_chunk_size': 1_000_000,  # строк на блок при потоковой загрузке
+    'models_path': 'models',       # папка артефактов моделей
+    'tfidf_max_features': 5000,
+    'svd_components': 10,
+    'n_clusters': 5,
+    'cluster_algorithm': 'kmeans',  # 'kmeans' или 'minibatch' (MiniBatchKMeans для миллионов книг)
+    'hybrid_weights': (0.6, 0.4),  # веса content и collab в гибридной похожести (в запросе можно передать свои)
+    'popularity_weight': 0.0,      # вес популярности (приведенной к [0, 1]) в оценке гибрида
+    'hybrid_exact': False,  # True - точный гибрид: строка пересчитывается целиком, если сосед может быть вне списков (медленно)
+    'top_k': 50,          # сколько соседей хранить на книгу в индексах похожести
+    'block_size': 1024,   # сколько строк матрицы похожести считать за один проход
+    'ann_backend': 'ivf', # 'ivf' (приближенный) или 'exact' (полный перебор), см. ann.py
+    'ann_lists': None,    # число списков IVF; None - sqrt(числа книг)
+    'ann_probe': 8,       # сколько списков просматривать: больше - выше полнота и задержка
+    'refit_drift': 0.2,   # доля новых оценок/книг от полного обучения, после которой update() переобучает все
+    'cache_entries': 4096,              # максимум записей в кэше результатов
+    'cache_bytes': 64 * 1024 * 1024,    # максимум памяти под кэш результатов
+    'cache_ttl': None,                  # время жизни записи в секундах; None - без ограничения
+    'lazy_models': True,  # части моделей читаются из артефактов при первом запросе метода
+    'diversity': 'mmr',         # get_diverse_recommendations: 'mmr' или 'popularity' (прежний порядок)
+    'diversity_lambda': 0.7,    # MMR: 1 - только релевантность, 0 - только непохожесть на выбранные
+    'diversity_candidates': 50, # MMR: сколько гибридных соседей переранжировать
+    'train_workers': None, # потоков для этапов обучения и блоков индексов; None - по числу ядер
+    'factor_precision': 'float64',  # 'float64', 'float32' или 'int8' (факторы книг в int8), см. quantize.py
+}
+
+# Ключи конфигурации, от которых зависят обученные модели; входят в отпечаток артефактов
+MODEL_SETTINGS = ('tfidf_max_features', 'svd_components', 'n_clusters', 'cluster_algorithm', 'hybrid_weights',
+                  'top_k', 'ann_backend', 'ann_lists', 'factor_precision')
+
+# Методы похожих книг; 'cluster' - гибридная похожесть только внутри кластера книги
+SIMILARITY_METHODS = ('content', 'collab', 'hybrid', 'cluster')
+# Методы с сохраненным top-K индексом; гибрид смешивается при запросе из списков content и collab
+INDEX_METHODS = ('content', 'collab', 'cluster')
+
+# Части моделей и методы, которым они нужны: запрос 'content' не ждет SVD и KMeans
+MODEL_PARTS = ('content', 'collab', 'hybrid', 'cluster')
+METHOD_PARTS = {
+    'content': ('content',),
+    'collab': ('collab',),
+    'knn': ('collab',),
+    'hybrid': ('content', 'collab', 'hybrid'),
+    'cluster': ('content', 'collab', 'cluster'),
+    'diverse': ('content', 'collab', 'hybrid', 'cluster'),
+}
+
+def interaction_matrix(ratings, user_ids, book_ids):
+    """Разреженная матрица оценок users x books (CSR) по целочисленным позициям id"""
+    ratings = ratings.drop_duplicates(['user_id', 'book_id'], keep='last')
+    user_rows = pd.Index(user_ids).get_indexer(ratings['user_id'])
+    book_cols = pd.Index(book_ids).get_indexer(ratings['book_id'])
+    return sparse.csr_matrix((ratings['rating'].to_numpy(dtype=np.float64), (user_rows, book_cols)),
+                             shape=(len(user_ids), len(book_ids)))
+
+def group_members(labels, n_groups):
+    """Члены групп в CSR-виде: позиции книг группы g - members[indptr[g]:indptr[g+1]]"""
+    labels = np.asarray(labels)
+    members = np.argsort(labels, kind='stable').astype(np.int32)
+    counts = np.bincount(labels, minlength=n_groups)
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64), members
+
+def csr_entries(matrix, rows):
+    """Ненулевые значения строк rows CSR-матрицы: номер строки в rows и позиция в data/indices"""
+    starts = matrix.indptr[rows]
+    lengths = matrix.indptr[np.asarray(rows) + 1] - starts
+    owner = np.repeat(np.arange(len(lengths)), lengths)
+    return owner, np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+
+def book_metadata(books):
+    return books['genre'].astype(str) + ' ' + books['author'].astype(str) + ' ' + books['description'].astype(str)
 
 class AdvancedBookRecommender:
-    def __init__(self):
-        self.books, self.ratings = self.load_extended_data()
+    def __init__(self, config=None, progress=None, metrics=None):
+        """progress(message, fraction) - необязательный обработчик хода загрузки и обучения,
+        metrics - metrics.Metrics с приемниками; по умолчанию измерения выключены"""
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.progress = progress
+        self.metrics = metrics or Metrics()
+        self.metrics.add_collector(self.collect_metrics)
+        self._models_lock = threading.Lock()
+        self._search_lock = threading.Lock()
+        self.report("Загрузка каталога и оценок", 0.0)
+        self.models_path = Path(self.config['models_path'])
+        self.models_path.mkdir(parents=True, exist_ok=True)
+        with self.metrics.timer('data_load_seconds'):
+            books, self.ratings = self.load_data()
+            # Каталог хранится колонками, названия и описания - в файле через mmap
+            self.catalog = BookCatalog.from_frame(books).persist(self.models_path/"catalog")
+            del books
         self.book_images = self.load_book_images()
-        self.models_path = Path("models")
-        self.models_path.mkdir(exist_ok=True)
-        self._cache = {}
+        self.artifacts = ArtifactStore(self.models_path/"artifacts")
+        self.cache = ResultCache(max_entries=self.config['cache_entries'],
+                                 max_bytes=self.config['cache_bytes'],
+                                 ttl=self.config['cache_ttl'])
         
         # Определяем стоп-слова здесь, чтобы они были доступны во всех методах
         self.RUSSIAN_STOP_WORDS = [
@@ -25,6 +134,10 @@ class AdvancedBookRecommender:
         ]
         
         self.prepare_models()
+
+    def report(self, message, fraction):
+        if self.progress is not None:
+            self.progress(message, fraction)
     
     def load_book_images(self):
         try:
@@ -49,6 +162,16 @@ class AdvancedBookRecommender:
                 15: "https://m.media-amazon.com/images/I/91DfS2k6BLL._AC_UF1000,1000_QL80_.jpg"
             }
     
+    def load_data(self):
+        if not self.config['books_path']:
+            return self.load_extended_data()
+        if not self.config['ratings_path']:
+            raise ValueError("Вместе с books_path нужно указать ratings_path")
+        books = load_books(self.config['books_path'], chunk_size=self.config['load_chunk_size'])
+        ratings = load_ratings(self.config['ratings_path'], books['book_id'],
+                               chunk_size=self.config['load_chunk_size'])
+        return books, ratings
+
     def load_extended_data(self):
         books = pd.DataFrame({
             'book_id': range(1, 16),
@@ -85,11 +208,7 @@ class AdvancedBookRecommender:
             'popularity': [9.2, 9.5, 9.3, 8.9, 9.0, 9.7, 8.5, 9.1, 8.8, 8.7, 9.0, 9.3, 9.4, 8.9, 9.1]
         })
         
-        # Генерация реалистичных рейтингов
-        np.random.seed(42)
-        num_users = 200
-        user_preferences = np.random.normal(loc=0, scale=1, size=(num_users, 3))
-        
+        # Генерация реалистичных рейтингов (векторизованно, см. datagen.py)
         book_features = np.array([
             [1,0,0,0,0,0,0,0,0,0,9.2], [0,0,0,0,0,1,0,0,0,0,9.5],
             [0,0,0,0,0,0,1,0,0,0,9.3], [0,1,0,0,0,0,0,0,0,0,8.9],
@@ -100,115 +219,923 @@ class AdvancedBookRecommender:
             [0,0,0,0,0,1,0,0,0,0,9.4], [0,0,0,0,1,0,0,0,0,0,8.9],
             [0,1,0,0,0,0,0,0,0,0,9.1]
         ])
+        ratings = generate_ratings(num_users=200, num_books=len(books), density=0.3,
+                                   seed=42, book_features=book_features)
         
-        ratings = []
-        for user_id in range(num_users):
-            for book_id in range(15):
-                if np.random.random() > 0.7:
-                    base_rating = np.dot(user_preferences[user_id], book_features[book_id][:3])
-                    rating = np.clip((base_rating + np.random.normal(0,0.5) + book_features[book_id][-1]/2 -4)*2+3, 1, 5)
-                    ratings.append({
-                        'user_id': user_id+1,
-                        'book_id': book_id+1,
-                        'rating': int(round(rating))
-                    })
-        
-        return books, pd.DataFrame(ratings)
+        return books, ratings
+
+    def model_fingerprint(self):
+        settings = {key: self.config[key] for key in MODEL_SETTINGS}
+        settings['stop_words'] = self.RUSSIAN_STOP_WORDS
+        return fingerprint({'catalog': self.catalog.digest(), 'ratings': frame_digest(self.ratings)}, settings)
+
+    def index_books(self):
+        """Соответствие book_id <-> позиция строки в каталоге и во всех матрицах моделей"""
+        self.book_ids = self.catalog.book_ids
+        self.book_index = pd.Index(self.book_ids)
+        if not self.book_index.is_unique:
+            raise ValueError("book_id в каталоге должны быть уникальными")
+
+    def book_rows(self, book_ids):
+        rows = self.book_index.get_indexer(np.atleast_1d(book_ids))
+        if (rows < 0).any():
+            raise KeyError(f"Неизвестные book_id: {np.atleast_1d(book_ids)[rows < 0][:10].tolist()}")
+        return rows
+
+    def user_rows(self, user_ids):
+        """Позиции пользователей в user_ids (столбцы svd.components_ и строки user_book_matrix)"""
+        if getattr(self, '_user_index_for', None) is not self.user_ids:
+            self._user_index = pd.Index(self.user_ids)
+            self._user_index_for = self.user_ids
+        rows = self._user_index.get_indexer(np.atleast_1d(user_ids))
+        if (rows < 0).any():
+            raise KeyError(f"Неизвестные user_id: {np.atleast_1d(user_ids)[rows < 0][:10].tolist()}")
+        return rows
 
     def prepare_models(self):
+        self.index_books()
+        self.model_version = self.model_fingerprint()
+        self.report("Проверка сохраненных моделей", 0.2)
         try:
             self.load_models()
-            print("Models loaded from cache")
+            logger.info("Модели загружены из артефактов %s", self.model_version[:12])
+            self.metrics.increment('model_loads_total', source='artifacts')
+            self.report("Модели загружены", 1.0)
             return
-        except:
-            print("Training models from scratch...")
-        
-        self.books['metadata'] = self.books['genre'] + ' ' + self.books['author'] + ' ' + self.books['description']
-        
-        # TF-IDF
-        tfidf = TfidfVectorizer(stop_words=self.RUSSIAN_STOP_WORDS, max_features=5000)
-        tfidf_matrix = tfidf.fit_transform(self.books['metadata'])
-        self.content_similarity = cosine_similarity(tfidf_matrix)
-        
-        # Collaborative
-        self.user_book_matrix = self.ratings.pivot_table(
-            index='user_id', columns='book_id', values='rating', fill_value=0)
-        
-        svd = TruncatedSVD(n_components=10, random_state=42)
-        self.reduced_matrix = svd.fit_transform(self.user_book_matrix.T)
-        self.collab_similarity = cosine_similarity(self.reduced_matrix)
+        except FileNotFoundError:
+            logger.info("Сохраненных моделей нет, обучение с нуля")
+            reason = 'missing'
+        except ArtifactMismatchError as e:
+            logger.warning("Сохраненные модели отклонены (%s), обучение с нуля", e)
+            reason = 'mismatch'
+        self.metrics.increment('model_loads_total', source='training', reason=reason)
         
-        # Hybrid
-        self.hybrid_model = 0.6*self.content_similarity + 0.4*self.collab_similarity
+        # Этапы обучения - граф (см. pipeline.py): ветки TF-IDF и SVD и все,
+        # что от них зависит, считаются параллельно, а выходы этапов сохраняются,
+        # так что после сбоя или смены настройки пересчитываются только затронутые
+        self.similarity_indexes = {}
+        self.ann_indexes = {}
+        Pipeline(self.training_stages(), self.models_path/"stages",
+                 workers=self.config['train_workers'],
+                 timer=lambda name: self.metrics.timer('training_stage_seconds', stage=name),
+                 report=lambda message, done: self.report(message, 0.3 + 0.55*done),
+                 on_stage=lambda name, source: self.metrics.increment('training_stages_total',
+                                                                      stage=name, source=source)).run()
+        self.knn_model = self.ann_indexes['collab']
         
-        # KNN
-        self.knn_model = NearestNeighbors(n_neighbors=6, metric='cosine')
-        self.knn_model.fit(self.reduced_matrix)
-        
-        # Clustering
-        self.cluster_model = KMeans(n_clusters=5, random_state=42)
-        self.book_clusters = self.cluster_model.fit_predict(self.reduced_matrix)
-        self.books['cluster'] = self.book_clusters
+        # Объем данных полного обучения - база для оценки дрейфа в update()
+        self.fit_stats = {'fit_ratings': len(self.ratings), 'fit_books': len(self.catalog),
+                          'folded_ratings': 0, 'folded_books': 0}
         
+        self.loaded_parts = set(MODEL_PARTS)
+        self.cache.set_version(self.model_version)
+        with self.stage('save', "Сохранение моделей", 0.9):
+            self.save_models()
+        self.report("Модели обучены", 1.0)
+        self.metrics.collect()
+
+    def training_stages(self):
+        """Этапы обучения с зависимостями и ключами: настройки и отпечатки данных,
+        от которых зависит результат этапа"""
+        config = self.config
+        catalog = self.catalog.digest(('book_id', 'genre', 'author', 'description'))
+        ratings = frame_digest(self.ratings)
+        book_order = self.catalog.digest(('book_id',))
+        ann = {'ann_backend': config['ann_backend'], 'ann_lists': config['ann_lists']}
+        precision = config['factor_precision']
+        stages = [
+            Stage('tfidf', self.fit_tfidf, self.set_outputs, message="Обучение TF-IDF",
+                  key={'catalog': catalog, 'max_features': config['tfidf_max_features'],
+                       'stop_words': self.RUSSIAN_STOP_WORDS, 'dtype': np.dtype(float_dtype(precision)).name}),
+            Stage('svd', self.fit_svd, self.set_factors, message="Обучение SVD",
+                  key={'ratings': ratings, 'books': book_order, 'components': config['svd_components'],
+                       'precision': precision}),
+            Stage('kmeans', self.fit_clusters, self.set_outputs, depends=('svd',), message="Кластеризация",
+                  key={'n_clusters': config['n_clusters'], 'algorithm': config['cluster_algorithm']}),
+        ]
+        # Top-K индексы похожести строятся блоками, полная матрица N x N в памяти не создается
+        for method, depends in (('content', ('tfidf',)), ('collab', ('svd',)), ('cluster', ('tfidf', 'svd', 'kmeans'))):
+            key = {'top_k': config['top_k']}
+            if method == 'cluster':
+                key['hybrid_weights'] = list(config['hybrid_weights'])
+            stages.append(Stage(f'similarity.{method}', lambda method=method: self.fit_similarity_index(method),
+                                lambda outputs, method=method: self.set_similarity_index(method, outputs),
+                                depends=depends, key=key, message="Построение индексов похожести"))
+        # Для гибрида хранятся только вторые оценки соседей из индексов content и collab
+        stages.append(Stage('hybrid', self.fit_hybrid, self.set_outputs,
+                            depends=('tfidf', 'svd', 'similarity.content', 'similarity.collab'),
+                            message="Построение индексов похожести"))
+        # ANN-индексы: KNN по факторам SVD и поиск по TF-IDF для top_n > K
+        for space, depends in (('content', ('tfidf',)), ('collab', ('svd',))):
+            stages.append(Stage(f'ann.{space}', lambda space=space: self.fit_ann_index(space),
+                                lambda outputs, space=space: self.set_ann_index(space, outputs),
+                                depends=depends, key=ann, message="Построение ANN-индексов"))
+        return stages
+
+    def set_outputs(self, outputs):
+        for name, value in outputs.items():
+            setattr(self, name, value)
+
+    def set_factors(self, outputs):
+        # Факторы книг сохраняются массивами factor_arrays (для int8 - коды и масштабы)
+        factors = {name: restore_factors(name, outputs, outputs.__getitem__)
+                   for name in ('reduced_matrix', 'collab_vectors')}
+        self.set_outputs({name: value for name, value in outputs.items() if name.split('.')[0] not in factors})
+        self.set_outputs(factors)
+
+    def fit_tfidf(self):
+        tfidf = TfidfVectorizer(stop_words=self.RUSSIAN_STOP_WORDS, max_features=self.config['tfidf_max_features'],
+                                dtype=float_dtype(self.config['factor_precision']))
+        return {'tfidf_matrix': tfidf.fit_transform(self.catalog.metadata()), 'tfidf': tfidf}
+
+    def fit_svd(self):
+        # Collaborative: разреженная матрица users x books сразу идет в TruncatedSVD
+        user_ids = np.unique(self.ratings['user_id'].to_numpy())
+        user_book_matrix = interaction_matrix(self.ratings, user_ids, self.book_ids)
+        svd = TruncatedSVD(n_components=self.config['svd_components'], random_state=42)
+        reduced_matrix = svd.fit_transform(user_book_matrix.T.tocsr())
+        # SVD считается во float64, с пониженной точностью только хранятся факторы и оценки
+        precision = self.config['factor_precision']
+        svd.components_ = svd.components_.astype(float_dtype(precision))
+        user_book_matrix = user_book_matrix.astype(float_dtype(precision))
+        return {'user_ids': user_ids, 'user_book_matrix': user_book_matrix, 'svd': svd,
+                **factor_arrays('reduced_matrix', store_factors(reduced_matrix, precision)),
+                **factor_arrays('collab_vectors', store_factors(normalize(reduced_matrix), precision))}
+
+    def fit_clusters(self):
+        algorithm = self.config['cluster_algorithm']
+        if algorithm == 'kmeans':
+            cluster_model = KMeans(n_clusters=self.config['n_clusters'], random_state=42)
+        elif algorithm == 'minibatch':
+            cluster_model = MiniBatchKMeans(n_clusters=self.config['n_clusters'], random_state=42,
+                                            batch_size=4096, n_init=3)
+        else:
+            raise ValueError(f"Неизвестный алгоритм кластеризации: {algorithm!r}, доступны: 'kmeans', 'minibatch'")
+        book_clusters = cluster_model.fit_predict(self.reduced_matrix).astype(np.int32)
+        cluster_indptr, cluster_members = group_members(book_clusters, self.config['n_clusters'])
+        return {'book_clusters': book_clusters, 'cluster_indptr': cluster_indptr,
+                'cluster_members': cluster_members, 'cluster_model': cluster_model}
+
+    def fit_similarity_index(self, method):
+        workers = self.config['train_workers'] or os.cpu_count() or 1
+        if method == 'cluster':
+            # Списки соседей считаются внутри каждого кластера, без блоков N x N
+            return TopKSimilarityIndex.build_grouped(
+                lambda rows, cols: self.similarity_block('hybrid', rows, cols),
+                self.cluster_indptr, self.cluster_members, k=self.config['top_k'],
+                block_size=self.config['block_size'], workers=workers).arrays()
+        return TopKSimilarityIndex.build(
+            lambda rows: self.similarity_block(method, rows), len(self.catalog), k=self.config['top_k'],
+            block_size=self.config['block_size'], workers=workers).arrays()
+
+    def set_similarity_index(self, method, outputs):
+        self.similarity_indexes[method] = TopKSimilarityIndex.from_arrays(**outputs)
+
+    def fit_hybrid(self):
+        """Перекрестные оценки для гибрида, в порядке индексов content и collab"""
+        n_items, block_size = len(self.catalog), self.config['block_size']
+        k = self.similarity_indexes['collab'].k
+        content_scores = np.empty(n_items * k, dtype=np.float32)
+        collab_scores = np.empty(n_items * self.similarity_indexes['content'].k, dtype=np.float32)
+
+        def fill(start):
+            rows = np.arange(start, min(start + block_size, n_items))
+            self.fill_hybrid_scores(rows, content_scores, collab_scores)
+
+        starts = range(0, n_items, block_size)
+        workers = self.config['train_workers'] or os.cpu_count() or 1
+        if workers > 1 and len(starts) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(starts))) as pool:
+                list(pool.map(fill, starts))
+        else:
+            for start in starts:
+                fill(start)
+        return {'hybrid_content_scores': content_scores, 'hybrid_collab_scores': collab_scores}
+
+    def fill_hybrid_scores(self, rows, content_scores, collab_scores):
+        """Записывает для книг rows TF-IDF похожести с collab-соседями (content_scores)
+        и collab-похожести с content-соседями (collab_scores).
+
+        Соседу из обоих списков в content_scores ставится NaN: при смешивании
+        он учитывается один раз, по списку content.
+        """
+        content_index, collab_index = self.similarity_indexes['content'], self.similarity_indexes['collab']
+        content_ids, _ = content_index.neighbors_batch(rows, content_index.k)
+        collab_ids, _ = collab_index.neighbors_batch(rows, collab_index.k)
+        scores = self.pair_content_scores(rows, collab_ids)
+        scores[(collab_ids[:, :, None] == content_ids[:, None, :]).any(axis=2) & (collab_ids >= 0)] = np.nan
+        content_scores[collab_index.indptr[rows][:, None] + np.arange(collab_index.k)] = scores
+
+        vectors = self.collab_vectors
+        scores = np.einsum('qd,qcd->qc', vectors[rows], vectors[np.maximum(content_ids, 0)])
+        collab_scores[content_index.indptr[rows][:, None] + np.arange(content_index.k)] = scores
+
+    def pair_content_scores(self, rows, candidates):
+        """Косинус TF-IDF книги rows[i] с каждой книгой candidates[i] (для -1 - 0), массив как candidates.
+
+        Считается прямо по массивам CSR: строки запросов разворачиваются в
+        плотные векторы (по частям, чтобы часть x словарь оставалась небольшой),
+        а каждое ненулевое значение кандидата умножается на значение своего
+        термина в векторе запроса.
+        """
+        tfidf = self.tfidf_matrix
+        n_terms = tfidf.shape[1]
+        rows, candidates = np.asarray(rows), np.asarray(candidates)
+        scores = np.zeros(candidates.shape, dtype=np.float32)
+        part = max(1, 2**22 // max(n_terms, 1))
+        for start in range(0, len(rows), part):
+            query_owner, query_at = csr_entries(tfidf, rows[start:start + part])
+            queries = np.zeros((min(part, len(rows) - start), n_terms), dtype=tfidf.dtype)
+            queries[query_owner, tfidf.indices[query_at]] = tfidf.data[query_at]
+            block = candidates[start:start + part]
+            flat = block.ravel()
+            owner, at = csr_entries(tfidf, np.where(flat >= 0, flat, 0))
+            products = tfidf.data[at] * queries[owner // block.shape[1], tfidf.indices[at]]
+            block_scores = np.bincount(owner, weights=products, minlength=flat.size)
+            scores[start:start + part] = np.where(block >= 0, block_scores.reshape(block.shape), 0)
+        return scores
+
+    def fit_ann_index(self, space):
+        return self.new_ann_index(self.config['ann_backend']).fit(self.space_vectors(space)).arrays()
+
+    def set_ann_index(self, space, outputs):
+        self.ann_indexes[space] = self.new_ann_index(self.config['ann_backend']).restore(
+            self.space_vectors(space), outputs)
+
+    def new_ann_index(self, backend):
+        return make_ann_index(backend, n_lists=self.config['ann_lists'], n_probe=self.config['ann_probe'])
+
+    def space_vectors(self, space):
+        return self.tfidf_matrix if space == 'content' else self.collab_vectors
+
+    @contextmanager
+    def stage(self, name, message, fraction):
+        """Этап обучения: сообщение о ходе работы и таймер training_stage_seconds"""
+        self.report(message, fraction)
+        with self.metrics.timer('training_stage_seconds', stage=name):
+            yield
+
+    def model_sizes(self):
+        """Байты массивов каждой загруженной части моделей (для mmap - размер отображения)"""
+        def nbytes(value):
+            if sparse.issparse(value):
+                return value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+            return value.nbytes
+
+        arrays = {
+            'content': lambda: [self.tfidf_matrix],
+            'collab': lambda: [self.reduced_matrix, self.collab_vectors, self.user_ids,
+                               self.user_book_matrix, self.svd.components_],
+            'hybrid': lambda: [self.hybrid_content_scores, self.hybrid_collab_scores],
+            'cluster': lambda: [self.book_clusters, self.cluster_indptr, self.cluster_members],
+        }
+        sizes = {}
+        for part in self.loaded_parts:
+            size = sum(nbytes(value) for value in arrays[part]())
+            if part in self.similarity_indexes:
+                size += self.similarity_indexes[part].nbytes
+            if part in self.ann_indexes:
+                size += sum(nbytes(value) for value in self.ann_indexes[part].arrays().values())
+            sizes[part] = size
+        return sizes
+
+    def collect_metrics(self):
+        """Сборщик для Metrics.collect(): статистика кэша и размеры моделей"""
+        for name, value in self.cache.stats().items():
+            if name != 'version':
+                yield f'cache_{name}', {}, value
+        for part, size in self.model_sizes().items():
+            yield 'model_bytes', {'part': part}, size
+
+    def similarity_block(self, method, rows, cols=None, blend=None):
+        """Точные косинусные похожести строк rows с книгами cols (по умолчанию со всеми);
+        blend - веса (content, collab, popularity) для hybrid и cluster, по умолчанию веса индексов"""
+        if method == 'content':
+            # Строки TF-IDF уже нормированы по L2, поэтому скалярное произведение = косинус
+            other = self.tfidf_matrix if cols is None else self.tfidf_matrix[cols]
+            return dot_dense(self.tfidf_matrix[rows], other)
+        if method == 'collab':
+            other = self.collab_vectors if cols is None else self.collab_vectors[cols]
+            return dot_dense(self.collab_vectors[rows], other)
+        if method == 'cluster':
+            # Гибридная похожесть, книги из других кластеров исключены
+            block = self.similarity_block('hybrid', rows, cols, blend)
+            clusters = np.asarray(self.book_clusters)
+            col_clusters = clusters if cols is None else clusters[cols]
+            block[clusters[rows][:, None] != col_clusters[None, :]] = -np.inf
+            return block
+        content_weight, collab_weight, popularity_weight = blend or self.index_blend()
+        block = (content_weight*self.similarity_block('content', rows, cols)
+                 + collab_weight*self.similarity_block('collab', rows, cols))
+        if popularity_weight:
+            prior = self.popularity_prior()
+            block += popularity_weight*(prior if cols is None else prior[cols])
+        return block
+
+    def similarity_scores(self, method, row, candidates, blend=None):
+        """Точные похожести книги row только с книгами candidates"""
+        return self.similarity_block(method, [row], candidates, blend)[0]
+
+    def hybrid_blend(self, weights=None, popularity_weight=None):
+        """Веса гибрида (content, collab, popularity) запроса; None - из конфигурации"""
+        content_weight, collab_weight = self.config['hybrid_weights'] if weights is None else weights
+        if popularity_weight is None:
+            popularity_weight = self.config['popularity_weight']
+        return float(content_weight), float(collab_weight), float(popularity_weight)
+
+    def index_blend(self):
+        """Веса гибрида, с которыми построен индекс cluster"""
+        content_weight, collab_weight = self.config['hybrid_weights']
+        return float(content_weight), float(collab_weight), 0.0
+
+    def popularity_prior(self):
+        """Популярность книг, приведенная к [0, 1]"""
+        if getattr(self, '_prior_for', None) is not self.catalog:
+            popularity = self.catalog.popularity.astype(np.float64)
+            span = popularity.max() - popularity.min() if len(popularity) else 0
+            self._prior = (popularity - popularity.min()) / span if span > 0 else np.zeros(len(popularity))
+            self._prior_for = self.catalog
+        return self._prior
+
+    def blend_rows(self, rows, top_n, blend):
+        """Гибридные соседи книг rows с весами blend (content, collab, popularity).
+
+        Кандидаты - объединение списков content и collab книги; для соседей из
+        обоих списков вторая похожесть сохранена при обучении (hybrid_collab_scores
+        и hybrid_content_scores), поэтому смешивание с любыми весами - несколько
+        операций над 2K числами на книгу, как чтение строки индекса. Оценки
+        точные, но набор приближенный: книга вне обоих списков не попадает в
+        выдачу, даже если ее смешанная оценка выше.
+
+        При config['hybrid_exact'] книга вне обоих списков оценивается сверху
+        как content_weight*c_K + collab_weight*s_K + popularity_weight*max(популярности),
+        где c_K и s_K - последние оценки списков. Если top_n-я оценка кандидатов
+        ниже этой границы (и при отрицательных весах), строка считается целиком
+        через similarity_block. Граница грубая, и с весами, отличными от 1 и 0,
+        пересчитывается большинство строк - это медленный режим для проверок.
+        Возвращает позиции (-1 - пусто) и оценки len(rows) x top_n.
+        """
+        content_weight, collab_weight, popularity_weight = blend
+        content_index, collab_index = self.similarity_indexes['content'], self.similarity_indexes['collab']
+        content_offsets = content_index.indptr[rows][:, None] + np.arange(content_index.k)
+        collab_offsets = collab_index.indptr[rows][:, None] + np.arange(collab_index.k)
+        candidates = np.hstack([content_index.indices[content_offsets], collab_index.indices[collab_offsets]])
+        scores = np.hstack([
+            content_weight*content_index.scores[content_offsets] + collab_weight*self.hybrid_collab_scores[content_offsets],
+            content_weight*self.hybrid_content_scores[collab_offsets] + collab_weight*collab_index.scores[collab_offsets]])
+        if popularity_weight:
+            scores += popularity_weight*self.popularity_prior()[candidates]
+        # NaN - повтор соседа из списка content
+        scores[np.isnan(scores) | (candidates < 0)] = -np.inf
+
+        lines = np.arange(len(rows))[:, None]
+        if top_n < scores.shape[1]:
+            top = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+            candidates, scores = candidates[lines, top], scores[lines, top]
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :top_n]
+        candidates, scores = candidates[lines, top], scores[lines, top]
+        candidates = np.where(np.isfinite(scores), candidates, -1)
+
+        if not self.config['hybrid_exact'] or not top_n:
+            uncertain = np.empty(0, dtype=np.int64)
+        elif min(blend) < 0:
+            uncertain = np.arange(len(rows))
+        else:
+            # -inf в конце списка - других книг нет; вес 0 не добавляет границе ничего
+            bound = np.zeros(len(rows))
+            for weight, index, offsets in ((content_weight, content_index, content_offsets),
+                                           (collab_weight, collab_index, collab_offsets)):
+                if weight:
+                    bound += weight*index.scores[offsets[:, -1]]
+            if popularity_weight:
+                bound += popularity_weight*self.popularity_prior().max(initial=0)
+            uncertain = np.flatnonzero(scores[:, -1] < bound)
+        if len(uncertain):
+            self.metrics.increment('hybrid_exact_rows_total', len(uncertain))
+        for start in range(0, len(uncertain), self.config['block_size']):
+            block_lines = uncertain[start:start + self.config['block_size']]
+            block_rows = rows[block_lines]
+            block = self.similarity_block('hybrid', block_rows, blend=blend)
+            block[np.arange(len(block_rows)), block_rows] = -np.inf
+            found = top_k_indices(block, top_n)
+            found_scores = np.take_along_axis(block, found, axis=1)
+            candidates[block_lines], scores[block_lines] = -1, -np.inf
+            candidates[block_lines, :found.shape[1]] = np.where(np.isfinite(found_scores), found, -1)
+            scores[block_lines, :found.shape[1]] = found_scores
+        return candidates, scores
+
+    def ann_candidates(self, method, row, n):
+        """Кандидаты в соседи из ANN-индекса (для hybrid - объединение content и collab)"""
+        spaces = ('content', 'collab') if method == 'hybrid' else (method,)
+        vectors = {'content': self.tfidf_matrix, 'collab': self.collab_vectors}
+        found = [self.ann_indexes[space].search(vectors[space][[row]], n + 1)[0][0] for space in spaces]
+        candidates = np.unique(np.concatenate(found))
+        return candidates[(candidates >= 0) & (candidates != row)]
+
+    def similar_books(self, method, row, top_n, blend=None):
+        """Позиции и оценки top_n соседей книги; гибрид смешивается из списков соседей,
+        при top_n > K или весах cluster не как у индекса строка считается напрямую"""
+        if method == 'hybrid':
+            blend = blend or self.hybrid_blend()
+            if top_n <= self.similarity_indexes['content'].k:
+                positions, scores = self.blend_rows(np.array([row]), top_n, blend)
+                found = positions[0] >= 0
+                return positions[0][found], scores[0][found]
+        indexed = method != 'cluster' or blend in (None, self.index_blend())
+        if method in INDEX_METHODS and indexed and top_n <= self.similarity_indexes[method].k:
+            index = self.similarity_indexes[method]
+            indices, scores = index.neighbors(row, top_n)
+            # В маленьком кластере соседей меньше K, пустые места помечены -inf
+            valid = np.isfinite(scores)
+            return indices[valid], scores[valid]
+        if method == 'cluster':
+            cluster = self.book_clusters[row]
+            candidates = self.cluster_members[self.cluster_indptr[cluster]:self.cluster_indptr[cluster + 1]]
+            candidates = candidates[candidates != row]
+        else:
+            candidates = self.ann_candidates(method, row, top_n)
+        scores = self.similarity_scores(method, row, candidates, blend)
+        top = top_k_indices(scores, top_n)[0]
+        return candidates[top], scores[top]
+
+    def update(self, new_ratings=None, new_books=None):
+        """Добавляет новые оценки и книги без полного переобучения.
+
+        Новые книги векторизуются обученным словарем TF-IDF, новые пользователи
+        и затронутые книги встраиваются (fold-in) в уже найденные факторы SVD,
+        затем обновляются только затронутые списки соседей, ANN-индексы и
+        кластеры. Если с последнего полного обучения накопилось больше
+        config['refit_drift'] новых данных, модели переобучаются целиком.
+        """
+        started = time.perf_counter()
+        self.ensure_models()
+        # Новые данные приводятся к типам загрузчиков: тогда отпечаток моделей после update()
+        # совпадет с отпечатком при запуске по исходным файлам, дополненным теми же строками
+        new_books = compact_books(pd.DataFrame(columns=BOOK_COLUMNS) if new_books is None else new_books,
+                                  "новые книги")
+        n_old = len(self.catalog)
+        if new_books['book_id'].isin(self.book_ids).any():
+            raise ValueError("book_id новых книг должны быть уникальными и отсутствовать в каталоге")
+        known = np.concatenate([self.book_ids, new_books['book_id'].to_numpy()])
+        new_ratings = compact_ratings(self.ratings.iloc[:0] if new_ratings is None else new_ratings, known,
+                                      "новые оценки")
+
+        if len(new_books):
+            self.catalog = self.catalog.append(new_books).persist(self.models_path/"catalog")
+        self.index_books()
+        # Оценки дописываются как есть, как строки в конце файла; повторная оценка
+        # книги пользователем заменяет прежнюю в interaction_matrix (keep='last')
+        self.ratings = pd.concat([self.ratings, new_ratings], ignore_index=True)
+        self.fit_stats['folded_ratings'] += len(new_ratings)
+        self.fit_stats['folded_books'] += len(new_books)
+        drift = max(self.fit_stats['folded_ratings'] / max(self.fit_stats['fit_ratings'], 1),
+                    self.fit_stats['folded_books'] / max(self.fit_stats['fit_books'], 1))
+        if drift > self.config['refit_drift']:
+            self.prepare_models()
+            self.metrics.observe('update_seconds', time.perf_counter() - started, mode='refit')
+            return {'mode': 'refit', 'drift': drift}
+
+        n_items = len(self.catalog)
+        affected = np.union1d(self.book_rows(new_ratings['book_id'].unique()), np.arange(n_old, n_items))
+
+        # Контент: новые книги векторизуются без переобучения словаря
+        if len(new_books):
+            new_tfidf = self.tfidf.transform(book_metadata(new_books))
+            self.tfidf_matrix = sparse.vstack([self.tfidf_matrix, new_tfidf]).tocsr()
+
+        # Новые пользователи дописываются в конец, порядок старых (столбцов SVD) не меняется
+        new_users = np.setdiff1d(new_ratings['user_id'].unique(), self.user_ids)
+        self.user_ids = np.concatenate([self.user_ids, new_users])
+        self.user_book_matrix = interaction_matrix(self.ratings, self.user_ids,
+                                                   self.book_ids).astype(self.user_book_matrix.dtype)
+
+        # Коллаборативная часть: fold-in новых пользователей, v = reduced^T r / sigma^2
+        reduced = np.zeros((n_items, self.reduced_matrix.shape[1]))
+        reduced[:n_old] = self.reduced_matrix
+        if len(new_users):
+            new_rows = self.user_book_matrix[len(self.user_ids) - len(new_users):]
+            new_components = (new_rows @ reduced).T / self.svd.singular_values_[:, None]**2
+            components = self.svd.components_
+            self.svd.components_ = np.hstack([components, new_components]).astype(components.dtype)
+
+        # Затронутые книги заново проецируются на компоненты по всем своим оценкам
+        item_rows = self.user_book_matrix.T.tocsr()[affected]
+        reduced[affected] = item_rows @ self.svd.components_.T
+        precision = self.config['factor_precision']
+        self.reduced_matrix = store_factors(reduced, precision)
+        self.collab_vectors = store_factors(normalize(reduced), precision)
+
+        # Кластеры затронутых книг - до индексов: индекс 'cluster' зависит от них
+        book_clusters = np.zeros(n_items, dtype=np.asarray(self.book_clusters).dtype)
+        book_clusters[:n_old] = self.book_clusters
+        book_clusters[affected] = self.cluster_model.predict(reduced[affected].astype(self.reduced_matrix.dtype))
+        self.book_clusters = book_clusters
+        self.cluster_indptr, self.cluster_members = group_members(book_clusters, len(self.cluster_indptr) - 1)
+
+        old_indexes = self.similarity_indexes
+        self.similarity_indexes = {
+            method: index.updated(
+                lambda rows, cols=None, method=method: self.similarity_block(method, rows, cols),
+                affected, n_items, block_size=self.config['block_size'])
+            for method, index in self.similarity_indexes.items()
+        }
+        # Оценки гибрида пересчитываются у книг, у которых изменился список соседей,
+        # свой вектор SVD или вектор SVD одного из content-соседей
+        content, collab = self.similarity_indexes['content'], self.similarity_indexes['collab']
+        stale = np.zeros(n_items, dtype=bool)
+        stale[affected] = True
+        stale |= np.isin(content.indices, affected).reshape(n_items, content.k).any(axis=1)
+        for method in ('content', 'collab'):
+            index, old = self.similarity_indexes[method], old_indexes[method]
+            stale[:n_old] |= (index.indices[:n_old*index.k] != old.indices).reshape(n_old, index.k).any(axis=1)
+        hybrid_content_scores = np.empty(n_items * collab.k, dtype=np.float32)
+        hybrid_content_scores[:n_old*collab.k] = self.hybrid_content_scores
+        hybrid_collab_scores = np.empty(n_items * content.k, dtype=np.float32)
+        hybrid_collab_scores[:n_old*content.k] = self.hybrid_collab_scores
+        stale = np.flatnonzero(stale)
+        for start in range(0, len(stale), self.config['block_size']):
+            self.fill_hybrid_scores(stale[start:start + self.config['block_size']],
+                                    hybrid_content_scores, hybrid_collab_scores)
+        self.hybrid_content_scores, self.hybrid_collab_scores = hybrid_content_scores, hybrid_collab_scores
+        self.ann_indexes['content'].update(self.tfidf_matrix, np.arange(n_old, n_items))
+        self.ann_indexes['collab'].update(self.collab_vectors, affected)
+        self.knn_model = self.ann_indexes['collab']
+
+        self.model_version = self.model_fingerprint()
+        self.cache.set_version(self.model_version)
         self.save_models()
+        self.metrics.observe('update_seconds', time.perf_counter() - started, mode='incremental')
+        self.metrics.collect()
+        return {'mode': 'incremental', 'drift': drift, 'affected_books': len(affected),
+                'new_users': len(new_users)}
 
     def save_models(self):
-        joblib.dump({
-            'content_similarity': self.content_similarity,
-            'reduced_matrix': self.reduced_matrix,
-            'collab_similarity': self.collab_similarity,
-            'hybrid_model': self.hybrid_model,
-            'knn_model': self.knn_model,
-            'cluster_model': self.cluster_model,
-            'book_clusters': self.book_clusters
-        }, self.models_path/"book_models.pkl")
+        arrays = {
+            'tfidf_matrix': self.tfidf_matrix,
+            **factor_arrays('reduced_matrix', self.reduced_matrix),
+            **factor_arrays('collab_vectors', self.collab_vectors),
+            'book_clusters': self.book_clusters,
+            'cluster_indptr': self.cluster_indptr,
+            'cluster_members': self.cluster_members,
+            'hybrid_content_scores': self.hybrid_content_scores,
+            'hybrid_collab_scores': self.hybrid_collab_scores,
+            'user_ids': self.user_ids,
+            'book_ids': self.book_ids,
+            'user_book_matrix': self.user_book_matrix,
+        }
+        for method, index in self.similarity_indexes.items():
+            arrays.update({f'similarity.{method}.{name}': value for name, value in index.arrays().items()})
+        for space, index in self.ann_indexes.items():
+            arrays.update({f'ann.{space}.{name}': value for name, value in index.arrays().items()})
+        self.artifacts.save(self.model_version, arrays,
+                            objects={'cluster_model': self.cluster_model, 'tfidf': self.tfidf, 'svd': self.svd},
+                            meta={'ann_backend': self.config['ann_backend'], 'fit_stats': self.fit_stats})
 
     def load_models(self):
-        models = joblib.load(self.models_path/"book_models.pkl")
-        self.content_similarity = models['content_similarity']
-        self.reduced_matrix = models['reduced_matrix']
-        self.collab_similarity = models['collab_similarity']
-        self.hybrid_model = models['hybrid_model']
-        self.knn_model = models['knn_model']
-        self.cluster_model = models['cluster_model']
-        self.book_clusters = models['book_clusters']
-        self.books['cluster'] = self.book_clusters
-
-    def get_recommendations(self, book_id, method='hybrid', top_n=5):
-        cache_key = (book_id, method, top_n)
-        if cache_key in self._cache:
-            return self._cache[cache_key]
+        """Проверяет артефакты; сами части моделей читаются через ensure_models()"""
+        with self.metrics.timer('artifact_load_seconds', part='manifest'):
+            self.manifest = self.artifacts.check(self.model_version)
+            if not np.array_equal(self.artifacts.array(self.manifest, 'book_ids'), self.book_ids):
+                raise ArtifactMismatchError("порядок книг в артефактах не совпадает с каталогом")
+        self.fit_stats = self.manifest['meta']['fit_stats']
+        self.loaded_parts = set()
+        self.similarity_indexes = {}
+        self.ann_indexes = {}
+        self.cache.set_version(self.model_version)
+        if not self.config['lazy_models']:
+            self.ensure_models()
+
+    def ensure_models(self, method=None):
+        """Загружает части моделей, нужные методу (по умолчанию все), если их еще нет"""
+        parts = METHOD_PARTS.get(method, MODEL_PARTS)
+        if self.loaded_parts.issuperset(parts):
+            return
+        with self._models_lock:
+            for part in parts:
+                if part not in self.loaded_parts:
+                    with self.metrics.timer('artifact_load_seconds', part=part):
+                        self.load_part(part)
+                    self.loaded_parts.add(part)
+        self.metrics.collect()
+
+    def load_part(self, part):
+        # Массивы открываются через mmap: загрузка не копирует данные в память
+        def array(name):
+            value = self.artifacts.array(self.manifest, name, mmap_mode='r')
+            # Индексация np.memmap идет через Python-обертку; ndarray над тем же отображением быстрее
+            return np.asarray(value) if isinstance(value, np.ndarray) else value
+
+        backend = self.manifest['meta']['ann_backend']
+        if part in ('content', 'collab'):
+            if part == 'content':
+                self.tfidf_matrix = vectors = array('tfidf_matrix')
+                self.tfidf = self.artifacts.object(self.manifest, 'tfidf')
+            else:
+                self.reduced_matrix = restore_factors('reduced_matrix', self.manifest['arrays'], array)
+                self.collab_vectors = vectors = restore_factors('collab_vectors', self.manifest['arrays'], array)
+                self.svd = self.artifacts.object(self.manifest, 'svd')
+                self.user_ids = array('user_ids')
+                self.user_book_matrix = array('user_book_matrix')
+            self.ann_indexes[part] = self.new_ann_index(backend).restore(vectors, {
+                name.split('.')[-1]: array(name) for name in self.manifest['arrays']
+                if name.startswith(f'ann.{part}.')})
+            if part == 'collab':
+                self.knn_model = self.ann_indexes['collab']
+        if part in INDEX_METHODS:
+            self.similarity_indexes[part] = TopKSimilarityIndex.from_arrays(**{
+                name: array(f'similarity.{part}.{name}') for name in ('indptr', 'indices', 'scores')})
+        if part == 'hybrid':
+            self.hybrid_content_scores = array('hybrid_content_scores')
+            self.hybrid_collab_scores = array('hybrid_collab_scores')
+        if part == 'cluster':
+            self.cluster_model = self.artifacts.object(self.manifest, 'cluster_model')
+            self.book_clusters = array('book_clusters')
+            self.cluster_indptr = array('cluster_indptr')
+            self.cluster_members = array('cluster_members')
+
+    def get_recommendations(self, book_id, method='hybrid', top_n=5, weights=None, popularity_weight=None):
+        """Похожие книги; для 'hybrid' weights=(content, collab) и popularity_weight
+        заменяют веса из конфигурации только в этом запросе"""
+        if method not in SIMILARITY_METHODS:
+            method = 'hybrid'
+        with self.metrics.timer('query_seconds', method=method):
+            blend = self.hybrid_blend(weights, popularity_weight) if method in ('hybrid', 'cluster') else None
+            cache_key = ('similar', book_id, method, blend)
+            cached = self.cache.get(cache_key, top_n)
+            if cached is not None:
+                return cached
         
-        if method == 'content':
-            scores = self.content_similarity[book_id-1]
-        elif method == 'collab':
-            scores = self.collab_similarity[book_id-1]
-        elif method == 'cluster':
-            cluster_id = self.books.loc[self.books['book_id']==book_id, 'cluster'].values[0]
-            cluster_books = self.books[self.books['cluster']==cluster_id]
-            similar_indices = cluster_books['book_id'].apply(lambda x: self.hybrid_model[book_id-1,x-1])
-            similar_indices = similar_indices.sort_values(ascending=False).index[:top_n+1]
-            result = self.books.iloc[similar_indices]
-            result = result[result['book_id']!=book_id].head(top_n)
-            self._cache[cache_key] = result
+            self.ensure_models(method)
+            row = self.book_rows(book_id)[0]
+            result = Recommendations(self.catalog, *self.similar_books(method, row, top_n, blend))
+            self.cache.put(cache_key, top_n, result)
             return result
-        else:
-            scores = self.hybrid_model[book_id-1]
-        
-        similar_indices = np.argsort(scores)[-top_n-1:-1][::-1]
-        result = self.books.iloc[similar_indices]
-        self._cache[cache_key] = result
+
+    def get_recommendations_batch(self, book_ids, method='hybrid', top_n=5, hydrate=False,
+                                  weights=None, popularity_weight=None):
+        """Рекомендации сразу для многих книг.
+
+        Возвращает массивы (ids, scores) формы len(book_ids) x top_n: book_id
+        рекомендаций (int32, -1 если кандидатов меньше top_n) и их оценки (float32).
+        При hydrate=True возвращается DataFrame с колонками query_book_id, rank,
+        score и полями книги. weights и popularity_weight - веса гибрида для
+        'hybrid' и кандидатов 'diverse', как в get_recommendations.
+        """
+        if method not in METHOD_PARTS:
+            raise ValueError(f"Метод {method!r} не поддерживает пакетные рекомендации")
+        with self.metrics.timer('query_seconds', method=method, api='batch'):
+            self.ensure_models(method)
+            rows = self.book_rows(book_ids).astype(np.int64)
+            positions, scores = self.recommend_rows(rows, method, top_n, self.hybrid_blend(weights, popularity_weight))
+
+            ids = np.where(positions >= 0, self.book_ids[positions], -1).astype(np.int32)
+            if not hydrate:
+                return ids, scores
+
+            query_ids = np.repeat(np.asarray(book_ids), top_n)
+            ranks = np.tile(np.arange(1, top_n + 1), len(rows))
+            valid = ids.ravel() >= 0
+            result = self.catalog.to_frame(positions.ravel()[valid])
+            result.insert(0, 'query_book_id', query_ids[valid])
+            result.insert(1, 'rank', ranks[valid])
+            result.insert(2, 'score', scores.ravel()[valid])
+            return result
+
+    def recommend_rows(self, rows, method, top_n, blend=None):
+        """Позиции (-1 - пусто) и оценки рекомендаций для позиций книг rows, массивы len(rows) x top_n;
+        blend - веса гибрида (content, collab, popularity), по умолчанию из конфигурации"""
+        blend = blend or self.hybrid_blend()
+        # Индекс cluster построен с весами index_blend(), для других весов не подходит
+        indexed = method != 'cluster' or blend == self.index_blend()
+        positions = np.full((len(rows), top_n), -1, dtype=np.int64)
+        scores = np.full((len(rows), top_n), -np.inf, dtype=np.float32)
+
+        if method == 'knn':
+            found, found_scores = self.knn_model.search(self.collab_vectors[rows], top_n+1)
+            # Убираем саму книгу; если ее нет в выдаче - отбрасываем последнего соседа
+            keep = (found != rows[:, None]) & (found >= 0)
+            order = np.argsort(~keep, axis=1, kind='stable')[:, :top_n]
+            positions[:] = np.where(np.take_along_axis(keep, order, axis=1),
+                                    np.take_along_axis(found, order, axis=1), -1)
+            scores[:] = np.take_along_axis(found_scores, order, axis=1)
+        elif method == 'hybrid' and top_n <= self.similarity_indexes['content'].k:
+            found, found_scores = self.blend_rows(rows, top_n, blend)
+            positions[:, :found.shape[1]] = found
+            scores[:, :found.shape[1]] = found_scores
+        elif method in INDEX_METHODS and indexed and top_n <= self.similarity_indexes[method].k:
+            found, found_scores = self.similarity_indexes[method].neighbors_batch(rows, top_n)
+            positions[:, :found.shape[1]] = np.where(np.isfinite(found_scores), found, -1)
+            scores[:, :found.shape[1]] = found_scores
+        elif method in SIMILARITY_METHODS:
+            for start in range(0, len(rows), self.config['block_size']):
+                block_rows = rows[start:start + self.config['block_size']]
+                block = self.similarity_block(method, block_rows, blend=blend)
+                block[np.arange(len(block_rows)), block_rows] = -np.inf
+                top = top_k_indices(block, top_n)
+                top_scores = np.take_along_axis(block, top, axis=1)
+                positions[start:start + len(block_rows), :top.shape[1]] = np.where(np.isfinite(top_scores), top, -1)
+                scores[start:start + len(block_rows), :top.shape[1]] = top_scores
+        elif method == 'diverse' and self.config['diversity'] == 'mmr':
+            found, found_scores = self.diverse_rerank(rows, top_n, blend)
+            positions[:, :found.shape[1]] = found
+            scores[:, :found.shape[1]] = found_scores
+        elif method == 'diverse':
+            # Кандидаты content, collab и cluster по 2*top_n без повторов и самой книги,
+            # по убыванию популярности; оценка - популярность
+            candidates = np.hstack([self.recommend_rows(rows, part, top_n*2, blend)[0]
+                                    for part in ('content', 'collab', 'cluster')])
+            candidates[candidates == rows[:, None]] = -1
+            # Повтор - элемент, равный предыдущему в устойчиво отсортированной строке
+            order = np.argsort(candidates, axis=1, kind='stable')
+            ordered = np.take_along_axis(candidates, order, axis=1)
+            repeated = np.zeros(candidates.shape, dtype=bool)
+            np.put_along_axis(repeated, order[:, 1:], ordered[:, 1:] == ordered[:, :-1], axis=1)
+            candidates[repeated] = -1
+            popularity = self.catalog.popularity
+            candidate_scores = np.where(candidates >= 0, popularity[candidates], -np.inf)
+            top = np.argsort(-candidate_scores, axis=1, kind='stable')[:, :top_n]
+            top_scores = np.take_along_axis(candidate_scores, top, axis=1)
+            positions[:, :top.shape[1]] = np.where(np.isfinite(top_scores),
+                                                   np.take_along_axis(candidates, top, axis=1), -1)
+            scores[:, :top.shape[1]] = top_scores
+        return positions, scores
+
+    def diverse_rerank(self, rows, top_n, blend=None):
+        """Maximal marginal relevance по гибридным кандидатам.
+
+        Кандидаты - max(diversity_candidates, top_n) гибридных соседей книги.
+        На каждом шаге для всех запросов сразу выбирается кандидат с наибольшим
+        lambda * relevance - (1 - lambda) * max(похожесть на уже выбранные),
+        где lambda = config['diversity_lambda'] (1 - чистая релевантность).
+        Оценка результата - гибридная похожесть на исходную книгу; blend - веса
+        гибрида, они же веса похожести кандидатов между собой. Похожести
+        кандидатов считаются блоками по block_size запросов.
+        """
+        blend = blend or self.hybrid_blend()
+        diversity_lambda = self.config['diversity_lambda']
+        candidates, relevance = self.recommend_rows(rows, 'hybrid', max(self.config['diversity_candidates'], top_n),
+                                                    blend)
+        available = candidates >= 0
+        n_rows, n_candidates = candidates.shape
+        steps = min(top_n, n_candidates)
+        chosen = np.full((n_rows, steps), -1, dtype=np.int64)
+        chosen_scores = np.full((n_rows, steps), -np.inf, dtype=np.float32)
+        if not n_rows or not steps:
+            return chosen, chosen_scores
+
+        relevance = np.where(available, relevance, 0).astype(np.float32)
+        for start in range(0, n_rows, self.config['block_size']):
+            lines = slice(start, start + self.config['block_size'])
+            block_candidates, block_available, block_relevance = candidates[lines], available[lines], relevance[lines]
+            pairwise = self.candidate_similarity(block_candidates, blend)
+            max_similarity = np.zeros(block_candidates.shape, dtype=np.float32)
+            query = np.arange(len(block_candidates))
+            for step in range(steps):
+                objective = diversity_lambda*block_relevance - (1 - diversity_lambda)*max_similarity
+                pick = np.where(block_available, objective, -np.inf).argmax(axis=1)
+                found = block_available[query, pick]
+                chosen[lines, step] = np.where(found, block_candidates[query, pick], -1)
+                chosen_scores[lines, step] = np.where(found, block_relevance[query, pick], -np.inf)
+                block_available[query, pick] = False
+                similarity = pairwise[query, pick]
+                max_similarity = similarity if step == 0 else np.maximum(max_similarity, similarity)
+        return chosen, chosen_scores
+
+    def candidate_similarity(self, candidates, blend):
+        """Гибридные похожести кандидатов каждого запроса между собой: len x C x C, float32.
+
+        Из blend берутся веса content и collab: популярность не зависит от пары книг.
+
+        Для TF-IDF строки кандидатов каждого запроса сдвигаются в свой диапазон
+        столбцов, поэтому одно разреженное произведение блочно-диагональное и
+        считает только пары кандидатов одного запроса.
+        """
+        n_rows, n_candidates = candidates.shape
+        safe = np.where(candidates >= 0, candidates, 0)
+        content_weight, collab_weight, _ = blend
+        collab = np.asarray(self.collab_vectors[safe])
+        result = np.einsum('qcd,qed->qce', collab, collab, dtype=np.float32, casting='same_kind')
+        result *= collab_weight
+
+        n_terms = self.tfidf_matrix.shape[1]
+        # Группы запросов ограничены, чтобы номера сдвинутых столбцов помещались в int32
+        group = max(1, min(self.config['block_size'], np.iinfo(np.int32).max // max(n_terms, 1)))
+        for start in range(0, n_rows, group):
+            block = safe[start:start + group]
+            vectors = sparse.csr_matrix(self.tfidf_matrix[block.ravel()])
+            owner = np.repeat(np.arange(len(block.ravel())) // n_candidates, np.diff(vectors.indptr))
+            shifted = sparse.csr_matrix((vectors.data, vectors.indices + owner*n_terms, vectors.indptr),
+                                        shape=(vectors.shape[0], len(block)*n_terms))
+            gram = (shifted @ shifted.T).tocoo()
+            result[start + gram.row // n_candidates, gram.row % n_candidates,
+                   gram.col % n_candidates] += content_weight*gram.data
         return result
 
     def get_knn_recommendations(self, book_id, top_n=5):
-        distances, indices = self.knn_model.kneighbors(
-            [self.reduced_matrix[book_id-1]], n_neighbors=top_n+1)
-        return self.books.iloc[indices[0][1:]]
+        with self.metrics.timer('query_seconds', method='knn'):
+            cache_key = ('knn', book_id)
+            cached = self.cache.get(cache_key, top_n)
+            if cached is not None:
+                return cached
+        
+            self.ensure_models('knn')
+            row = self.book_rows(book_id)[0]
+            indices, scores = self.knn_model.search(self.collab_vectors[[row]], top_n+1)
+            keep = (indices[0] >= 0) & (indices[0] != row)
+            result = Recommendations(self.catalog, indices[0][keep][:top_n], scores[0][keep][:top_n])
+            self.cache.put(cache_key, top_n, result)
+            return result
 
     def get_diverse_recommendations(self, book_id, top_n=5):
-        content_rec = self.get_recommendations(book_id, 'content', top_n*2)
-        collab_rec = self.get_recommendations(book_id, 'collab', top_n*2)
-        cluster_rec = self.get_recommendations(book_id, 'cluster', top_n*2)
-        all_rec = pd.concat([content_rec, collab_rec, cluster_rec]).drop_duplicates()
-        all_rec = all_rec[all_rec['book_id']!=book_id]
-        return all_rec.sort_values('popularity', ascending=False).head(top_n)
\ No newline at end of file
+        with self.metrics.timer('query_seconds', method='diverse'):
+            # Набор кандидатов и порядок зависят от top_n, поэтому без префиксов
+            cache_key = ('diverse', book_id)
+            cached = self.cache.get(cache_key, top_n)
+            if cached is not None:
+                return cached
+        
+            self.ensure_models('diverse')
+            positions, scores = self.recommend_rows(self.book_rows(book_id).astype(np.int64), 'diverse', top_n)
+            found = positions[0] >= 0
+            result = Recommendations(self.catalog, positions[0][found], scores[0][found])
+            self.cache.put(cache_key, top_n, result, prefix=False)
+            return result
+
+    def recommend_for_user(self, user_id, top_n=5):
+        """Персональные рекомендации пользователю по факторам SVD (без уже оцененных книг)"""
+        with self.metrics.timer('query_seconds', method='user'):
+            cache_key = ('user', user_id)
+            cached = self.cache.get(cache_key, top_n)
+            if cached is not None:
+                return cached
+
+            ids, scores = self.recommend_for_users([user_id], top_n)
+            found = ids[0] >= 0
+            result = Recommendations(self.catalog, self.book_rows(ids[0][found]), scores[0][found])
+            self.cache.put(cache_key, top_n, result)
+            return result
+
+    def recommend_for_users(self, user_ids, top_n=10, hydrate=False):
+        """Персональные рекомендации сразу многим пользователям.
+
+        Оценка книги для пользователя - восстановленная SVD оценка
+        reduced_matrix @ svd.components_[:, user]; для блока из block_size
+        пользователей это одно матричное умножение, поэтому в памяти лежит
+        только block_size x число книг оценок. Уже оцененные книги исключаются
+        по разреженной user_book_matrix.
+
+        Возвращает (ids, scores) формы len(user_ids) x top_n, как
+        get_recommendations_batch (-1 - рекомендаций меньше top_n); при
+        hydrate=True - DataFrame с колонками user_id, rank, score и полями книги.
+        """
+        with self.metrics.timer('query_seconds', method='user', api='batch'):
+            self.ensure_models('collab')
+            rows = self.user_rows(user_ids)
+            positions = np.full((len(rows), top_n), -1, dtype=np.int64)
+            scores = np.full((len(rows), top_n), -np.inf, dtype=np.float32)
+            block_size = self.config['block_size']
+
+            for start in range(0, len(rows), block_size):
+                block_rows = rows[start:start + block_size]
+                users = np.asarray(self.svd.components_[:, block_rows].T, dtype=self.reduced_matrix.dtype)
+                block = dot_dense(users, self.reduced_matrix)
+                rated = self.user_book_matrix[block_rows]
+                block[np.repeat(np.arange(len(block_rows)), np.diff(rated.indptr)), rated.indices] = -np.inf
+                top = top_k_indices(block, top_n)
+                top_scores = np.take_along_axis(block, top, axis=1)
+                positions[start:start + len(block_rows), :top.shape[1]] = np.where(np.isfinite(top_scores), top, -1)
+                scores[start:start + len(block_rows), :top.shape[1]] = top_scores
+
+            ids = np.where(positions >= 0, self.book_ids[positions], -1).astype(np.int32)
+            if not hydrate:
+                return ids, scores
+
+            valid = ids.ravel() >= 0
+            result = self.catalog.to_frame(positions.ravel()[valid])
+            result.insert(0, 'user_id', np.repeat(np.asarray(user_ids), top_n)[valid])
+            result.insert(1, 'rank', np.tile(np.arange(1, top_n + 1), len(rows))[valid])
+            result.insert(2, 'score', scores.ravel()[valid])
+            return result
+
+    def search_index(self):
+        """Поисковый индекс названий и авторов (search.py); строится при первом обращении
+        и после изменения каталога, хранится рядом с каталогом"""
+        with self._search_lock:
+            if getattr(self, '_search_for', None) is not self.catalog:
+                with self.metrics.timer('search_index_seconds'):
+                    self._search = BookSearchIndex.for_catalog(self.catalog, self.models_path/"search")
+                self._search_for = self.catalog
+            return self._search
+
+    def search_books(self, query, limit=10, incremental=False):
+        """Книги по словам названия и автора с учетом опечаток; Recommendations с оценками совпадения.
+        incremental=True - последнее слово запроса еще набирается и ищется как префикс"""
+        with self.metrics.timer('query_seconds', method='search'):
+            return self.search_index().search(query, limit, incremental)
+
+    def find_book_id(self, title):
+        """book_id книги по названию (можно с автором и опечатками); KeyError, если не нашлась"""
+        row = self.search_index().resolve(title)
+        if row is None:
+            raise KeyError(f"Книга не найдена: {title!r}")
+        return int(self.book_ids[row])
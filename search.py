@@ -0,0 +1,319 @@
+"""Поиск книг по названию и автору: префиксы, опечатки, ранжирование.
+
+BookSearchIndex строится по колонкам title и author каталога:
+    словарь слов     отсортированный массив уникальных слов (строчные, ё -> е)
+    вхождения        CSR: для слова t - позиции книг postings_rows[indptr[t]:indptr[t+1]]
+                     и вес поля (название 1.0, автор AUTHOR_WEIGHT)
+    триграммы слов   CSR: для триграммы - слова, в которых она есть ('^ка', 'кам', 'мень', 'нь$')
+
+Слово запроса совпадает со словами словаря точно, по префиксу (последнее
+слово запроса, пока его набирают - диапазон отсортированного словаря,
+то есть один непрерывный срез вхождений) и с опечатками - по доле общих
+триграмм. Книги ранжируются по числу совпавших слов запроса, затем по сумме
+весов совпадений, затем по популярности.
+
+    index = BookSearchIndex.for_catalog(catalog, "models/search")
+    index.search("гарри потер", limit=10)   # Recommendations: позиции книг и оценки
+    index.resolve("Мастер и Маргарита")     # позиция лучшей книги или None
+
+Проверка на каталоге:
+    python search.py "мастер и маргарита" --books data/books.csv
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+
+from artifacts import ArtifactMismatchError, ArtifactStore
+from catalog import Recommendations, StringColumn
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Вес совпадения в поле автора относительно названия
+AUTHOR_WEIGHT = 0.8
+# Веса совпадения слова: точное - 1, по префиксу - от PREFIX_WEIGHT до 1
+# (чем большая часть слова набрана, тем выше), с опечаткой - FUZZY_WEIGHT x похожесть
+PREFIX_WEIGHT = 0.6
+FUZZY_WEIGHT = 0.8
+# Минимальная доля общих триграмм для совпадения с опечаткой и минимальная длина такого слова
+FUZZY_THRESHOLD = 0.5
+FUZZY_MIN_LENGTH = 3
+
+
+def normalize(text):
+    return str(text).lower().replace('ё', 'е')
+
+
+def tokenize(text):
+    """Слова строки в нижнем регистре"""
+    return TOKEN_RE.findall(normalize(text))
+
+
+def trigram_codes(words, prefix=False):
+    """Триграммы слов с границами '^слово$' как int64 (три кодовые точки по 21 бит).
+
+    Возвращает (номер слова, код) для каждой триграммы; при prefix=True
+    конец слова не помечается - так набранное начало слова делит триграммы
+    со всеми словами, которые с него начинаются.
+    """
+    padded = [f"^{word}" if prefix else f"^{word}$" for word in words]
+    lengths = np.array([len(word) for word in padded], dtype=np.int64)
+    points = np.frombuffer(''.join(padded).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    counts = np.maximum(lengths - 2, 0)
+    owner = np.repeat(np.arange(len(padded)), counts)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    at = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - starts, counts)
+    return owner, (points[at] << 42) | (points[at + 1] << 21) | points[at + 2]
+
+
+def csr_positions(indptr, rows):
+    """Позиции элементов строк rows CSR-массивов: (номер строки в rows, позиция)"""
+    starts = indptr[rows]
+    lengths = indptr[np.asarray(rows) + 1] - starts
+    owner = np.repeat(np.arange(len(lengths)), lengths)
+    return owner, np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+
+
+def group_csr(keys, values, n_keys):
+    """CSR (indptr, values) по ключам keys: значения, сгруппированные по ключу 0..n_keys-1"""
+    order = np.argsort(keys, kind='stable')
+    indptr = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_keys), out=indptr[1:])
+    return indptr, values[order]
+
+
+class BookSearchIndex:
+    def __init__(self, catalog, arrays):
+        self.catalog = catalog
+        self.arrays = arrays
+        vocabulary = StringColumn(arrays['vocabulary.offsets'], arrays['vocabulary.data'])
+        # Словарь - массив numpy строк: префиксы ищутся двоичным поиском (searchsorted)
+        self.vocabulary = np.array(list(vocabulary), dtype=str)
+        self.word_lengths = np.char.str_len(self.vocabulary)
+        self.postings_indptr = arrays['postings_indptr']
+        self.postings_rows = arrays['postings_rows']
+        self.postings_weights = arrays['postings_weights']
+        self.trigram_codes = arrays['trigram_codes']
+        self.trigram_indptr = arrays['trigram_indptr']
+        self.trigram_words = arrays['trigram_words']
+        self.word_trigrams = arrays['word_trigrams']
+        # Оценки законченных слов последнего запроса: (слова, matched, total)
+        self._done = ((), np.zeros(len(catalog), dtype=np.int32), np.zeros(len(catalog), dtype=np.float32))
+
+    @classmethod
+    def build(cls, catalog):
+        words = {}
+        word_ids, rows, weights = [], [], []
+
+        def add(text_tokens, row, weight):
+            for token in text_tokens:
+                word_ids.append(words.setdefault(token, len(words)))
+                rows.append(row)
+                weights.append(weight)
+
+        for row, title in enumerate(catalog['title']):
+            add(tokenize(title), row, 1.0)
+        # Авторы повторяются: каждое значение словаря разбирается на слова один раз
+        author = catalog['author']
+        author_tokens = [tokenize(value) for value in author.values()]
+        for row, code in enumerate(np.asarray(author.codes).tolist()):
+            add(author_tokens[code], row, AUTHOR_WEIGHT)
+
+        # Номера слов - по алфавиту, чтобы слова с общим префиксом шли подряд
+        unsorted = np.array(list(words), dtype=str)
+        order = np.argsort(unsorted, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        vocabulary = unsorted[order]
+
+        # Вхождения: по (слово, книга), из повторов остается больший вес
+        word_ids = rank[np.asarray(word_ids, dtype=np.int64)]
+        rows = np.asarray(rows, dtype=np.int32)
+        weights = np.asarray(weights, dtype=np.float32)
+        order = np.lexsort((-weights, rows, word_ids))
+        word_ids, rows, weights = word_ids[order], rows[order], weights[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (word_ids[1:] != word_ids[:-1]) | (rows[1:] != rows[:-1])
+        word_ids, rows, weights = word_ids[first], rows[first], weights[first]
+        postings_indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(word_ids, minlength=len(vocabulary)), out=postings_indptr[1:])
+
+        # Триграммы слов: одна запись на (триграмма, слово)
+        owner, codes = trigram_codes(vocabulary.tolist())
+        pairs = np.unique(np.stack([codes, owner]), axis=1)
+        unique_codes, code_ids = np.unique(pairs[0], return_inverse=True)
+        trigram_indptr, trigram_words = group_csr(code_ids, pairs[1].astype(np.int32), len(unique_codes))
+
+        return cls(catalog, {**StringColumn.from_strings(vocabulary.tolist()).arrays('vocabulary'),
+                             'postings_indptr': postings_indptr, 'postings_rows': rows,
+                             'postings_weights': weights, 'trigram_codes': unique_codes,
+                             'trigram_indptr': trigram_indptr, 'trigram_words': trigram_words,
+                             'word_trigrams': np.bincount(pairs[1], minlength=len(vocabulary)).astype(np.int32)})
+
+    @classmethod
+    def for_catalog(cls, catalog, root):
+        """Индекс каталога из root (через mmap); строится и сохраняется, если его там нет"""
+        store = ArtifactStore(root)
+        digest = catalog.digest(('title', 'author'))
+        try:
+            manifest = store.check(digest)
+        except (FileNotFoundError, ArtifactMismatchError):
+            store.save(digest, cls.build(catalog).arrays)
+            manifest = store.check(digest)
+        # ndarray над отображением: индексация np.memmap идет через Python-обертку
+        return cls(catalog, {name: np.asarray(store.array(manifest, name)) for name in manifest['arrays']})
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def match_word(self, word, prefix=False):
+        """Слова словаря, подходящие к слову запроса: (номера слов, веса совпадения)"""
+        found, weights = [], []
+        start = np.searchsorted(self.vocabulary, word)
+        if prefix:
+            stop = np.searchsorted(self.vocabulary, word + '\U0010ffff')
+            candidates = np.arange(start, stop)
+            found.append(candidates)
+            weights.append(PREFIX_WEIGHT + (1 - PREFIX_WEIGHT) * len(word) / self.word_lengths[candidates])
+        elif start < len(self.vocabulary) and self.vocabulary[start] == word:
+            found.append(np.array([start]))
+            weights.append(np.ones(1))
+
+        if len(word) >= FUZZY_MIN_LENGTH:
+            _, codes = trigram_codes([word], prefix)
+            codes = np.unique(codes)
+            at = np.searchsorted(self.trigram_codes, codes)
+            known = at < len(self.trigram_codes)
+            known[known] = self.trigram_codes[at[known]] == codes[known]
+            _, positions = csr_positions(self.trigram_indptr, at[known])
+            candidates, shared = np.unique(self.trigram_words[positions], return_counts=True)
+            if prefix:
+                # Набранное начало слова: доля его триграмм, найденных в слове словаря
+                similarity = shared / len(codes)
+            else:
+                similarity = 2 * shared / (len(codes) + self.word_trigrams[candidates])
+            close = similarity >= FUZZY_THRESHOLD
+            found.append(candidates[close])
+            weights.append(FUZZY_WEIGHT * similarity[close])
+
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        found, weights = np.concatenate(found), np.concatenate(weights)
+        # Слово, найденное и по префиксу, и по триграммам, - с лучшим весом
+        order = np.lexsort((-weights, found))
+        found, weights = found[order], weights[order]
+        first = np.ones(len(found), dtype=bool)
+        first[1:] = found[1:] != found[:-1]
+        return found[first], weights[first]
+
+    def word_scores(self, word, prefix=False):
+        """Лучший вес совпадения слова запроса в каждой книге (0 - не совпало)"""
+        best = np.zeros(len(self.catalog), dtype=np.float32)
+        found, weights = self.match_word(word, prefix)
+        if len(found):
+            owner, positions = csr_positions(self.postings_indptr, found)
+            np.maximum.at(best, self.postings_rows[positions],
+                          self.postings_weights[positions] * weights[owner].astype(np.float32))
+        return best
+
+    def scores(self, query, incremental=True):
+        """Для всех книг: (число совпавших слов запроса, сумма весов совпадений).
+
+        incremental=True - запрос набирается: последнее слово, если после него
+        нет пробела, ищется и как префикс. Оценки уже законченных слов
+        запоминаются, поэтому при наборе по буквам пересчитывается только
+        последнее слово.
+        """
+        words = tokenize(query)
+        typing = incremental and bool(words) and not query[-1:].isspace()
+        done = tuple(words[:-1] if typing else words)
+
+        # Продолжаем с запомненных оценок, если запрос начинается с тех же законченных слов
+        known, matched, total = self._done
+        if done[:len(known)] != known:
+            known = ()
+            matched = np.zeros(len(self.catalog), dtype=np.int32)
+            total = np.zeros(len(self.catalog), dtype=np.float32)
+        for word in done[len(known):]:
+            best = self.word_scores(word)
+            matched, total = matched + (best > 0), total + best
+        self._done = (done, matched, total)
+
+        if typing:
+            best = self.word_scores(words[-1], prefix=True)
+            matched, total = matched + (best > 0), total + best
+        return matched, total
+
+    def search(self, query, limit=10, incremental=True):
+        """До limit лучших книг как Recommendations (оценка - сумма весов совпадений)"""
+        matched, total = self.scores(query, incremental)
+        candidates = np.flatnonzero(matched)
+        # Сначала больше совпавших слов (вес слова не больше 1, поэтому сумма весов
+        # меньше len(words) + 1), затем больший вес, затем популярность
+        key = matched[candidates] * (len(tokenize(query)) + 1.0) + total[candidates]
+        if len(candidates) > limit:
+            # Отбор без полной сортировки: все книги выше порога limit-й оценки
+            # и самые популярные из книг ровно с этой оценкой
+            threshold = np.partition(key, len(key) - limit)[len(key) - limit]
+            above, tied = np.flatnonzero(key > threshold), np.flatnonzero(key == threshold)
+            popularity = np.asarray(self.catalog.popularity)[candidates[tied]]
+            tied = tied[np.argpartition(-popularity, limit - len(above) - 1)[:limit - len(above)]]
+            keep = np.concatenate([above, tied])
+            candidates, key = candidates[keep], key[keep]
+        order = np.lexsort((-np.asarray(self.catalog.popularity)[candidates], -key))
+        return Recommendations(self.catalog, candidates[order], total[candidates[order]])
+
+    def resolve(self, query):
+        """Позиция книги, лучше всех подходящей к названию (и автору) query, или None.
+
+        Все слова запроса должны совпасть (в том числе с опечаткой); при равных
+        оценках выбирается книга, название которой совпадает с запросом целиком.
+        """
+        words = tokenize(query)
+        if not words:
+            return None
+        matched, total = self.scores(query, incremental=False)
+        candidates = np.flatnonzero(matched == len(words))
+        if not len(candidates):
+            return None
+        best = candidates[total[candidates] == total[candidates].max()]
+        exact = [row for row, title in zip(best.tolist(), self.catalog.values('title', best))
+                 if tokenize(title) == words]
+        best = np.asarray(exact or best.tolist())
+        return int(best[np.argmax(np.asarray(self.catalog.popularity)[best])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск книг по названию и автору")
+    parser.add_argument('query', nargs='+', help="запрос: слова названия и/или автора")
+    parser.add_argument('--books', default=None, help="CSV/Parquet каталога (по умолчанию встроенный набор)")
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+    query = ' '.join(args.query)
+
+    from catalog import BookCatalog
+    if args.books:
+        from loaders import load_books
+        catalog = BookCatalog.from_frame(load_books(args.books))
+    else:
+        from recommender import AdvancedBookRecommender
+        catalog = AdvancedBookRecommender().catalog
+
+    started = time.perf_counter()
+    index = BookSearchIndex.build(catalog)
+    print(f"Индекс: {len(catalog)} книг, {len(index)} слов, {index.nbytes / 2**20:.1f} МБ, "
+          f"{time.perf_counter() - started:.2f} с")
+    started = time.perf_counter()
+    results = index.search(query, args.limit)
+    print(f"Запрос {query!r}: {(time.perf_counter() - started) * 1000:.2f} мс")
+    for record in results.records(('book_id', 'title', 'author')):
+        print(f"{record['score']:6.3f}  {record['book_id']:>8}  {record['title']} - {record['author']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""HTTP-сервис рекомендаций без PyQt (только стандартная библиотека).
+
+    GET /recommendations?book_id=1&method=hybrid&top_n=5
+    GET /recommendations?book_id=1&weights=0.8,0.2&popularity_weight=0.1
+                                     - веса гибрида только для этого запроса
+    GET /recommendations?title=мастер и маргарита   - книга по названию вместо book_id
+    GET /recommendations/knn?book_id=1&top_n=5
+    GET /recommendations/diverse?book_id=1&top_n=5
+    GET /books?offset=0&limit=1000   - book_id каталога (для генератора нагрузки), limit до MAX_BOOKS_PAGE
+    GET /search?q=гарри потер&limit=10 - поиск книг по названию и автору (search.py)
+    GET /health
+    GET /metrics                     - метрики в текстовом формате Prometheus
+
+Запросы из потоков обработчиков складываются в очередь MicroBatcher:
+все, что пришло за окно window_ms, группируется по (method, top_n, веса) и
+считается одним вызовом get_recommendations_batch. С моделями работает
+только поток батчера, поэтому рекомендатель не нужно делать потокобезопасным.
+
+Запуск: python server.py --port 8000 [--books data/books.csv --ratings data/ratings.csv]
+"""
+import argparse
+import json
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from metrics import Metrics, MetricsRegistry
+from recommender import AdvancedBookRecommender, METHOD_PARTS
+
+BOOK_FIELDS = ('book_id', 'title', 'author', 'genre', 'popularity')
+MAX_TOP_N = 100
+MAX_BOOKS_PAGE = 10000
+
+
+def int_param(params, name, default=None, low=None, high=None):
+    """Целый параметр запроса в [low, high]; ValueError с текстом для клиента (ответ 400)"""
+    if name not in params:
+        if default is None:
+            raise ValueError(f"не указан {name}")
+        return default
+    try:
+        value = int(params[name])
+    except ValueError:
+        raise ValueError(f"{name} должен быть целым числом, получено {params[name]!r}") from None
+    if (low is not None and value < low) or (high is not None and value > high):
+        bounds = f"от {low} до {high}" if high is not None else f"не меньше {low}"
+        raise ValueError(f"{name} должен быть {bounds}")
+    return value
+
+
+def weight_param(value, name):
+    """Вес гибрида: конечное неотрицательное число"""
+    try:
+        weight = float(value)
+    except ValueError:
+        raise ValueError(f"{name} должен быть числом, получено {value!r}") from None
+    if not math.isfinite(weight) or weight < 0:
+        raise ValueError(f"{name} должен быть конечным неотрицательным числом, получено {value!r}")
+    return weight
+
+
+class MicroBatcher:
+    """Собирает одновременные запросы в пакеты и выполняет их в одном потоке"""
+
+    def __init__(self, recommender, window_ms=2.0, max_batch=256):
+        self.recommender = recommender
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.stats = {'requests': 0, 'batches': 0, 'scoring_calls': 0}
+        self.thread = threading.Thread(target=self.run, name="micro-batcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def submit(self, book_id, method, top_n, weights=None, popularity_weight=None):
+        future = Future()
+        self.queue.put((book_id, method, top_n, (weights, popularity_weight), future))
+        return future
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.process(batch)
+                    return
+                batch.append(item)
+            self.process(batch)
+
+    def process(self, batch):
+        self.stats['requests'] += len(batch)
+        self.stats['batches'] += 1
+        metrics = self.recommender.metrics
+        metrics.increment('batcher_requests_total', len(batch))
+        metrics.increment('batcher_batches_total')
+        groups = {}
+        for book_id, method, top_n, blend, future in batch:
+            groups.setdefault((method, top_n, blend), []).append((book_id, future))
+
+        for (method, top_n, (weights, popularity_weight)), requests in groups.items():
+            try:
+                query_ids = np.unique([book_id for book_id, _ in requests])
+                self.stats['scoring_calls'] += 1
+                ids, scores = self.recommender.get_recommendations_batch(
+                    query_ids, method, top_n, weights=weights, popularity_weight=popularity_weight)
+                # Поля книг читаются из каталога одним вызовом на весь пакет
+                found = ids >= 0
+                records = self.hydrate(self.recommender.book_rows(ids[found]), scores[found])
+                ends = np.cumsum(found.sum(axis=1)).tolist()
+                results = {book_id: records[end - count:end] for book_id, end, count
+                           in zip(query_ids.tolist(), ends, found.sum(axis=1).tolist())}
+                for book_id, future in requests:
+                    future.set_result(results[book_id])
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def hydrate(self, rows, scores):
+        records = self.recommender.catalog.records(rows, BOOK_FIELDS)
+        for record, score in zip(records, scores.tolist()):
+            record['score'] = round(score, 6)
+        return records
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive для генератора нагрузки
+    disable_nagle_algorithm = True  # заголовки и тело уходят разными write, без этого +40 мс на ответ
+    routes = {
+        '/recommendations': None,        # метод берется из параметра method
+        '/recommendations/knn': 'knn',
+        '/recommendations/diverse': 'diverse',
+    }
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == '/health':
+                self.send_json(200, {'status': 'ok', 'books': len(self.server.recommender.catalog),
+                                     **self.server.batcher.stats})
+            elif url.path == '/metrics':
+                self.send_metrics()
+            elif url.path == '/books':
+                offset = int_param(params, 'offset', 0, low=0)
+                limit = int_param(params, 'limit', 1000, low=1, high=MAX_BOOKS_PAGE)
+                ids = self.server.recommender.book_ids[offset:offset + limit]
+                self.send_json(200, {'book_ids': ids.tolist(), 'total': len(self.server.recommender.book_ids)})
+            elif url.path == '/search':
+                self.search(params)
+            elif url.path in self.routes:
+                self.recommend(self.routes[url.path] or params.get('method', 'hybrid'), params)
+            else:
+                self.send_json(404, {'error': f"неизвестный путь {url.path}"})
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+
+    def recommend(self, method, params):
+        if method not in METHOD_PARTS:
+            raise ValueError(f"неизвестный метод {method!r}, доступны: {sorted(METHOD_PARTS)}")
+        if 'book_id' not in params and 'title' not in params:
+            raise ValueError("не указан book_id или title")
+        if 'book_id' in params:
+            book_id = int_param(params, 'book_id')
+        else:
+            try:
+                book_id = self.server.recommender.find_book_id(params['title'])
+            except KeyError:
+                self.send_json(404, {'error': f"книга {params['title']!r} не найдена"})
+                return
+        top_n = int_param(params, 'top_n', 5, low=1, high=MAX_TOP_N)
+        weights = None
+        if 'weights' in params:
+            weights = params['weights'].split(',')
+            if len(weights) != 2:
+                raise ValueError("weights - два числа через запятую: вес content и вес collab")
+            weights = tuple(weight_param(value, 'weights') for value in weights)
+        popularity_weight = (weight_param(params['popularity_weight'], 'popularity_weight')
+                             if 'popularity_weight' in params else None)
+        if self.server.recommender.book_index.get_indexer([book_id])[0] < 0:
+            self.send_json(404, {'error': f"книга {book_id} не найдена"})
+            return
+
+        future = self.server.batcher.submit(book_id, method, top_n, weights, popularity_weight)
+        try:
+            recommendations = future.result(timeout=self.server.request_timeout)
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+            return
+        self.send_json(200, {'book_id': book_id, 'method': method, 'top_n': top_n,
+                             'recommendations': recommendations})
+
+    def search(self, params):
+        query = params.get('q', '')
+        limit = int_param(params, 'limit', 10, low=1, high=MAX_TOP_N)
+        # Индекс только читается, поэтому поиск идет в потоке обработчика, без батчера
+        results = self.server.recommender.search_books(query, limit)
+        records = results.records(BOOK_FIELDS)
+        for record in records:
+            record['score'] = round(record['score'], 6)
+        self.send_json(200, {'query': query, 'results': records})
+
+    def send_metrics(self):
+        registry = self.server.registry
+        if registry is None:
+            self.send_json(404, {'error': "метрики выключены"})
+            return
+        self.server.recommender.metrics.collect()
+        body = registry.prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class RecommendationServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128   # при очереди по умолчанию (5) одновременные подключения ждут повтора SYN
+
+    def __init__(self, address, recommender, window_ms=2.0, max_batch=256, request_timeout=30, verbose=False,
+                 registry=None):
+        super().__init__(address, RecommendationHandler)
+        self.recommender = recommender
+        self.registry = registry
+        self.batcher = MicroBatcher(recommender, window_ms, max_batch).start()
+        self.request_timeout = request_timeout
+        self.verbose = verbose
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-сервис рекомендаций с пакетной обработкой запросов")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--books', default=None, help="CSV/Parquet каталога (по умолчанию встроенный набор)")
+    parser.add_argument('--ratings', default=None)
+    parser.add_argument('--window-ms', type=float, default=2.0, help="сколько ждать попутные запросы в пакет")
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--verbose', action='store_true', help="писать в лог каждый запрос")
+    parser.add_argument('--no-metrics', action='store_true', help="не собирать метрики для /metrics")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    registry = None if args.no_metrics else MetricsRegistry()
+    metrics = Metrics(registry) if registry is not None else Metrics()
+    recommender = AdvancedBookRecommender(config={'books_path': args.books, 'ratings_path': args.ratings},
+                                          metrics=metrics)
+    recommender.ensure_models()
+    recommender.search_index()
+    server = RecommendationServer((args.host, args.port), recommender, args.window_ms, args.max_batch,
+                                  verbose=args.verbose, registry=registry)
+    print(f"Сервис рекомендаций слушает http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def top_k_indices(scores, k):
+    """Индексы k лучших значений в каждой строке, по убыванию (argpartition + сортировка только k)"""
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1)
+
+
+class TopKSimilarityIndex:
+    """Разреженный индекс похожести: для каждой книги хранятся только K ближайших соседей.
+
+    Соседи лежат в CSR-подобных массивах: соседи строки i - это
+    indices[indptr[i]:indptr[i+1]] с оценками scores[indptr[i]:indptr[i+1]],
+    отсортированные по убыванию оценки. Сама книга в свой список не попадает.
+    Оценка -inf означает пустое место (у книги меньше K допустимых соседей).
+    """
+
+    def __init__(self, indptr, indices, scores, k):
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.k = k
+
+    @classmethod
+    def build(cls, score_block, n_items, k=50, block_size=1024, workers=1):
+        """Строит индекс по блокам строк.
+
+        score_block(rows) должна возвращать плотную матрицу похожести
+        len(rows) x n_items, поэтому в памяти одновременно находится только
+        workers x block_size x n_items значений, а не вся матрица N x N.
+        Блоки пишут в непересекающиеся срезы, поэтому при workers > 1
+        они считаются в пуле потоков.
+        """
+        k = max(0, min(k, n_items - 1))
+        indptr = np.arange(n_items + 1, dtype=np.int64) * k
+        indices = np.empty(n_items * k, dtype=np.int32)
+        scores = np.empty(n_items * k, dtype=np.float32)
+
+        def fill(start):
+            stop = min(start + block_size, n_items)
+            rows = np.arange(start, stop)
+            block = np.asarray(score_block(rows), dtype=np.float64)
+            # Исключаем саму книгу из списка соседей
+            block[rows - start, rows] = -np.inf
+            top = top_k_indices(block, k)
+            indices[start*k:stop*k] = top.ravel()
+            scores[start*k:stop*k] = np.take_along_axis(block, top, axis=1).ravel()
+
+        starts = range(0, n_items, block_size)
+        if workers > 1 and len(starts) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(starts))) as pool:
+                list(pool.map(fill, starts))
+        else:
+            for start in starts:
+                fill(start)
+
+        return cls(indptr, indices, scores, k)
+
+    @classmethod
+    def build_grouped(cls, score_block, group_indptr, group_members, k=50, block_size=1024, workers=1):
+        """Индекс, в котором соседи книги ищутся только внутри ее группы (кластера).
+
+        Члены группы g - group_members[group_indptr[g]:group_indptr[g+1]];
+        score_block(rows, cols) - плотная матрица похожести len(rows) x len(cols).
+        Считаются только блоки внутри групп, поэтому стоимость - сумма квадратов
+        размеров групп, а не N x N. Если в группе меньше k + 1 книг, хвост
+        списка заполняется индексом -1 с оценкой -inf.
+        """
+        n_items = len(group_members)
+        k = max(0, min(k, n_items - 1))
+        indptr = np.arange(n_items + 1, dtype=np.int64) * k
+        indices = np.full(n_items * k, -1, dtype=np.int32)
+        scores = np.full(n_items * k, -np.inf, dtype=np.float32)
+
+        def fill(task):
+            members, start = task
+            rows = members[start:start + block_size]
+            block = np.asarray(score_block(rows, members), dtype=np.float64)
+            block[np.arange(len(rows)), start + np.arange(len(rows))] = -np.inf
+            top = top_k_indices(block, k)
+            top_scores = np.take_along_axis(block, top, axis=1)
+            offsets = rows[:, None] * k + np.arange(top.shape[1])
+            indices[offsets] = np.where(np.isfinite(top_scores), members[top], -1)
+            scores[offsets] = top_scores
+
+        groups = [group_members[group_indptr[g]:group_indptr[g + 1]] for g in range(len(group_indptr) - 1)]
+        tasks = [(members, start) for members in groups for start in range(0, len(members), block_size)]
+        if workers > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                list(pool.map(fill, tasks))
+        else:
+            for task in tasks:
+                fill(task)
+
+        return cls(indptr, indices, scores, k)
+
+    def updated(self, score_block, changed, n_items, block_size=1024):
+        """Новый индекс после изменения векторов строк changed и добавления строк в конец.
+
+        score_block(rows, cols) - похожести rows со столбцами cols (cols=None - со всеми).
+        Строки changed пересчитываются целиком; у остальных строк к старому списку
+        добавляются новые оценки измененных книг, так что каждая строка стоит
+        O(k + len(changed)), а не O(n_items). Если измененная книга уже была в
+        списке строки, ее место может занять книга не из списка, поэтому такие
+        строки тоже пересчитываются целиком.
+        """
+        n_old = len(self)
+        changed = np.union1d(np.asarray(changed, dtype=np.int64), np.arange(n_old, n_items))
+        is_changed = np.zeros(n_items, dtype=bool)
+        is_changed[changed] = True
+        k = self.k
+        old_indices = np.asarray(self.indices).reshape(n_old, k)
+        lost = ((old_indices >= 0) & is_changed[old_indices]).any(axis=1)
+        recompute = np.union1d(changed, np.flatnonzero(lost))
+
+        indptr = np.arange(n_items + 1, dtype=np.int64) * k
+        indices = np.empty(n_items * k, dtype=np.int32)
+        scores = np.empty(n_items * k, dtype=np.float32)
+
+        def write(rows, block, candidates):
+            top = top_k_indices(block, k)
+            offsets = rows[:, None] * k + np.arange(k)
+            indices[offsets] = np.take_along_axis(candidates, top, axis=1)
+            scores[offsets] = np.take_along_axis(block, top, axis=1)
+
+        merged = np.setdiff1d(np.arange(n_old), recompute)
+        for start in range(0, len(merged), block_size):
+            rows = merged[start:start + block_size]
+            old_indices, old_scores = self.neighbors_batch(rows, self.k)
+            fresh = np.asarray(score_block(rows, changed), dtype=np.float64)
+            fresh[rows[:, None] == changed[None, :]] = -np.inf
+            candidates = np.hstack([old_indices, np.broadcast_to(changed, (len(rows), len(changed)))])
+            write(rows, np.hstack([old_scores, fresh]), candidates)
+
+        # Измененные, новые и потерявшие соседа строки считаем полностью
+        for start in range(0, len(recompute), block_size):
+            rows = recompute[start:start + block_size]
+            block = np.asarray(score_block(rows), dtype=np.float64)
+            block[np.arange(len(rows)), rows] = -np.inf
+            write(rows, block, np.broadcast_to(np.arange(n_items), block.shape))
+
+        return TopKSimilarityIndex(indptr, indices, scores, k)
+
+    @classmethod
+    def from_arrays(cls, indptr, indices, scores):
+        k = int(indptr[1] - indptr[0]) if len(indptr) > 1 else 0
+        return cls(indptr, indices, scores, k)
+
+    def arrays(self):
+        return {'indptr': self.indptr, 'indices': self.indices, 'scores': self.scores}
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.scores.nbytes
+
+    def neighbors_batch(self, rows, top_n):
+        """Соседи сразу для многих строк: массивы len(rows) x top_n (top_n <= k)"""
+        offsets = self.indptr[np.asarray(rows)][:, None] + np.arange(min(top_n, self.k))
+        return self.indices[offsets], self.scores[offsets]
+
+    def neighbors(self, row, top_n=None):
+        start, stop = self.indptr[row], self.indptr[row + 1]
+        if top_n is not None:
+            stop = min(stop, start + top_n)
+        return self.indices[start:stop], self.scores[start:stop]
@@ -0,0 +1,81 @@
+import sys
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+import ann
+from ann import ExactIndex, IVFIndex, make_ann_index, _synthetic_vectors
+
+N_ITEMS, N_LISTS, K = 3000, 55, 10
+
+
+@pytest.fixture(scope='module')
+def vectors():
+    return _synthetic_vectors(N_ITEMS, 10)
+
+
+def recall(found, expected):
+    return np.mean([len(np.intersect1d(a, b)) / expected.shape[1] for a, b in zip(found, expected)])
+
+
+def test_exact_matches_brute_force(vectors):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    indices, scores = ExactIndex(block_size=64).fit(vectors).search(vectors[:100], K)
+    expected = -np.sort(-(unit[:100] @ unit.T), axis=1)[:, :K]
+    np.testing.assert_allclose(scores, expected, atol=1e-9)
+    assert (indices[:, 0] == np.arange(100)).all()
+
+
+def test_exact_pads_small_catalog():
+    indices, scores = ExactIndex().fit(np.eye(3)).search(np.eye(3)[:1], 5)
+    assert indices[0, 3:].tolist() == [-1, -1] and np.isneginf(scores[0, 3:]).all()
+
+
+def test_exact_sparse_vectors():
+    matrix = sparse.random(50, 30, density=0.2, format='csr', random_state=0)
+    dense = matrix.toarray()
+    found, _ = ExactIndex().fit(matrix).search(matrix[:5], K)
+    expected, _ = ExactIndex().fit(dense).search(dense[:5], K)
+    assert np.array_equal(found, expected)
+
+
+def test_ivf_recall(vectors):
+    queries = vectors[:200]
+    expected, _ = ExactIndex().fit(vectors).search(queries, K)
+    ivf = IVFIndex(n_lists=N_LISTS).fit(vectors)
+    # На кластеризованных данных 8 из 55 списков находят почти всех соседей (около 0.99)
+    assert recall(ivf.search(queries, K, n_probe=8)[0], expected) >= 0.95
+    assert recall(ivf.search(queries, K, n_probe=1)[0], expected) < 0.95
+    # Все списки - точный перебор
+    assert recall(ivf.search(queries, K, n_probe=N_LISTS)[0], expected) == 1.0
+
+
+def test_ivf_restore_and_update(vectors):
+    ivf = IVFIndex(n_lists=N_LISTS).fit(vectors[:-100])
+    restored = IVFIndex().restore(ivf.vectors, ivf.arrays())
+    assert np.array_equal(restored.search(vectors[:20], K)[0], ivf.search(vectors[:20], K)[0])
+
+    # Добавленные в конец векторы попадают в списки и находятся сами по себе
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    ivf.update(unit, np.arange(N_ITEMS - 100, N_ITEMS))
+    assert ivf.list_indptr[-1] == N_ITEMS
+    found, _ = ivf.search(vectors[-100:], 1)
+    assert (found[:, 0] == np.arange(N_ITEMS - 100, N_ITEMS)).all()
+
+
+def test_unknown_backend():
+    assert isinstance(make_ann_index('ivf', n_lists=4), IVFIndex)
+    with pytest.raises(ValueError):
+        make_ann_index('hnsw')
+
+
+def test_report_on_saved_models(tmp_path, monkeypatch, capsys):
+    # Первый запуск обучает модели на встроенном каталоге, второй читает их из артефактов
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['ann.py', '--queries', '5'])
+    for _ in range(2):
+        ann.main()
+        lines = capsys.readouterr().out.splitlines()
+        assert {line.split()[0] for line in lines[1:]} == {'collab', 'content'}
+    assert (tmp_path / "models").is_dir()
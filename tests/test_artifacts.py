@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from artifacts import CURRENT_FILE, ArtifactMismatchError, ArtifactStore
+
+
+def test_save_and_load(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts")
+    matrix = sparse.random(5, 4, density=0.5, format='csr', random_state=0)
+    store.save('a' * 64, {'dense': np.arange(6), 'matrix': matrix}, objects={'model': {'k': 1}}, meta={'x': 2})
+
+    arrays, objects, meta = store.load('a' * 64)
+    assert np.array_equal(arrays['dense'], np.arange(6))
+    assert (arrays['matrix'] != matrix).nnz == 0
+    assert objects == {'model': {'k': 1}}
+    assert meta == {'x': 2}
+
+
+def test_missing_and_foreign_artifacts(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts")
+    with pytest.raises(FileNotFoundError):
+        store.check('a' * 64)
+    store.save('a' * 64, {'dense': np.arange(3)})
+    with pytest.raises(ArtifactMismatchError):
+        store.check('b' * 64)
+
+
+def test_save_keeps_open_mmaps_valid(tmp_path):
+    """Новая версия пишется рядом, а не на место файлов, открытых прежней загрузкой"""
+    store = ArtifactStore(tmp_path / "artifacts")
+    store.save('a' * 64, {'dense': np.arange(5)})
+    old_manifest = store.check('a' * 64)
+    opened = store.array(old_manifest, 'dense')
+
+    store.save('b' * 64, {'dense': np.arange(5) * 10})
+
+    assert np.array_equal(opened, np.arange(5))
+    assert np.array_equal(store.array(store.check('b' * 64), 'dense'), np.arange(5) * 10)
+
+
+def test_save_keeps_previous_versions(tmp_path):
+    """Процесс на прежней версии дочитывает ее части после переключения CURRENT"""
+    store = ArtifactStore(tmp_path / "artifacts", keep=2, stale_seconds=0)
+    store.save('a' * 64, {'dense': np.arange(5)})
+    old_manifest = store.check('a' * 64)
+
+    store.save('b' * 64, {'dense': np.arange(5) * 10})
+    # Прежняя версия еще на диске: ленивая загрузка по старому манифесту работает
+    assert np.array_equal(store.array(old_manifest, 'dense'), np.arange(5))
+
+    store.save('c' * 64, {'dense': np.arange(5) * 100})
+    versions = sorted(path.name for path in store.root.iterdir() if path.name != CURRENT_FILE)
+    assert len(versions) == 2 and old_manifest['version'] not in versions
+    with pytest.raises(FileNotFoundError):
+        store.array(old_manifest, 'dense')
+
+
+def test_unfinished_saves_survive(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts", keep=1, stale_seconds=3600)
+    # Папка версии, которую сейчас пишет другой процесс
+    (store.root / "f00-1234.tmp").mkdir(parents=True)
+    for fingerprint in ('a', 'b'):
+        store.save(fingerprint * 64, {'dense': np.arange(3)})
+    names = {path.name for path in store.root.iterdir()}
+    assert names == {CURRENT_FILE, store.current(), "f00-1234.tmp"}
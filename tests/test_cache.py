@@ -0,0 +1,68 @@
+import numpy as np
+
+from cache import ResultCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_order():
+    cache = ResultCache(max_entries=2)
+    cache.put(('a',), 5, np.arange(5))
+    cache.put(('b',), 5, np.arange(5))
+    assert cache.get(('a',), 5) is not None   # 'a' становится самой свежей
+    cache.put(('c',), 5, np.arange(5))
+    assert cache.get(('b',), 5) is None
+    assert cache.get(('a',), 5) is not None and cache.get(('c',), 5) is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_memory_limit():
+    cache = ResultCache(max_bytes=100)
+    cache.put(('big',), 20, np.zeros(20))     # 160 байт - больше лимита, не кэшируется
+    assert cache.get(('big',), 20) is None
+    for key in range(3):
+        cache.put((key,), 5, np.zeros(5))     # по 40 байт: третья запись вытесняет первую
+    assert cache.stats()['bytes'] == 80
+    assert cache.get((0,), 5) is None and cache.get((2,), 5) is not None
+
+
+def test_ttl():
+    clock = FakeClock()
+    cache = ResultCache(ttl=10, clock=clock)
+    cache.put(('a',), 5, np.arange(5))
+    clock.now = 9.9
+    assert cache.get(('a',), 5) is not None
+    clock.now = 10
+    assert cache.get(('a',), 5) is None
+    stats = cache.stats()
+    assert stats['expirations'] == 1 and stats['entries'] == 0 and stats['bytes'] == 0
+
+
+def test_version_invalidation():
+    cache = ResultCache()
+    cache.set_version('v1')
+    cache.put(('a',), 5, np.arange(5))
+    cache.set_version('v1')
+    assert cache.get(('a',), 5) is not None
+    cache.set_version('v2')
+    assert cache.get(('a',), 5) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_prefix_results():
+    cache = ResultCache()
+    cache.put(('a',), 10, np.arange(10))
+    assert cache.get(('a',), 3).tolist() == [0, 1, 2]
+    assert cache.get(('a',), 20) is None
+    # Более короткий результат не заменяет длинный
+    cache.put(('a',), 5, np.arange(5))
+    assert len(cache.get(('a',), 10)) == 10
+    # Непрефиксный результат (diverse) подходит только для того же top_n
+    cache.put(('b',), 10, np.arange(10), prefix=False)
+    assert cache.get(('b',), 3) is None and cache.get(('b',), 10) is not None
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog import BookCatalog, Recommendations
+
+
+@pytest.fixture
+def books():
+    return pd.DataFrame({
+        'book_id': [10, 20, 30, 40],
+        'title': ["Мастер и Маргарита", "Дюна", "Ёжик в тумане", ""],
+        'author': ["Булгаков", "Герберт", "Козлов", "Булгаков"],
+        'genre': ["Роман", "Фантастика", "Сказка", "Роман"],
+        'description': ["дьявол в Москве", "пустыня", "туман", "пьеса"],
+        'popularity': [9.2, 8.5, 7.0, 6.1],
+    })
+
+
+def test_records(books):
+    catalog = BookCatalog.from_frame(books)
+    records = catalog.records([2, 0], ('book_id', 'title', 'author', 'popularity'))
+    assert records == [{'book_id': 30, 'title': "Ёжик в тумане", 'author': "Козлов", 'popularity': 7.0},
+                       {'book_id': 10, 'title': "Мастер и Маргарита", 'author': "Булгаков", 'popularity': 9.2}]
+    assert catalog.records([3])[0]['title'] == ""
+    assert catalog.to_frame().equals(books)
+
+
+def test_persisted_catalog(books, tmp_path):
+    catalog = BookCatalog.from_frame(books).persist(tmp_path / "catalog")
+    assert catalog.records([1]) == BookCatalog.from_frame(books).records([1])
+    # Повторный persist того же каталога читает уже сохраненные массивы
+    again = BookCatalog.from_frame(books).persist(tmp_path / "catalog")
+    assert again.digest() == catalog.digest()
+
+
+def test_append_keeps_codes(books):
+    catalog = BookCatalog.from_frame(books.iloc[:2])
+    extended = catalog.append(books.iloc[2:])
+    assert extended.records(np.arange(4)) == BookCatalog.from_frame(books).records(np.arange(4))
+    assert extended.digest() == BookCatalog.from_frame(books).digest()
+
+
+def test_recommendations_slicing(books):
+    catalog = BookCatalog.from_frame(books)
+    result = Recommendations(catalog, [3, 1, 0], [0.9, 0.5, 0.1])
+    assert len(result) == 3 and not result.empty
+    assert result.book_ids.tolist() == [40, 20, 10]
+
+    head = result[:2]
+    assert isinstance(head, Recommendations)
+    assert head.book_ids.tolist() == [40, 20]
+    assert head.scores.tolist() == pytest.approx([0.9, 0.5])
+    assert result[1] == {**catalog.records([1])[0], 'score': pytest.approx(0.5)}
+    assert [record['book_id'] for record in result] == [40, 20, 10]
+    assert result.to_frame(('book_id',))['score'].tolist() == pytest.approx([0.9, 0.5, 0.1])
+    assert result[5:].empty
+
+
+def test_recommendations_without_scores(books):
+    result = Recommendations(BookCatalog.from_frame(books), [0])
+    assert 'score' not in result[0] and result.nbytes == 8
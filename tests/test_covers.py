@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtCore = pytest.importorskip('PyQt5.QtCore')
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QSize
+from PyQt5.QtGui import QColor, QImage
+from PyQt5.QtWidgets import QApplication
+
+from covers import CoverService
+
+SIZE = QSize(30, 45)
+
+
+def png_bytes():
+    image = QImage(60, 90, QImage.Format_RGB32)
+    image.fill(QColor('red'))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, 'PNG')
+    return bytes(data)
+
+
+class CoverHandler(BaseHTTPRequestHandler):
+    """/cover.png - картинка, /broken.png - не картинка, /slow.png - не отвечает дольше таймаута, остальное - 404"""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == '/slow.png':
+            time.sleep(2)
+            return   # клиент к этому времени уже отключился по таймауту
+        if self.path in ('/cover.png', '/broken.png'):
+            body = b'not an image' if self.path == '/broken.png' else self.server.png
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def server(app):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CoverHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.png = png_bytes()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = lambda path: f"http://127.0.0.1:{server.server_address[1]}{path}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class Recorder:
+    def __init__(self, service):
+        self.ready, self.failed = [], []
+        service.cover_ready.connect(lambda key, size, pixmap: self.ready.append((key, size, pixmap)))
+        service.cover_failed.connect(self.failed.append)
+
+
+def wait_for(app, condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("сигнал не пришел")
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def make_service(server, tmp_path, **kwargs):
+    images = {1: server.url('/cover.png'), 2: server.url('/cover.png'), 3: server.url('/missing.png'),
+              4: server.url('/slow.png'), 5: server.url('/broken.png')}
+    service = CoverService(images, cache_dir=tmp_path / "covers", **kwargs)
+    return service, Recorder(service)
+
+
+def test_one_download_per_url_and_memory_cache(app, server, tmp_path):
+    service, recorder = make_service(server, tmp_path)
+    assert service.cover(1, SIZE) is None
+    assert service.cover('2', SIZE) is None       # тот же URL, ключ строкой
+    wait_for(app, lambda: len(recorder.ready) == 2)
+    service.pool.waitForDone()
+
+    assert server.requests == ['/cover.png']
+    assert {key for key, _, _ in recorder.ready} == {'1', '2'}
+    pixmap = service.cover(1, SIZE)
+    assert pixmap is not None and not pixmap.isNull()
+    assert pixmap.width() <= SIZE.width() and pixmap.height() <= SIZE.height()
+    assert len(list((tmp_path / "covers").iterdir())) == 1
+
+
+def test_disk_cache_serves_new_service(app, server, tmp_path):
+    service, recorder = make_service(server, tmp_path)
+    service.cover(1, SIZE)
+    wait_for(app, lambda: recorder.ready)
+    service.pool.waitForDone()
+
+    other, other_recorder = make_service(server, tmp_path)
+    other.cover(1, QSize(60, 90))
+    wait_for(app, lambda: other_recorder.ready)
+    other.pool.waitForDone()
+    assert server.requests == ['/cover.png']
+
+
+def test_failed_url_is_not_requested_again(app, server, tmp_path):
+    service, recorder = make_service(server, tmp_path)
+    service.cover(3, SIZE)
+    wait_for(app, lambda: recorder.failed)
+    service.pool.waitForDone()
+    assert recorder.failed == ['3']
+
+    service.cover(3, SIZE)
+    assert recorder.failed == ['3', '3']
+    assert server.requests == ['/missing.png']
+
+
+def test_undecodable_image_fails(app, server, tmp_path):
+    service, recorder = make_service(server, tmp_path)
+    service.cover(5, SIZE)
+    wait_for(app, lambda: recorder.failed)
+    service.pool.waitForDone()
+    assert recorder.failed == ['5'] and not recorder.ready
+
+
+def test_timeout_fails(app, server, tmp_path):
+    service, recorder = make_service(server, tmp_path, timeout=0.3)
+    started = time.monotonic()
+    service.cover(4, SIZE)
+    wait_for(app, lambda: recorder.failed)
+    assert time.monotonic() - started < 1.5
+    assert recorder.failed == ['4'] and not recorder.ready
+    service.pool.waitForDone()
+
+
+def test_unknown_book_fails_without_request(app, server, tmp_path):
+    service, recorder = make_service(server, tmp_path)
+    assert service.cover(99, SIZE) is None
+    assert recorder.failed == ['99']
+    assert server.requests == []
+
+
+def test_pixmap_lru_is_bounded(app, server, tmp_path):
+    service, recorder = make_service(server, tmp_path, max_pixmaps=1)
+    service.cover(1, SIZE)
+    wait_for(app, lambda: recorder.ready)
+    service.cover(1, QSize(60, 90))
+    wait_for(app, lambda: len(recorder.ready) == 2)
+    service.pool.waitForDone()
+    assert service.cached(1, QSize(60, 90)) is not None
+    assert service.cached(1, SIZE) is None
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from evaluate import Evaluator, split_ratings
+
+
+class StubRecommender:
+    """Минимум рекомендателя, который нужен Evaluator для подсчета метрик"""
+
+    def __init__(self, book_ids):
+        self.catalog = book_ids
+        self.book_index = pd.Index(book_ids)
+        self.config = {'block_size': 2}
+
+    def ensure_models(self):
+        pass
+
+    def book_rows(self, book_ids):
+        return self.book_index.get_indexer(np.atleast_1d(book_ids))
+
+
+def ratings(rows):
+    return pd.DataFrame(rows, columns=['user_id', 'book_id', 'rating'])
+
+
+@pytest.fixture
+def evaluator():
+    # Книги 10..15 - позиции 0..5
+    train = ratings([(1, 10, 5), (1, 11, 3), (2, 12, 4)])
+    # Релевантные (оценка >= 4): у пользователя 1 - книги 13 и 14, у пользователя 2 - книга 10
+    test = ratings([(1, 13, 5), (1, 14, 4), (1, 15, 2), (2, 10, 5), (3, 11, 5)])
+    return Evaluator(StubRecommender(list(range(10, 16))), train, test, k=3, seeds=2, workers=1)
+
+
+def test_users_and_seeds(evaluator):
+    # Пользователь 3 без обучающих оценок не оценивается
+    assert evaluator.user_ids.tolist() == [1, 2]
+    assert evaluator.n_relevant.tolist() == [2, 1]
+    assert evaluator.seeds.tolist() == [[0, 1], [2, -1]]
+
+
+def test_metrics(evaluator):
+    positions = np.array([[3, 5, 4],      # попадания на 1-м и 3-м месте
+                          [1, -1, -1]])   # ни одного попадания
+    metrics = evaluator.metrics(positions)
+
+    ndcg_user1 = (1 + 1 / np.log2(4)) / (1 + 1 / np.log2(3))
+    assert metrics['precision'] == pytest.approx((2 / 3 + 0) / 2)
+    assert metrics['recall'] == pytest.approx((2 / 2 + 0) / 2)
+    assert metrics['ndcg'] == pytest.approx(ndcg_user1 / 2)
+    assert metrics['coverage'] == pytest.approx(4 / 6)
+
+
+def test_perfect_ranking(evaluator):
+    metrics = evaluator.metrics(np.array([[3, 4, 5], [0, 1, 2]]))
+    assert metrics['recall'] == pytest.approx(1.0)
+    assert metrics['ndcg'] == pytest.approx(1.0)
+    assert metrics['precision'] == pytest.approx((2 / 3 + 1 / 3) / 2)
+    assert metrics['coverage'] == pytest.approx(1.0)
+
+
+def test_fuse_sums_reciprocal_ranks_without_rated_books(evaluator):
+    # По два соседа на seed-книгу: 1/1 и 1/2
+    candidates = np.array([[3, 4, 4, 5],     # 3: 1, 4: 1/2 + 1 = 1.5, 5: 1/2
+                           [1, 2, -1, -1]])  # 2 оценена в train
+    positions = evaluator.fuse(candidates)
+    assert positions.tolist() == [[4, 3, 5], [1, -1, -1]]
+
+
+def test_split_ratings_keeps_train_for_every_user():
+    frame = ratings([(user, book, 5) for user in (1, 2, 3) for book in range(1, user * 3 + 1)])
+    train, test = split_ratings(frame, holdout=0.5, seed=0)
+    assert len(train) + len(test) == len(frame)
+    held = test.groupby('user_id').size().reindex([1, 2, 3], fill_value=0)
+    assert held.tolist() == [1, 3, 4]    # floor(n * 0.5) для 3, 6 и 9 оценок
+    assert set(train['user_id']) == {1, 2, 3}
+    assert not set(map(tuple, train[['user_id', 'book_id']].values)) & set(map(tuple, test[['user_id', 'book_id']].values))
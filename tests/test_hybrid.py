@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from datagen import generate_books, iter_ratings, write_frames
+from evaluate import Evaluator, split_ratings
+from recommender import AdvancedBookRecommender
+from similarity_index import top_k_indices
+
+NUM_BOOKS = 300
+TOP_N = 10
+
+
+@pytest.fixture(scope='module')
+def recommender(tmp_path_factory):
+    path = tmp_path_factory.mktemp("hybrid")
+    write_frames(path / "books.csv", [generate_books(NUM_BOOKS, seed=3)])
+    write_frames(path / "ratings.csv", iter_ratings(200, NUM_BOOKS, density=0.1, seed=3))
+    # Короткие списки соседей, чтобы веса запроса чаще выводили соседей за их пределы
+    recommender = AdvancedBookRecommender({
+        'books_path': str(path / "books.csv"), 'ratings_path': str(path / "ratings.csv"),
+        'models_path': str(path / "models"), 'top_k': 15, 'train_workers': 1, 'cache_entries': 0})
+    recommender.ensure_models()
+    return recommender
+
+
+@pytest.fixture
+def exact(recommender):
+    recommender.config['hybrid_exact'] = True
+    yield recommender
+    recommender.config['hybrid_exact'] = False
+
+
+def exact_scores(recommender, method, rows, blend=None):
+    """Оценки top-N по полным строкам похожести, по убыванию"""
+    block = recommender.similarity_block(method, rows, blend=blend)
+    block[np.arange(len(rows)), rows] = -np.inf
+    return np.take_along_axis(block, top_k_indices(block, TOP_N), axis=1)
+
+
+@pytest.mark.parametrize('weights, popularity_weight', [
+    (None, None), ((0.8, 0.2), 0.0), ((0.2, 0.8), 0.0), ((0.5, 0.5), 0.3), ((1.2, -0.2), 0.0)])
+def test_exact_mode_matches_full_blend(exact, weights, popularity_weight):
+    recommender = exact
+    rows = np.arange(NUM_BOOKS)
+    blend = recommender.hybrid_blend(weights, popularity_weight)
+    positions, scores = recommender.recommend_rows(rows, 'hybrid', TOP_N, blend)
+    expected = exact_scores(recommender, 'hybrid', rows, blend)
+    np.testing.assert_allclose(scores, expected, atol=1e-5)
+    # Оценки - смешанные похожести именно возвращенных книг
+    blended = recommender.similarity_block('hybrid', rows, blend=blend)
+    np.testing.assert_allclose(np.take_along_axis(blended, positions, axis=1), scores, atol=1e-5)
+
+
+def test_single_weight_matches_index(recommender):
+    rows = np.arange(NUM_BOOKS)
+    for weights, method in (((1, 0), 'content'), ((0, 1), 'collab')):
+        _, scores = recommender.recommend_rows(rows, 'hybrid', TOP_N, recommender.hybrid_blend(weights, 0))
+        np.testing.assert_allclose(scores, recommender.recommend_rows(rows, method, TOP_N)[1], atol=1e-5)
+
+
+def test_single_query_matches_batch(recommender):
+    book_id = int(recommender.book_ids[7])
+    single = recommender.get_recommendations(book_id, 'hybrid', TOP_N, weights=(0.3, 0.7))
+    ids, _ = recommender.get_recommendations_batch([book_id], 'hybrid', TOP_N, weights=(0.3, 0.7))
+    assert single.book_ids.tolist() == ids[0].tolist()
+
+
+@pytest.mark.parametrize('weights, popularity_weight', [(None, None), ((0.5, 0.5), 0.3)])
+def test_fast_blend_by_default(recommender, weights, popularity_weight):
+    rows = np.arange(NUM_BOOKS)
+    blend = recommender.hybrid_blend(weights, popularity_weight)
+    positions, scores = recommender.recommend_rows(rows, 'hybrid', TOP_N, blend)
+    # Без полного пересчета оценки те же, но соседи вне двух списков теряются
+    blended = recommender.similarity_block('hybrid', rows, blend=blend)
+    np.testing.assert_allclose(np.take_along_axis(blended, positions, axis=1), scores, atol=1e-5)
+    assert np.all(scores <= exact_scores(recommender, 'hybrid', rows, blend) + 1e-5)
+
+
+def test_evaluate_blend_weights_match_methods(recommender):
+    train, test = split_ratings(recommender.ratings, 0.2, seed=0)
+    evaluator = Evaluator(recommender, train, test, k=5, seeds=3, workers=1)
+    content_weight = recommender.config['hybrid_weights'][0]
+    # Гибрид с весом content 1 и 0 - это content и collab, с весами конфигурации - обычный hybrid
+    for weight, method in ((1.0, 'content'), (0.0, 'collab'), (content_weight, 'hybrid')):
+        assert np.array_equal(evaluator.recommend('hybrid', weight), evaluator.recommend(method))
+
+
+@pytest.mark.parametrize('weights', [None, (0.9, 0.1)])
+def test_cluster_uses_request_weights(recommender, weights):
+    rows = np.arange(NUM_BOOKS)
+    blend = recommender.hybrid_blend(weights, 0)
+    _, scores = recommender.recommend_rows(rows, 'cluster', TOP_N, blend)
+    np.testing.assert_allclose(scores, exact_scores(recommender, 'cluster', rows, blend), atol=1e-5)
+    book_id = int(recommender.book_ids[0])
+    single = recommender.get_recommendations(book_id, 'cluster', TOP_N, weights=weights, popularity_weight=0)
+    np.testing.assert_allclose(single.scores, scores[0][np.isfinite(scores[0])], atol=1e-5)
+
+
+def test_candidate_similarity_uses_request_weights(recommender):
+    candidates = np.array([[1, 5, 9, -1], [2, 4, 6, 8]])
+    blend = (0.9, 0.1, 0.5)
+    pairwise = recommender.candidate_similarity(candidates, blend)
+    for line, row in enumerate(candidates):
+        safe = np.where(row >= 0, row, 0)
+        # Популярность в похожесть пары не входит
+        expected = recommender.similarity_block('hybrid', safe, safe, (0.9, 0.1, 0))
+        np.testing.assert_allclose(pairwise[line], expected, atol=1e-5)
+
+
+def test_no_hybrid_index(recommender):
+    # Гибрид хранится только вторыми оценками соседей content и collab
+    arrays = recommender.artifacts.manifest()['arrays']
+    assert not any(name.startswith('similarity.hybrid.') for name in arrays)
+    assert 'hybrid' not in recommender.similarity_indexes
+
+
+def test_mmr_in_blocks(recommender):
+    rows = np.arange(NUM_BOOKS)
+    expected = recommender.recommend_rows(rows, 'diverse', TOP_N)
+    block_size = recommender.config['block_size']
+    recommender.config['block_size'] = 7
+    try:
+        found = recommender.recommend_rows(rows, 'diverse', TOP_N)
+    finally:
+        recommender.config['block_size'] = block_size
+    assert np.array_equal(found[0], expected[0])
+    assert recommender.candidate_similarity(expected[0][:2], recommender.hybrid_blend()).dtype == np.float32
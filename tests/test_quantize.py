@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from ann import _synthetic_vectors
+from quantize import (QuantizedMatrix, factor_arrays, float_dtype, precision_report, restore_factors,
+                      store_factors)
+
+
+@pytest.fixture(scope='module')
+def vectors():
+    return _synthetic_vectors(3000, 10)
+
+
+def test_quantized_rows(vectors):
+    quantized = QuantizedMatrix.from_dense(vectors)
+    assert quantized.codes.dtype == np.int8 and quantized.nbytes < vectors.nbytes / 4
+    # Ошибка строки - не больше половины шага квантования
+    error = np.abs(np.asarray(quantized) - vectors)
+    assert (error <= quantized.scales[:, None] / 2 + 1e-6).all()
+    assert np.array_equal(quantized[[3, 7]], np.asarray(quantized)[[3, 7]])
+    np.testing.assert_allclose(quantized.dot_rows(vectors[:5]), vectors[:5] @ np.asarray(quantized).T,
+                               atol=1e-4)
+
+
+def test_zero_rows():
+    quantized = QuantizedMatrix.from_dense(np.zeros((2, 3)))
+    assert not np.asarray(quantized).any()
+
+
+def test_neighbour_agreement(vectors):
+    report = {row['precision']: row for row in precision_report({'synthetic': vectors}, k=10, n_queries=200)}
+    assert report['float64']['recall'] == 1.0
+    # float32 дает тех же соседей, int8 - почти тех же (на этих данных около 0.97)
+    assert report['float32']['recall'] == 1.0 and report['float32']['max_error'] < 1e-6
+    assert report['int8']['recall'] >= 0.95 and report['int8']['max_error'] < 0.01
+    assert report['int8']['mb'] < report['float32']['mb'] < report['float64']['mb']
+
+
+@pytest.mark.parametrize('precision', ['float64', 'float32', 'int8'])
+def test_factor_arrays_round_trip(vectors, precision):
+    stored = store_factors(vectors, precision)
+    arrays = factor_arrays('factors', stored)
+    restored = restore_factors('factors', arrays, arrays.__getitem__)
+    assert np.array_equal(np.asarray(restored), np.asarray(stored))
+    assert np.asarray(restored).dtype == float_dtype(precision)
+
+
+def test_unknown_precision():
+    with pytest.raises(ValueError):
+        store_factors(np.eye(2), 'float16')
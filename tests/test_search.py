@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+from catalog import BookCatalog
+from search import BookSearchIndex, tokenize
+
+
+@pytest.fixture
+def index():
+    books = pd.DataFrame({
+        'book_id': [1, 2, 3, 4, 5],
+        'title': ["Гарри Поттер и философский камень", "Мастер и Маргарита", "Собачье сердце",
+                  "Гарри Поттер и тайная комната", "Ёлка"],
+        'author': ["Дж. Роулинг", "Михаил Булгаков", "Михаил Булгаков", "Дж. Роулинг", "Неизвестный"],
+        'genre': ["Фэнтези", "Роман", "Повесть", "Фэнтези", "Сказка"],
+        'description': [""] * 5,
+        'popularity': [9.0, 8.0, 7.0, 9.5, 1.0],
+    })
+    return BookSearchIndex.build(BookCatalog.from_frame(books))
+
+
+def ids(results):
+    return results.book_ids.tolist()
+
+
+def test_tokenize():
+    assert tokenize("Ёлка, Дж. Роулинг!") == ['елка', 'дж', 'роулинг']
+
+
+def test_exact_words_rank_by_popularity(index):
+    # Обе книги совпадают всеми словами - выше более популярная
+    assert ids(index.search("гарри поттер", incremental=False)) == [4, 1]
+    assert ids(index.search("ёлка", incremental=False)) == [5]
+
+
+def test_typo_matching(index):
+    assert ids(index.search("гари потер", incremental=False))[:2] == [4, 1]
+    assert ids(index.search("булгоков", incremental=False)) == [2, 3]
+    # Короткие слова без опечаток: 'ма' не совпадает с 'мастер'
+    assert ids(index.search("ма", incremental=False)) == []
+
+
+def test_incremental_prefix_search(index):
+    # Последнее слово без пробела после него ищется и как префикс
+    assert ids(index.search("мас")) == [2]
+    assert ids(index.search("гарри поттер и ф"))[0] == 1
+    assert ids(index.search("собач"))[0] == 3
+    # Пробел закончил слово: префикс больше не действует
+    assert ids(index.search("мас ")) == []
+
+
+def test_incremental_reuses_finished_words(index):
+    for prefix in ("м", "ми", "михаил", "михаил ", "михаил б", "михаил булг"):
+        index.search(prefix)
+    assert index._done[0] == ('михаил',)
+    assert ids(index.search("михаил булг")) == ids(index.search("михаил булгаков", incremental=False))
+
+
+def test_resolve(index):
+    assert index.catalog.book_ids[index.resolve("Мастер и Маргарита")] == 2
+    assert index.catalog.book_ids[index.resolve("гарри поттер тайная комната")] == 4
+    assert index.resolve("война и мир") is None
+    assert index.resolve("") is None
+
+
+def test_limit(index):
+    assert ids(index.search("гарри поттер роулинг", limit=1, incremental=False)) == [4]
+
+
+def test_persisted_index(index, tmp_path):
+    saved = BookSearchIndex.for_catalog(index.catalog, tmp_path / "search")
+    loaded = BookSearchIndex.for_catalog(index.catalog, tmp_path / "search")
+    assert ids(loaded.search("гари потер")) == ids(saved.search("гари потер")) == ids(index.search("гари потер"))
@@ -0,0 +1,126 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+import pytest
+
+import loadgen
+from recommender import AdvancedBookRecommender
+from server import RecommendationServer
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    # Встроенный демонстрационный каталог из 15 книг
+    recommender = AdvancedBookRecommender({'models_path': str(tmp_path_factory.mktemp("models")),
+                                           'train_workers': 2})
+    server = RecommendationServer(('127.0.0.1', 0), recommender, window_ms=0.5)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(service, path, **params):
+    try:
+        with urllib.request.urlopen(f"{service}{path}?{urlencode(params)}", timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_recommendations(service):
+    status, payload = get(service, '/recommendations', book_id=1, top_n=3, weights='0.8,0.2', popularity_weight=0.1)
+    assert status == 200
+    assert len(payload['recommendations']) == 3
+
+
+@pytest.mark.parametrize('params', [
+    {'weights': 'nan,0'}, {'weights': 'inf,1'}, {'weights': '-1,2'}, {'weights': '1'}, {'weights': 'a,b'},
+    {'popularity_weight': 'nan'}, {'popularity_weight': '-0.5'},
+    {'top_n': 'x'}, {'top_n': 0}, {'top_n': 1000},
+])
+def test_invalid_recommendation_params(service, params):
+    status, payload = get(service, '/recommendations', **{'book_id': 1, **params})
+    assert status == 400
+    assert 'invalid literal' not in payload['error'] and 'could not convert' not in payload['error']
+
+
+def test_invalid_book_id(service):
+    status, payload = get(service, '/recommendations', book_id='x')
+    assert status == 400
+    assert payload['error'].startswith('book_id')
+
+
+def test_books_paging(service):
+    status, payload = get(service, '/books', offset=10, limit=3)
+    assert status == 200
+    assert len(payload['book_ids']) == 3 and payload['total'] == 15
+
+
+@pytest.mark.parametrize('params', [{'offset': -5}, {'limit': 0}, {'limit': -1}, {'limit': 10**6}, {'offset': 'x'}])
+def test_invalid_books_params(service, params):
+    status, payload = get(service, '/books', **params)
+    assert status == 400
+    assert payload['error'].split()[0] in params
+
+
+def test_loadgen_pages_books(service, monkeypatch):
+    monkeypatch.setattr(loadgen, 'BOOKS_PAGE', 4)
+    assert loadgen.fetch_book_ids(service, 10).tolist() == list(range(1, 11))
+    # Больше книг, чем в каталоге: читается до total
+    assert len(loadgen.fetch_book_ids(service, 100)) == 15
+
+
+def test_loadgen_reports_http_errors(service, monkeypatch):
+    monkeypatch.setattr(loadgen, 'BOOKS_PAGE', 10**6)
+    with pytest.raises(RuntimeError, match='400'):
+        loadgen.fetch_book_ids(service, 10**6)
+
+
+@pytest.fixture
+def batching(tmp_path):
+    # Длинное окно: одновременные запросы гарантированно попадают в один пакет
+    recommender = AdvancedBookRecommender({'models_path': str(tmp_path / "models"), 'train_workers': 2})
+    server = RecommendationServer(('127.0.0.1', 0), recommender, window_ms=500)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_requests_share_batches(batching):
+    service = f"http://127.0.0.1:{batching.server_address[1]}"
+    # Повторы book_id и разные веса: группы (hybrid), (hybrid, 0.8/0.2), (content), (cluster, 0.9/0.1)
+    requests = [(1, 'hybrid', None), (1, 'hybrid', None), (2, 'hybrid', None),
+                (1, 'hybrid', '0.8,0.2'), (3, 'hybrid', '0.8,0.2'), (3, 'hybrid', '0.8,0.2'),
+                (2, 'content', None), (4, 'content', None), (2, 'cluster', '0.9,0.1')]
+    responses = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def send(i, book_id, method, weights):
+        params = {'book_id': book_id, 'method': method, 'top_n': 5, **({'weights': weights} if weights else {})}
+        barrier.wait()
+        responses[i] = get(service, '/recommendations', **params)
+
+    threads = [threading.Thread(target=send, args=(i, *request)) for i, request in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = batching.batcher.stats
+    assert stats['requests'] == len(requests)
+    assert stats['scoring_calls'] < stats['requests']
+    assert stats['batches'] == 1 and stats['scoring_calls'] == 4
+    for (book_id, method, weights), (status, payload) in zip(requests, responses):
+        assert status == 200
+        expected = batching.recommender.get_recommendations(
+            book_id, method, 5, weights=weights and tuple(map(float, weights.split(','))))
+        records = payload['recommendations']
+        assert [record['book_id'] for record in records] == expected.book_ids.tolist()
+        assert [record['score'] for record in records] == pytest.approx(expected.scores.tolist(), abs=1e-5)
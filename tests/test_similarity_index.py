@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from recommender import group_members
+from similarity_index import TopKSimilarityIndex, top_k_indices
+
+N_ITEMS = 60
+K = 8
+
+
+def unit_vectors(n_items, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n_items, 6))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def dense_top(vectors, k, mask=None):
+    """Эталон: оценки top-k по полной матрице косинусов, без самой книги"""
+    dense = vectors @ vectors.T
+    np.fill_diagonal(dense, -np.inf)
+    if mask is not None:
+        dense[~mask] = -np.inf
+    return -np.sort(-dense, axis=1)[:, :k]
+
+
+def test_top_k_indices():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [3.0, 1.0, 2.0, 0.0]])
+    assert top_k_indices(scores, 2).tolist() == [[1, 3], [0, 2]]
+    assert top_k_indices(scores, 10).shape == (2, 4)
+    assert top_k_indices(scores, 0).shape == (2, 0)
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_build_matches_dense(workers):
+    vectors = unit_vectors(N_ITEMS)
+    index = TopKSimilarityIndex.build(lambda rows: vectors[rows] @ vectors.T, N_ITEMS, k=K,
+                                      block_size=7, workers=workers)
+    indices, scores = index.neighbors_batch(np.arange(N_ITEMS), K)
+    np.testing.assert_allclose(scores, dense_top(vectors, K), atol=1e-6)
+    # Оценки - похожести именно найденных книг, самой книги в списке нет
+    np.testing.assert_allclose(scores, np.einsum('nd,nkd->nk', vectors, vectors[indices]), atol=1e-6)
+    assert not (indices == np.arange(N_ITEMS)[:, None]).any()
+
+    row_indices, row_scores = index.neighbors(5, 3)
+    assert row_indices.tolist() == indices[5, :3].tolist()
+    assert row_scores.tolist() == scores[5, :3].tolist()
+
+
+def test_from_arrays_round_trip():
+    vectors = unit_vectors(N_ITEMS)
+    index = TopKSimilarityIndex.build(lambda rows: vectors[rows] @ vectors.T, N_ITEMS, k=K)
+    restored = TopKSimilarityIndex.from_arrays(**index.arrays())
+    assert restored.k == K and len(restored) == N_ITEMS
+    assert np.array_equal(restored.neighbors(3)[0], index.neighbors(3)[0])
+
+
+def test_build_grouped_stays_in_group():
+    vectors = unit_vectors(N_ITEMS)
+    labels = np.arange(N_ITEMS) % 4
+    labels[-3:] = 4  # группа из трех книг: у каждой только два соседа
+    group_indptr, members = group_members(labels, 5)
+    index = TopKSimilarityIndex.build_grouped(lambda rows, cols: vectors[rows] @ vectors[cols].T,
+                                              group_indptr, members, k=K, block_size=5)
+    indices, scores = index.neighbors_batch(np.arange(N_ITEMS), K)
+    same_group = labels[:, None] == labels[None, :]
+    np.testing.assert_allclose(scores, dense_top(vectors, K, same_group), atol=1e-6)
+    found = indices >= 0
+    assert (labels[np.where(found, indices, 0)] == labels[:, None])[found].all()
+    assert found[-1].sum() == 2 and np.isneginf(scores[-1, 2:]).all()
+
+
+def test_updated_matches_rebuild():
+    vectors = unit_vectors(N_ITEMS)
+    index = TopKSimilarityIndex.build(lambda rows: vectors[rows] @ vectors.T, N_ITEMS, k=K)
+    # Две книги изменились, пять добавлены в конец
+    new_vectors = np.vstack([vectors, unit_vectors(5, seed=1)])
+    new_vectors[[3, 17]] = unit_vectors(2, seed=2)
+
+    def score_block(rows, cols=None):
+        return new_vectors[rows] @ (new_vectors if cols is None else new_vectors[cols]).T
+
+    updated = index.updated(score_block, [3, 17], N_ITEMS + 5, block_size=9)
+    _, scores = updated.neighbors_batch(np.arange(N_ITEMS + 5), K)
+    np.testing.assert_allclose(scores, dense_top(new_vectors, K), atol=1e-6)
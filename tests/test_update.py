@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datagen import generate_books, iter_ratings, write_frames
+from metrics import Metrics, MetricsRegistry
+from recommender import AdvancedBookRecommender
+
+NUM_BOOKS = 200
+
+
+@pytest.fixture
+def data(tmp_path):
+    write_frames(tmp_path / "books.csv", [generate_books(NUM_BOOKS, seed=1)])
+    write_frames(tmp_path / "ratings.csv", iter_ratings(150, NUM_BOOKS, density=0.1, seed=1))
+    return tmp_path
+
+
+def make_recommender(path, registry=None):
+    config = {'books_path': str(path / "books.csv"), 'ratings_path': str(path / "ratings.csv"),
+              'models_path': str(path / "models"), 'train_workers': 2}
+    return AdvancedBookRecommender(config, metrics=Metrics(registry or MetricsRegistry()))
+
+
+def test_restart_after_update_reuses_artifacts(data):
+    recommender = make_recommender(data)
+    # Таблицы из памяти с типами по умолчанию (int64, float64, object), а не типами загрузчиков
+    new_books = pd.DataFrame({'book_id': [NUM_BOOKS + 1], 'title': ["Новая книга"], 'author': ["Новый автор"],
+                              'genre': ["Фэнтези"], 'description': ["дракон и замок"], 'popularity': [9.0]})
+    new_ratings = pd.DataFrame({'user_id': [1, 1000, 1000], 'book_id': [NUM_BOOKS + 1, 1, NUM_BOOKS + 1],
+                                'rating': [5, 4, 5]})
+    assert recommender.update(new_ratings, new_books)['mode'] == 'incremental'
+    expected = recommender.get_recommendations(NUM_BOOKS + 1, 'hybrid', 5).book_ids
+
+    # Те же строки дописаны в исходные файлы
+    new_books.to_csv(data / "books.csv", mode='a', header=False, index=False)
+    new_ratings.to_csv(data / "ratings.csv", mode='a', header=False, index=False)
+
+    registry = MetricsRegistry()
+    restarted = make_recommender(data, registry)
+    assert restarted.model_version == recommender.model_version
+    assert registry.value('model_loads_total', source='artifacts') == 1
+    assert np.array_equal(restarted.get_recommendations(NUM_BOOKS + 1, 'hybrid', 5).book_ids, expected)
+
+
+def test_update_rejects_existing_book_ids(data):
+    recommender = make_recommender(data)
+    books = generate_books(1, seed=2)
+    with pytest.raises(ValueError):
+        recommender.update(new_books=books)
@@ -1,17 +1,21 @@
 import sys
-import urllib.request
-import pandas as pd
+
+import numpy as np
 from PyQt5.QtWidgets import (
     QDialog, QGroupBox, QFormLayout, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QScrollArea, QSizePolicy
 )
-from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
-from PyQt5.QtGui import QPixmap, QIcon, QFont, QColor
+from PyQt5.QtCore import (Qt, QSize, QRect, QPoint, QEvent, QThread, QTimer, pyqtSignal,
+                          QAbstractListModel, QModelIndex)
+from PyQt5.QtGui import QPixmap, QIcon, QFont, QColor, QPalette, QStandardItem, QStandardItemModel
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QLabel, QComboBox, QPushButton, QListWidget, 
-                             QMessageBox, QHBoxLayout, QSlider, QListWidgetItem,
-                             QFrame, QScrollArea)
+                             QLabel, QComboBox, QPushButton, QListView, 
+                             QMessageBox, QHBoxLayout, QSlider, QStyledItemDelegate,
+                             QStyle, QStyleOptionButton, QFrame, QScrollArea, QProgressBar,
+                             QLineEdit, QCompleter)
 from recommender import AdvancedBookRecommender
+from catalog import Recommendations
+from covers import CoverService, cover_key
 
 # Правильно оформленный список стоп-слов
 RUSSIAN_STOP_WORDS = [
@@ -20,26 +24,41 @@ RUSSIAN_STOP_WORDS = [
     'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 'вот', 'от'
 ]
 
-class ImageLoaderThread(QThread):
-    loaded = pyqtSignal(QPixmap)
-    error = pyqtSignal()
+class CoverLabel(QLabel):
+    """Обложка книги из общего CoverService; подписка снимается вместе с виджетом"""
 
-    def __init__(self, url):
-        super().__init__()
-        self.url = url
+    def __init__(self, covers, book_id, width, height, failed_text="Нет обложки", parent=None):
+        super().__init__(parent)
+        self.setFixedSize(width, height)
+        self.setAlignment(Qt.AlignCenter)
+        self.cover_size = QSize(width, height)
+        self.failed_text = failed_text
+        self.key = cover_key(book_id)
+
+        if not covers.has_cover(self.key):
+            self.show_placeholder("Нет обложки")
+            return
+        covers.cover_ready.connect(self.on_cover_ready)
+        covers.cover_failed.connect(self.on_cover_failed)
+        self.setText("Загрузка...")
+        pixmap = covers.cover(self.key, self.cover_size)
+        if pixmap is not None:
+            self.setPixmap(pixmap)
 
-    def run(self):
-        try:
-            with urllib.request.urlopen(self.url) as response:
-                data = response.read()
-            pixmap = QPixmap()
-            pixmap.loadFromData(data)
-            self.loaded.emit(pixmap.scaled(120, 180, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        except:
-            self.error.emit()
+    def on_cover_ready(self, key, size, pixmap):
+        if key == self.key and size == self.cover_size:
+            self.setPixmap(pixmap)
+
+    def on_cover_failed(self, key):
+        if key == self.key:
+            self.show_placeholder(self.failed_text)
+
+    def show_placeholder(self, text):
+        self.setText(text)
+        self.setStyleSheet("color: #888;")
 
 class RecommendationWorker(QThread):
-    finished = pyqtSignal(pd.DataFrame)
+    finished = pyqtSignal(object)
     error = pyqtSignal(str)
 
     def __init__(self, recommender, book_id, method, top_n):
@@ -61,217 +80,438 @@ class RecommendationWorker(QThread):
         except Exception as e:
             self.error.emit(str(e))
 
-# ... (остальные классы BookItemWidget, BookDetailsWindow, RecommenderApp остаются без изменений)
+class ModelLoaderThread(QThread):
+    """Загружает каталог и модели в фоне, чтобы окно появлялось сразу"""
+    progress = pyqtSignal(str, int)
+    loaded = pyqtSignal(object)
+    error = pyqtSignal(str)
 
-class BookItemWidget(QWidget):
-    def __init__(self, book_data, book_images, parent=None):
-        super().__init__(parent)
-        self.book_data = book_data
-        self.book_images = book_images
-        self.setup_ui()
+    def __init__(self, config=None):
+        super().__init__()
+        self.config = config
 
-    def setup_ui(self):
-        layout = QHBoxLayout()
-        layout.setContentsMargins(10, 10, 10, 10)
-        layout.setSpacing(15)
+    def run(self):
+        try:
+            recommender = AdvancedBookRecommender(
+                self.config, progress=lambda message, fraction: self.progress.emit(message, int(fraction * 100)))
+            self.progress.emit("Построение поискового индекса...", 100)
+            recommender.search_index()
+            self.loaded.emit(recommender)
+        except Exception as e:
+            self.error.emit(str(e))
 
-        self.cover_label = QLabel()
-        self.cover_label.setFixedSize(120, 180)
-        self.cover_label.setAlignment(Qt.AlignCenter)
-        layout.addWidget(self.cover_label)
+LIST_COVER_SIZE = QSize(120, 180)
+COVER_PLACEHOLDERS = {'loading': "Загрузка...", 'missing': "Нет обложки", 'failed': "Нет обложки"}
 
-        info_layout = QVBoxLayout()
-        info_layout.setSpacing(8)
+# Предел ползунка числа рекомендаций (как MAX_TOP_N сервиса) и шаг кнопки «Показать еще»
+MAX_RECOMMENDATIONS = 100
+MORE_RECOMMENDATIONS = 50
+
+# Подсказки ищутся, когда пользователь перестал печатать на SEARCH_DELAY_MS
+SEARCH_DELAY_MS = 150
+SEARCH_SUGGESTIONS = 20
 
-        self.title_label = QLabel(f"<b>{self.book_data['title']}</b>")
-        self.title_label.setStyleSheet("font-size: 16px; color: #bb86fc;")
-        info_layout.addWidget(self.title_label)
+class BookSearchBox(QLineEdit):
+    """Поле выбора книги: подсказки по названию и автору обновляются по мере ввода.
 
-        self.author_label = QLabel(f"Автор: {self.book_data['author']}")
-        info_layout.addWidget(self.author_label)
+    Поиск идет по индексу рекомендателя (search.BookSearchIndex) с допуском
+    опечаток; выбранная подсказка запоминает book_id, а набранный без выбора
+    текст разрешается в книгу при запросе рекомендаций (book_id()).
+    """
+    BookIdRole = Qt.UserRole + 1
 
-        self.genre_label = QLabel(f"Жанр: {self.book_data['genre']}")
-        info_layout.addWidget(self.genre_label)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.recommender = None
+        self.selected_book_id = None
+        self.setPlaceholderText("Название или автор")
+        self.suggestions = QStandardItemModel(self)
+        self.completer = QCompleter(self.suggestions, self)
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.setWidget(self)
+        self.completer.activated[QModelIndex].connect(self.on_activated)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(SEARCH_DELAY_MS)
+        self.timer.timeout.connect(self.update_suggestions)
+        self.textEdited.connect(self.on_text_edited)
+
+    def set_recommender(self, recommender):
+        self.recommender = recommender
 
-        details_btn = QPushButton("Подробнее")
-        details_btn.setFixedSize(120, 30)
-        details_btn.clicked.connect(self.show_details)
-        info_layout.addWidget(details_btn, alignment=Qt.AlignRight)
+    def on_text_edited(self, text):
+        self.selected_book_id = None
+        self.timer.start()
 
-        layout.addLayout(info_layout, stretch=1)
-        self.setLayout(layout)
-        self.load_cover()
-
-    def load_cover(self):
-        if self.book_data['book_id'] in self.book_images:
-            self.thread = ImageLoaderThread(self.book_images[self.book_data['book_id']])
-            self.thread.loaded.connect(self.set_cover_image)
-            self.thread.error.connect(self.show_placeholder)
-            self.thread.start()
+    def update_suggestions(self):
+        self.suggestions.clear()
+        if self.recommender is None or not self.text().strip():
+            self.completer.popup().hide()
+            return
+        books = self.recommender.search_books(self.text(), SEARCH_SUGGESTIONS, incremental=True)
+        for book in books.records(('book_id', 'title', 'author')):
+            item = QStandardItem(f"{book['title']} - {book['author']}")
+            item.setData(book['book_id'], self.BookIdRole)
+            self.suggestions.appendRow(item)
+        if books.empty:
+            self.completer.popup().hide()
+        else:
+            self.completer.complete()
+
+    def on_activated(self, index):
+        self.selected_book_id = index.data(self.BookIdRole)
+        self.setText(index.data(Qt.DisplayRole))
+
+    def book_id(self):
+        """book_id выбранной подсказки или лучшей книги по набранному тексту; None - книга не найдена"""
+        if self.selected_book_id is not None:
+            return self.selected_book_id
+        if self.recommender is None or not self.text().strip():
+            return None
+        try:
+            return self.recommender.find_book_id(self.text())
+        except KeyError:
+            return None
+
+class BookListModel(QAbstractListModel):
+    """Рекомендации для QListView.
+
+    Строки отдаются представлению порциями (fetchMore), поля книги читаются
+    из каталога (catalog.Recommendations) при первом показе строки, а обложка
+    запрашивается у CoverService только когда делегат ее рисует.
+    """
+    BookRole = Qt.UserRole + 1
+    CoverStateRole = Qt.UserRole + 2
+    FETCH_BATCH = 50
+
+    def __init__(self, covers, cover_size=LIST_COVER_SIZE, parent=None):
+        super().__init__(parent)
+        self.covers = covers
+        self.cover_size = cover_size
+        self.books = None
+        self.keys = []
+        self._records = {}
+        self.loaded = 0
+        self._rows_by_key = {}
+        self._requested = set()
+        self._failed = set()
+        covers.cover_ready.connect(self.on_cover_ready)
+        covers.cover_failed.connect(self.on_cover_failed)
+
+    def set_books(self, books):
+        """books - catalog.Recommendations или None (пустой список)"""
+        self.beginResetModel()
+        self.books = books
+        self.keys = [cover_key(book_id) for book_id in books.book_ids.tolist()] if books is not None else []
+        self._records = {}
+        self._rows_by_key = {}
+        for row, key in enumerate(self.keys):
+            self._rows_by_key.setdefault(key, []).append(row)
+        self._requested.clear()
+        self.loaded = min(len(self.keys), self.FETCH_BATCH)
+        self.endResetModel()
+
+    def extend(self, books):
+        """Дописывает в конец книги более длинного результата books, которых еще нет в списке;
+        показанные строки остаются на месте"""
+        if self.books is None:
+            self.set_books(books)
+            return
+        shown = set(self.books.rows.tolist())
+        new = np.array([i for i, row in enumerate(books.rows.tolist()) if row not in shown], dtype=np.int64)
+        if not len(new):
+            return
+        scores = None if self.books.scores is None or books.scores is None else \
+            np.concatenate([self.books.scores, books.scores[new]])
+        start = len(self.keys)
+        self.books = Recommendations(books.catalog, np.concatenate([self.books.rows, books.rows[new]]), scores)
+        for row, book_id in enumerate(books.book_ids[new].tolist(), start=start):
+            key = cover_key(book_id)
+            self.keys.append(key)
+            self._rows_by_key.setdefault(key, []).append(row)
+        self.fetchMore(QModelIndex())
+
+    def clear(self):
+        self.set_books(None)
+
+    def book(self, row):
+        """Поля книги строки row (словарь); читаются из каталога один раз"""
+        record = self._records.get(row)
+        if record is None:
+            record = self._records[row] = self.books.book(row)
+        return record
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.loaded < len(self.keys)
+
+    def fetchMore(self, parent):
+        count = min(self.FETCH_BATCH, len(self.keys) - self.loaded)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.loaded:
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self.book(row)['title']
+        if role == Qt.ToolTipRole:
+            return f"{self.book(row)['title']} - {self.book(row)['author']}"
+        if role == self.BookRole:
+            return self.book(row)
+        if role == Qt.DecorationRole:
+            return self.cover(row)
+        if role == self.CoverStateRole:
+            key = self.keys[row]
+            if not self.covers.has_cover(key):
+                return 'missing'
+            return 'failed' if key in self._failed else 'loading'
+        return None
+
+    def cover(self, row):
+        """Обложка из памяти сервиса; при первом обращении ставит загрузку в очередь"""
+        key = self.keys[row]
+        pixmap = self.covers.cached(key, self.cover_size)
+        if pixmap is None and key not in self._requested and key not in self._failed:
+            # выгруженная из LRU обложка запрашивается заново (с диска, без сети)
+            self._requested.add(key)
+            pixmap = self.covers.cover(key, self.cover_size)
+        return pixmap
+
+    def on_cover_ready(self, key, size, pixmap):
+        if size == self.cover_size:
+            self._requested.discard(key)
+            self._emit_changed(key)
+
+    def on_cover_failed(self, key):
+        self._failed.add(key)
+        self._emit_changed(key)
+
+    def _emit_changed(self, key):
+        for row in self._rows_by_key.get(key, ()):
+            if row < self.loaded:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.DecorationRole, self.CoverStateRole])
+
+class BookItemDelegate(QStyledItemDelegate):
+    """Рисует строку рекомендации без виджетов: обложка, название, автор, жанр, кнопка «Подробнее»"""
+    details_requested = pyqtSignal(QModelIndex)
+
+    ROW_HEIGHT = 200
+    MARGIN = 10
+    SPACING = 15
+    BUTTON_SIZE = QSize(120, 30)
+
+    def __init__(self, cover_size=LIST_COVER_SIZE, parent=None):
+        super().__init__(parent)
+        self.cover_size = cover_size
+        self.title_font = QFont()
+        self.title_font.setPixelSize(16)
+        self.title_font.setBold(True)
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def button_rect(self, rect):
+        rect = rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        size = self.BUTTON_SIZE
+        return QRect(rect.right() - size.width() + 1, rect.bottom() - size.height() + 1,
+                     size.width(), size.height())
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        rect = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+
+        cover_rect = QRect(rect.topLeft(), self.cover_size)
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is not None:
+            target = QRect(QPoint(0, 0), pixmap.size())
+            target.moveCenter(cover_rect.center())
+            painter.drawPixmap(target, pixmap)
         else:
-            self.show_placeholder()
+            painter.setPen(QColor("#888"))
+            painter.drawText(cover_rect, Qt.AlignCenter,
+                             COVER_PLACEHOLDERS[index.data(BookListModel.CoverStateRole)])
+
+        book = index.data(BookListModel.BookRole)
+        left = cover_rect.right() + self.SPACING
+        width = rect.right() - left
+        top = rect.top()
+
+        painter.setFont(self.title_font)
+        painter.setPen(QColor("#bb86fc"))
+        metrics = painter.fontMetrics()
+        painter.drawText(QRect(left, top, width, metrics.height()), Qt.AlignLeft | Qt.AlignVCenter,
+                         metrics.elidedText(str(book['title']), Qt.ElideRight, width))
+        top += metrics.height() + 8
+
+        painter.setFont(option.font)
+        painter.setPen(option.palette.color(QPalette.Text))
+        metrics = painter.fontMetrics()
+        for text in (f"Автор: {book['author']}", f"Жанр: {book['genre']}"):
+            painter.drawText(QRect(left, top, width, metrics.height()), Qt.AlignLeft | Qt.AlignVCenter,
+                             metrics.elidedText(text, Qt.ElideRight, width))
+            top += metrics.height() + 8
+
+        button = QStyleOptionButton()
+        button.rect = self.button_rect(option.rect)
+        button.text = "Подробнее"
+        button.state = QStyle.State_Enabled
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton \
+                and self.button_rect(option.rect).contains(event.pos()):
+            self.details_requested.emit(QModelIndex(index))
+            return True
+        return super().editorEvent(event, model, option, index)
+
+class BookDetailsDialog(QDialog):
+    def __init__(self, book_data, covers, parent=None):
+        super().__init__(parent)
+        self.book_data = book_data
+        self.covers = covers
+        self.setup_ui()
 
-    def set_cover_image(self, pixmap):
-        self.cover_label.setPixmap(pixmap)
+    def setup_ui(self):
+        self.setWindowTitle(f"Детали: {self.book_data['title']}")
+        self.resize(600, 700)  # Увеличили размер окна
 
-    def show_placeholder(self):
-        self.cover_label.setText("Нет обложки")
+        # Основной layout с прокруткой
+        scroll = QScrollArea()
+        content_widget = QWidget()
+        main_layout = QVBoxLayout(content_widget)
+        main_layout.setContentsMargins(20, 20, 20, 20)
+        main_layout.setSpacing(15)
 
-    def show_details(self):
-        try:
-            
-            # Создаем диалоговое окно
-            details_dialog = QDialog(self)
-            details_dialog.setWindowTitle(f"Детали: {self.book_data['title']}")
-            details_dialog.resize(600, 700)  # Увеличили размер окна
-        
-            # Основной layout с прокруткой
-            scroll = QScrollArea()
-            content_widget = QWidget()
-            main_layout = QVBoxLayout(content_widget)
-            main_layout.setContentsMargins(20, 20, 20, 20)
-            main_layout.setSpacing(15)
-
-            # Стили для улучшенного отображения
-            title_style = "font-size: 18px; color: #bb86fc; font-weight: bold;"
-            section_style = "font-size: 16px; color: #ffffff; margin-top: 10px;"
-            text_style = "font-size: 14px; color: #e0e0e0;"
-
-            # 1. Заголовок и обложка
-            title_layout = QHBoxLayout()
-        
-            # Обложка
-            cover_label = QLabel()
-            cover_label.setFixedSize(200, 300)
-            if str(self.book_data['book_id']) in self.book_images:
-                try:
-                    req = urllib.request.Request(
-                        self.book_images[str(self.book_data['book_id'])],
-                        headers={'User-Agent': 'Mozilla/5.0'}
-                    )
-                    with urllib.request.urlopen(req) as response:
-                        data = response.read()
-                    pixmap = QPixmap()
-                    pixmap.loadFromData(data)
-                    cover_label.setPixmap(pixmap.scaled(200, 300, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-                except:
-                    cover_label.setText("Обложка\nне загружена")
-                    cover_label.setStyleSheet("color: #888;")
-            else:
-                cover_label.setText("Нет обложки")
-                cover_label.setStyleSheet("color: #888;")
-            title_layout.addWidget(cover_label)
-        
-            # Основная информация
-            info_layout = QVBoxLayout()
-            title_label = QLabel(f"<h1 style='{title_style}'>{self.book_data['title']}</h1>")
-            author_label = QLabel(f"<p style='{text_style}'><b>Автор:</b> {self.book_data['author']}</p>")
-            genre_label = QLabel(f"<p style='{text_style}'><b>Жанр:</b> {self.book_data['genre']}</p>")
-        
-            info_layout.addWidget(title_label)
-            info_layout.addWidget(author_label)
-            info_layout.addWidget(genre_label)
-            info_layout.addStretch()
-            title_layout.addLayout(info_layout)
-            main_layout.addLayout(title_layout)
-
-            # 2. Детальная информация
-            details_group = QGroupBox("Подробная информация")
-            details_group.setStyleSheet("QGroupBox { font-size: 16px; color: white; }")
-            details_layout = QFormLayout()
-            details_layout.setLabelAlignment(Qt.AlignLeft)
-            details_layout.setFormAlignment(Qt.AlignLeft)
-            details_layout.setHorizontalSpacing(20)
-        
-            # Добавляем больше полей
-            details_layout.addRow(QLabel("<b style='color:#bb86fc'>Год издания:</b>"), 
-                                QLabel("1965" if self.book_data['title'] == "1984" else "2001"))
-        
-            details_layout.addRow(QLabel("<b style='color:#bb86fc'>Рейтинг:</b>"), 
-                                QLabel(f"{self.book_data.get('popularity', 'N/A')}/10"))
-        
-            details_layout.addRow(QLabel("<b style='color:#bb86fc'>Страниц:</b>"), 
-                                QLabel("328" if self.book_data['title'] == "1984" else "~400"))
-        
-            details_layout.addRow(QLabel("<b style='color:#bb86fc'>Язык:</b>"), 
-                                QLabel("Русский (перевод)"))
-        
-            details_group.setLayout(details_layout)
-            main_layout.addWidget(details_group)
-
-            # 3. Расширенное описание
-            desc_group = QGroupBox("Полное описание")
-            desc_group.setStyleSheet("QGroupBox { font-size: 16px; color: white; }")
-            desc_layout = QVBoxLayout()
-        
-            # Генерация более подробного описания
-            full_description = f"""
-            <p style='{text_style}'>{self.book_data['description']}</p>
-            <p style='{text_style}'><b>Ключевые темы:</b> {self._get_book_themes(self.book_data['title'])}</p>
-            <p style='{text_style}'><b>Для кого:</b> {self._get_target_audience(self.book_data['genre'])}</p>
-            """
-        
-            desc_label = QLabel(full_description)
-            desc_label.setWordWrap(True)
-            desc_label.setTextFormat(Qt.RichText)
-            desc_label.setAlignment(Qt.AlignJustify)
-        
-            scroll_area = QScrollArea()
-            scroll_area.setWidgetResizable(True)
-            scroll_area.setWidget(desc_label)
-            desc_layout.addWidget(scroll_area)
-            desc_group.setLayout(desc_layout)
-            main_layout.addWidget(desc_group)
-
-            # 4. Дополнительные разделы
-            extras_group = QGroupBox("Дополнительно")
-            extras_layout = QVBoxLayout()
-        
-            # Отзывы
-            reviews = QLabel("<b style='color:#bb86fc'>Известные отзывы:</b><br>"
-                            "\"Шедевр антиутопии\" - The Guardian<br>"
-                            "\"Обязательно к прочтению\" - Литературная газета")
-            reviews.setTextFormat(Qt.RichText)
-            reviews.setStyleSheet(text_style)
-        
-            # Похожие книги
-            similar = QLabel("<b style='color:#bb86fc'>Похожие книги:</b><br>"
-                            "О дивный новый мир, Скотный двор, Мы")
-            similar.setTextFormat(Qt.RichText)
-            similar.setStyleSheet(text_style)
-        
-            extras_layout.addWidget(reviews)
-            extras_layout.addWidget(similar)
-            extras_group.setLayout(extras_layout)
-            main_layout.addWidget(extras_group)
-
-            # Кнопка закрытия
-            close_btn = QPushButton("Закрыть")
-            close_btn.setStyleSheet("""
-                QPushButton {
-                    background-color: #bb86fc;
-                    color: black;
-                    padding: 8px 16px;
-                    border-radius: 4px;
-                }
-                QPushButton:hover {
-                    background-color: #9a67ea;
-                }
-            """)
-            close_btn.clicked.connect(details_dialog.close)
-            main_layout.addWidget(close_btn, alignment=Qt.AlignCenter)
-
-            # Настройка прокрутки
-            scroll.setWidget(content_widget)
-            scroll.setWidgetResizable(True)
-            dialog_layout = QVBoxLayout(details_dialog)
-            dialog_layout.addWidget(scroll)
-            details_dialog.setLayout(dialog_layout)
-        
-            details_dialog.exec_()
-        
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить детали:\n{str(e)}")
+        # Стили для улучшенного отображения
+        title_style = "font-size: 18px; color: #bb86fc; font-weight: bold;"
+        section_style = "font-size: 16px; color: #ffffff; margin-top: 10px;"
+        text_style = "font-size: 14px; color: #e0e0e0;"
+
+        # 1. Заголовок и обложка
+        title_layout = QHBoxLayout()
+
+        # Обложка (загружается в фоне через общий сервис)
+        cover_label = CoverLabel(self.covers, self.book_data['book_id'], 200, 300,
+                                 failed_text="Обложка\nне загружена")
+        title_layout.addWidget(cover_label)
+
+        # Основная информация
+        info_layout = QVBoxLayout()
+        title_label = QLabel(f"<h1 style='{title_style}'>{self.book_data['title']}</h1>")
+        author_label = QLabel(f"<p style='{text_style}'><b>Автор:</b> {self.book_data['author']}</p>")
+        genre_label = QLabel(f"<p style='{text_style}'><b>Жанр:</b> {self.book_data['genre']}</p>")
+
+        info_layout.addWidget(title_label)
+        info_layout.addWidget(author_label)
+        info_layout.addWidget(genre_label)
+        info_layout.addStretch()
+        title_layout.addLayout(info_layout)
+        main_layout.addLayout(title_layout)
+
+        # 2. Детальная информация
+        details_group = QGroupBox("Подробная информация")
+        details_group.setStyleSheet("QGroupBox { font-size: 16px; color: white; }")
+        details_layout = QFormLayout()
+        details_layout.setLabelAlignment(Qt.AlignLeft)
+        details_layout.setFormAlignment(Qt.AlignLeft)
+        details_layout.setHorizontalSpacing(20)
+
+        # Добавляем больше полей
+        details_layout.addRow(QLabel("<b style='color:#bb86fc'>Год издания:</b>"),
+                            QLabel("1965" if self.book_data['title'] == "1984" else "2001"))
+
+        details_layout.addRow(QLabel("<b style='color:#bb86fc'>Рейтинг:</b>"),
+                            QLabel(f"{self.book_data.get('popularity', 'N/A')}/10"))
+
+        details_layout.addRow(QLabel("<b style='color:#bb86fc'>Страниц:</b>"),
+                            QLabel("328" if self.book_data['title'] == "1984" else "~400"))
+
+        details_layout.addRow(QLabel("<b style='color:#bb86fc'>Язык:</b>"),
+                            QLabel("Русский (перевод)"))
+
+        details_group.setLayout(details_layout)
+        main_layout.addWidget(details_group)
+
+        # 3. Расширенное описание
+        desc_group = QGroupBox("Полное описание")
+        desc_group.setStyleSheet("QGroupBox { font-size: 16px; color: white; }")
+        desc_layout = QVBoxLayout()
+
+        # Генерация более подробного описания
+        full_description = f"""
+        <p style='{text_style}'>{self.book_data['description']}</p>
+        <p style='{text_style}'><b>Ключевые темы:</b> {self._get_book_themes(self.book_data['title'])}</p>
+        <p style='{text_style}'><b>Для кого:</b> {self._get_target_audience(self.book_data['genre'])}</p>
+        """
+
+        desc_label = QLabel(full_description)
+        desc_label.setWordWrap(True)
+        desc_label.setTextFormat(Qt.RichText)
+        desc_label.setAlignment(Qt.AlignJustify)
+
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setWidget(desc_label)
+        desc_layout.addWidget(scroll_area)
+        desc_group.setLayout(desc_layout)
+        main_layout.addWidget(desc_group)
+
+        # 4. Дополнительные разделы
+        extras_group = QGroupBox("Дополнительно")
+        extras_layout = QVBoxLayout()
+
+        # Отзывы
+        reviews = QLabel("<b style='color:#bb86fc'>Известные отзывы:</b><br>"
+                        "\"Шедевр антиутопии\" - The Guardian<br>"
+                        "\"Обязательно к прочтению\" - Литературная газета")
+        reviews.setTextFormat(Qt.RichText)
+        reviews.setStyleSheet(text_style)
+
+        # Похожие книги
+        similar = QLabel("<b style='color:#bb86fc'>Похожие книги:</b><br>"
+                        "О дивный новый мир, Скотный двор, Мы")
+        similar.setTextFormat(Qt.RichText)
+        similar.setStyleSheet(text_style)
+
+        extras_layout.addWidget(reviews)
+        extras_layout.addWidget(similar)
+        extras_group.setLayout(extras_layout)
+        main_layout.addWidget(extras_group)
+
+        # Кнопка закрытия
+        close_btn = QPushButton("Закрыть")
+        close_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #bb86fc;
+                color: black;
+                padding: 8px 16px;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #9a67ea;
+            }
+        """)
+        close_btn.clicked.connect(self.close)
+        main_layout.addWidget(close_btn, alignment=Qt.AlignCenter)
+
+        # Настройка прокрутки
+        scroll.setWidget(content_widget)
+        scroll.setWidgetResizable(True)
+        dialog_layout = QVBoxLayout(self)
+        dialog_layout.addWidget(scroll)
+        self.setLayout(dialog_layout)
 
     def _get_book_themes(self, title):
         """Возвращает ключевые темы для книги"""
@@ -335,11 +575,18 @@ class BookDetailsWindow(QWidget):
         self.setLayout(layout)
 
 class RecommenderApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, config=None):
         super().__init__()
+        self.recommender = None
         self.setup_ui()
-        self.recommender = AdvancedBookRecommender()
-        self.init_data()
+        self.set_controls_enabled(False)
+
+        # Модели загружаются в фоне, элементы управления включаются по готовности
+        self.loader = ModelLoaderThread(config)
+        self.loader.progress.connect(self.on_load_progress)
+        self.loader.loaded.connect(self.on_models_loaded)
+        self.loader.error.connect(self.on_load_error)
+        self.loader.start()
 
     def setup_ui(self):
         self.setWindowTitle("Книжный рекомендатель")
@@ -362,8 +609,9 @@ class RecommenderApp(QMainWindow):
         book_label.setStyleSheet("font-size: 14px;")
         book_layout.addWidget(book_label)
 
-        self.book_combo = QComboBox()
-        book_layout.addWidget(self.book_combo)
+        self.book_search = BookSearchBox()
+        self.book_search.returnPressed.connect(self.show_recommendations)
+        book_layout.addWidget(self.book_search)
         main_layout.addLayout(book_layout)
 
         method_layout = QHBoxLayout()
@@ -388,7 +636,7 @@ class RecommenderApp(QMainWindow):
 
         self.count_slider = QSlider(Qt.Horizontal)
         self.count_slider.setMinimum(3)
-        self.count_slider.setMaximum(10)
+        self.count_slider.setMaximum(MAX_RECOMMENDATIONS)
         self.count_slider.setValue(5)
         count_layout.addWidget(self.count_slider)
 
@@ -425,33 +673,85 @@ class RecommenderApp(QMainWindow):
         recommendations_label.setStyleSheet("font-size: 14px;")
         main_layout.addWidget(recommendations_label)
 
-        self.recommendations_list = QListWidget()
+        # Строки рисует делегат, виджеты на каждую книгу не создаются
+        self.recommendations_list = QListView()
+        self.recommendations_list.setUniformItemSizes(True)
+        self.recommendations_list.setVerticalScrollMode(QListView.ScrollPerPixel)
         self.recommendations_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 background-color: #1e1e1e;
                 border: 1px solid #444;
                 border-radius: 4px;
             }
-            QListWidget::item {
-                height: 200px;
-            }
         """)
+        delegate = BookItemDelegate(parent=self.recommendations_list)
+        delegate.details_requested.connect(self.show_details)
+        self.recommendations_list.setItemDelegate(delegate)
+        self.recommendations_list.doubleClicked.connect(self.show_details)
         main_layout.addWidget(self.recommendations_list)
 
+        # Следующие рекомендации дописываются в конец списка, показанные остаются
+        self.more_btn = QPushButton("Показать еще")
+        self.more_btn.clicked.connect(self.show_more)
+        self.more_btn.hide()
+        main_layout.addWidget(self.more_btn)
+
         self.count_slider.valueChanged.connect(lambda: self.count_label.setText(str(self.count_slider.value())))
 
+        self.load_progress = QProgressBar()
+        self.load_progress.setRange(0, 100)
+        self.load_progress.setMaximumWidth(200)
+        self.statusBar().addPermanentWidget(self.load_progress)
+        self.statusBar().showMessage("Загрузка моделей...")
+
+    def set_controls_enabled(self, enabled):
+        for widget in (self.book_search, self.method_combo, self.count_slider, self.recommend_btn):
+            widget.setEnabled(enabled)
+
+    def on_load_progress(self, message, percent):
+        self.statusBar().showMessage(message)
+        self.load_progress.setValue(percent)
+
+    def on_models_loaded(self, recommender):
+        self.recommender = recommender
+        self.covers = CoverService(recommender.book_images, parent=self)
+        self.recommendations_model = BookListModel(self.covers, parent=self)
+        self.recommendations_list.setModel(self.recommendations_model)
+        self.init_data()
+        self.load_progress.hide()
+        self.statusBar().showMessage(f"Книг в каталоге: {len(recommender.catalog)}", 5000)
+        self.set_controls_enabled(True)
+
+    def on_load_error(self, error_msg):
+        self.load_progress.hide()
+        self.statusBar().showMessage("Модели не загружены")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить модели:\n{error_msg}")
+
     def init_data(self):
-        for _, row in self.recommender.books.iterrows():
-            self.book_combo.addItem(f"{row['title']} - {row['author']}", row['book_id'])
+        self.book_search.set_recommender(self.recommender)
 
     def show_recommendations(self):
+        if not self.recommend_btn.isEnabled():
+            return
+        book_id = self.book_search.book_id()
+        if book_id is None:
+            QMessageBox.information(self, "Информация", "Книга не найдена: выберите ее из подсказок")
+            return
+
+        self.recommendations_model.clear()
+        self.more_btn.hide()
+        self.request_recommendations(book_id, self.method_combo.currentData(), self.count_slider.value())
+
+    def show_more(self):
+        book_id, method, top_n, _ = self.request
+        self.request_recommendations(book_id, method, top_n + MORE_RECOMMENDATIONS, extend=True)
+
+    def request_recommendations(self, book_id, method, top_n, extend=False):
+        """extend - результат продолжает показанный (кнопка «Показать еще»)"""
+        self.request = (book_id, method, top_n, extend)
         self.recommend_btn.setEnabled(False)
         self.recommend_btn.setText("Обработка...")
-        self.recommendations_list.clear()
-
-        book_id = self.book_combo.currentData()
-        method = self.method_combo.currentData()
-        top_n = self.count_slider.value()
+        self.more_btn.setEnabled(False)
 
         self.worker = RecommendationWorker(self.recommender, book_id, method, top_n)
         self.worker.finished.connect(self.display_recommendations)
@@ -462,18 +762,27 @@ class RecommenderApp(QMainWindow):
 
     def display_recommendations(self, recommendations):
         self.recommend_btn.setText("Получить рекомендации")
-        
+        _, _, top_n, extend = self.request
+        # Результат короче запрошенного - похожих книг больше нет
+        self.more_btn.setVisible(len(recommendations) >= top_n)
+        self.more_btn.setEnabled(True)
+
         if recommendations.empty:
             QMessageBox.information(self, "Информация", "Рекомендации не найдены")
             return
 
-        for _, row in recommendations.iterrows():
-            item = QListWidgetItem()
-            widget = BookItemWidget(row, self.recommender.book_images, self)
-            item.setSizeHint(widget.sizeHint())
-            self.recommendations_list.addItem(item)
-            self.recommendations_list.setItemWidget(item, widget)
+        if extend:
+            self.recommendations_model.extend(recommendations)
+        else:
+            self.recommendations_model.set_books(recommendations)
+
+    def show_details(self, index):
+        try:
+            BookDetailsDialog(index.data(BookListModel.BookRole), self.covers, self).exec_()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить детали:\n{str(e)}")
 
     def show_error(self, error_msg):
         self.recommend_btn.setText("Получить рекомендации")
+        self.more_btn.setEnabled(True)
         QMessageBox.critical(self, "Ошибка", f"Произошла ошибка:\n{error_msg}")
\ No newline at end of file